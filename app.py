@@ -4,11 +4,28 @@ URL Shortener Bot - Quart Server
 שרת Quart (ASGI) עם webhook לטלגרם ו-routes לקיצור URLs
 """
 
-from quart import Quart, request, redirect, jsonify, send_file
+from quart import Quart, Response, request, redirect, jsonify
 import logging
 from telegram import Update
 from config import Config
-from database import get_url, increment_clicks
+from async_database import get_url_with_clicks, resolve_url, connect_db, close_db, get_async_url_repo
+from redirects import resolve_redirect
+from fast_redirect import FastRedirectMiddleware
+from snapshot import redirect_snapshot
+from heavy_hitters import hot_links
+from shared_cache import shared_redirect_cache
+from replica import link_replica
+from id_allocator import short_code_allocator
+from keyspace import keyspace
+from blocklist import domain_blocklist
+from threat_db import threat_db
+from qr_cache import qr_cache
+from qr_pool import qr_pool, QRPoolBusy
+from qr_export import qr_exporter, QRExportBusy
+from state_store import conversation_states
+import metrics
+import time
+from click_buffer import click_buffer
 from bot import create_bot_application
 import asyncio
 from contextlib import suppress
@@ -24,11 +41,16 @@ logger = logging.getLogger(__name__)
 app = Quart(__name__)
 app.config['SECRET_KEY'] = Config.SECRET_KEY
 
+# נתיב מהיר ל-redirects (שאר הבקשות ממשיכות ל-Quart)
+if Config.FAST_REDIRECT_ENABLED:
+    app.asgi_app = FastRedirectMiddleware(app.asgi_app)
+
 # יצירת bot application
 bot_application = create_bot_application()
 
 # Background lifecycle state (avoid blocking Hypercorn lifespan startup)
 _services_task: asyncio.Task | None = None
+_maintenance_tasks: list[asyncio.Task] = []
 _bot_ready: asyncio.Event = asyncio.Event()
 
 
@@ -60,21 +82,136 @@ async def health():
 WEBHOOK_PATH = "/telegram/webhook"
 
 
+def _ops_authorized() -> bool:
+    """
+    הרשאה ל-ops endpoints: header X-Ops-Token (או Authorization: Bearer)
+    מול Config.OPS_TOKEN. בלי OPS_TOKEN מוגדר - פתוח רק ב-DEBUG.
+    """
+    if not Config.OPS_TOKEN:
+        return Config.DEBUG
+    token = request.headers.get("X-Ops-Token")
+    if token is None:
+        auth = request.headers.get("Authorization", "")
+        if auth.startswith("Bearer "):
+            token = auth[len("Bearer "):]
+    return token == Config.OPS_TOKEN
+
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    """
+    מטריקות בפורמט Prometheus
+    """
+    if not _ops_authorized():
+        return jsonify({'error': 'Not found'}), 404
+
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+@app.route('/api/ops/stats')
+async def ops_stats():
+    """
+    סטטיסטיקות תפעוליות של נתיב ה-redirect (cache, filter, click buffer)
+    """
+    if not _ops_authorized():
+        return jsonify({'error': 'Not found'}), 404
+
+    from cache import redirect_cache
+    from bloom import short_code_filter
+    from sharded_counters import hot_codes
+
+    return jsonify({
+        'redirect_cache': redirect_cache.stats(),
+        'short_code_filter': short_code_filter.stats(),
+        'click_buffer': click_buffer.stats(),
+        'snapshot': redirect_snapshot.stats(),
+        'sharded_counters': hot_codes.stats(),
+        'hot_links': hot_links.stats(),
+        'shared_cache': shared_redirect_cache.stats(),
+        'replica': link_replica.stats(),
+        'short_code_allocator': short_code_allocator.stats(),
+        'keyspace': keyspace.stats(),
+        'blocklist': domain_blocklist.stats(),
+        'threat_db': threat_db.stats(),
+        'qr_cache': qr_cache.stats(),
+        'qr_pool': qr_pool.stats(),
+        'qr_export': qr_exporter.stats(),
+        'conversation_states': conversation_states.stats(),
+    }), 200
+
+
+@app.route('/api/ops/hot-links')
+async def ops_hot_links():
+    """
+    הקישורים החמים כרגע (top-K מה-sketch) ואילו מהם מוצמדים ב-cache
+    
+    Query:
+        limit: כמות (ברירת מחדל HOT_LINKS_TOP_K)
+    """
+    if not _ops_authorized():
+        return jsonify({'error': 'Not found'}), 404
+
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, hot_links.sketch.capacity))
+
+    return jsonify({
+        'enabled': Config.HOT_LINKS_ENABLED,
+        'top': hot_links.top(limit),
+        'pinned': hot_links.pinned,
+    }), 200
+
+
+@app.route('/api/ops/export/<int:user_id>')
+async def ops_export_qr(user_id):
+    """
+    ZIP עם QR לכל הקישורים של משתמש (streaming - לא נבנה בזיכרון)
+    
+    Query:
+        format / size / ec: כמו ב-/qr/<short_code>
+    """
+    if not _ops_authorized():
+        return jsonify({'error': 'Not found'}), 404
+
+    fmt, box_size, error_correction, error = _qr_params()
+    if error:
+        return jsonify({'error': error}), 400
+
+    try:
+        # תופס את המקום של המשתמש כבר עכשיו (לפני שה-stream מתחיל)
+        chunks = qr_exporter.stream(user_id, fmt, box_size, error_correction)
+    except QRExportBusy:
+        return jsonify({'error': 'Export already running for this user'}), 429
+
+    response = Response(
+        chunks,
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="qr_codes_{user_id}.zip"'},
+    )
+    # ייצוא של מאות קישורים יכול לעבור את ה-RESPONSE_TIMEOUT של Quart
+    response.timeout = None
+    return response
+
+
 @app.route(WEBHOOK_PATH, methods=['POST'])
 async def webhook():
     """
     Webhook לקבלת עדכונים מטלגרם
     """
+    start = time.perf_counter()
+    status = "error"
     try:
         # If the service is still starting (e.g., Telegram init / webhook setup),
         # don't block the request handler or fail with 500s.
         if not _bot_ready.is_set():
+            status = "starting"
             return jsonify({"status": "starting"}), 503
 
         # אימות בסיסי: Telegram ישלח את ה-secret token ב-header
         # כך לא צריך לחשוף את BOT_TOKEN ב-URL (וגם נמנעות בעיות עם ':' בנתיב).
         secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
         if not secret or secret != Config.WEBHOOK_SECRET_TOKEN:
+            status = "forbidden"
             return jsonify({"status": "forbidden"}), 403
 
         # קבלת העדכון מטלגרם
@@ -89,11 +226,15 @@ async def webhook():
         # עיבוד העדכון
         await bot_application.process_update(update)
         
+        status = "ok"
         return jsonify({'status': 'ok'}), 200
         
     except Exception as e:
         logger.error(f"Error in webhook: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    finally:
+        metrics.WEBHOOK_SECONDS.observe(time.perf_counter() - start, status)
 
 
 @app.route('/<short_code>')
@@ -108,20 +249,16 @@ async def redirect_url(short_code):
         Redirect או 404
     """
     try:
-        # משיכת ה-URL מה-DB
-        url_doc = get_url(short_code)
+        # משיכת ה-URL וספירת הקליק (לפי REDIRECT_MODE)
+        original_url = await resolve_redirect(short_code)
         
-        if not url_doc:
+        if not original_url:
             return jsonify({
                 'error': 'URL not found',
                 'short_code': short_code
             }), 404
         
-        # עדכון מונה הקליקים
-        increment_clicks(short_code)
-        
         # Redirect
-        original_url = url_doc['original_url']
         
         logger.info(f"Redirecting {short_code} -> {original_url}")
         
@@ -132,40 +269,89 @@ async def redirect_url(short_code):
         return jsonify({'error': 'Internal server error'}), 500
 
 
+def _qr_params():
+    """
+    פרמטרי רינדור QR מה-query string (format / size / ec)
+    
+    Returns:
+        (fmt, box_size, error_correction, error) - error הוא הודעה או None
+    """
+    from utils import QRCodeGenerator
+    
+    fmt = request.args.get('format', 'png').lower()
+    error_correction = request.args.get('ec', Config.QR_ERROR_CORRECTION).upper()
+    try:
+        box_size = int(request.args.get('size', Config.QR_BOX_SIZE))
+    except ValueError:
+        box_size = 0
+    
+    error = None
+    if fmt not in QRCodeGenerator.FORMATS:
+        error = 'format must be one of: png, svg'
+    elif error_correction not in QRCodeGenerator.ERROR_CORRECTION:
+        error = 'ec must be one of: L, M, Q, H'
+    elif not 1 <= box_size <= Config.QR_MAX_BOX_SIZE:
+        error = f'size must be between 1 and {Config.QR_MAX_BOX_SIZE}'
+    return fmt, box_size, error_correction, error
+
+
 @app.route('/qr/<short_code>')
 async def qr_code(short_code):
     """
     יצירת QR code עבור קישור
     
+    Query params:
+        format: png (פלטה של 1 ביט, ברירת מחדל) / svg
+        size: פיקסלים למודול (1..QR_MAX_BOX_SIZE)
+        ec: רמת תיקון שגיאות L / M / Q / H
+    
     Args:
         short_code: הקוד הקצר
         
     Returns:
-        תמונת QR או 404
+        תמונת QR, 400 על פרמטר לא תקין או 404
     """
+    from utils import QRCodeGenerator
+    
+    fmt, box_size, error_correction, error = _qr_params()
+    if error:
+        return jsonify({'error': error}), 400
+    
     try:
-        # בדיקה שהקוד קיים
-        url_doc = get_url(short_code)
-        
-        if not url_doc:
+        # בדיקה שהקוד קיים (דרך ה-redirect cache)
+        if not await resolve_url(short_code):
             return jsonify({
                 'error': 'URL not found',
                 'short_code': short_code
             }), 404
         
-        # יצירת QR
-        from utils import generate_qr
+        # QR מה-cache (זיכרון / דיסק) או רינדור ב-process pool
         short_url = f"{Config.BASE_URL}/{short_code}"
-        qr_image = generate_qr(short_url)
-        
-        # שליחת התמונה
-        return await send_file(
-            qr_image,
-            mimetype='image/png',
-            as_attachment=False,
-            download_name=f'qr_{short_code}.png'
+        image, etag = await qr_cache.get_or_render(
+            short_code,
+            short_url,
+            lambda: qr_pool.render(short_url, box_size, Config.QR_BORDER, fmt, error_correction),
+            box_size=box_size,
+            border=Config.QR_BORDER,
+            fmt=fmt,
+            error_correction=error_correction,
         )
         
+        headers = {
+            'ETag': etag,
+            'Cache-Control': 'public, max-age=86400',
+        }
+        
+        # הדפדפן כבר מחזיק את אותה תמונה
+        if qr_cache.etag_matches(request.headers.get('If-None-Match', ''), etag):
+            return Response(status=304, headers=headers)
+        
+        headers['Content-Disposition'] = f'inline; filename="qr_{short_code}.{fmt}"'
+        return Response(image, mimetype=QRCodeGenerator.FORMATS[fmt], headers=headers)
+        
+    except (QRPoolBusy, asyncio.TimeoutError):
+        logger.warning(f"QR render pool busy / timed out for {short_code}")
+        return jsonify({'error': 'QR rendering busy, try again'}), 503, {'Retry-After': '5'}
     except Exception as e:
         logger.error(f"Error generating QR: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -183,7 +369,7 @@ async def get_stats(short_code):
         JSON עם סטטיסטיקות
     """
     try:
-        url_doc = get_url(short_code)
+        url_doc = await get_url_with_clicks(short_code)
         
         if not url_doc:
             return jsonify({
@@ -239,7 +425,7 @@ async def api_shorten():
         user_id = data.get('user_id', 0)  # 0 = anonymous
         
         # ולידציה
-        from utils import validate_url, generate_short_code, URLValidator
+        from utils import validate_url, URLValidator
         
         url = URLValidator.normalize_url(url)
         is_safe, reason = validate_url(url)
@@ -250,33 +436,25 @@ async def api_shorten():
             }), 400
         
         # בדיקה אם כבר קיים
-        from database import url_repo, create_url
+        from async_database import url_repo, create_short_url
         
-        existing = url_repo.find_existing(user_id, url)
+        if user_id == 0 and Config.GLOBAL_DEDUP:
+            existing = await url_repo.find_existing_global(url)
+        else:
+            existing = await url_repo.find_existing(user_id, url)
         
         if existing:
             short_code = existing['short_code']
         else:
-            # יצירת קוד חדש
-            short_code = None
-            for _ in range(5):
-                temp_code = generate_short_code()
-                if not get_url(temp_code):
-                    short_code = temp_code
-                    break
-            
-            if not short_code:
-                return jsonify({
-                    'error': 'Failed to generate short code'
-                }), 500
-            
-            # שמירה
-            url_doc = create_url(user_id, url, short_code)
+            # יצירת קוד חדש ושמירה
+            url_doc = await create_short_url(user_id, url)
             
             if not url_doc:
                 return jsonify({
                     'error': 'Failed to create URL'
                 }), 500
+            
+            short_code = url_doc['short_code']
         
         # החזרת תוצאה
         short_url = f"{Config.BASE_URL}/{short_code}"
@@ -346,8 +524,140 @@ async def remove_webhook():
         logger.error(f"❌ Error removing webhook: {e}")
 
 
+# ==================== Metrics Sources ====================
+
+def _register_metrics_sources():
+    """חשיפת ה-stats() של רכיבי נתיב ה-redirect כ-gauges ב-/metrics"""
+    from cache import redirect_cache
+    from bloom import short_code_filter
+    from sharded_counters import hot_codes
+
+    metrics.registry.register_stats("redirect_cache", redirect_cache.stats)
+    metrics.registry.register_stats("short_code_filter", short_code_filter.stats)
+    metrics.registry.register_stats("click_buffer", click_buffer.stats)
+    metrics.registry.register_stats("snapshot", redirect_snapshot.stats)
+    metrics.registry.register_stats("sharded_counters", hot_codes.stats)
+    metrics.registry.register_stats("hot_links", hot_links.stats)
+    metrics.registry.register_stats("shared_cache", shared_redirect_cache.stats)
+    metrics.registry.register_stats("replica", link_replica.stats)
+    metrics.registry.register_stats("short_code_allocator", short_code_allocator.stats)
+    metrics.registry.register_stats("keyspace", keyspace.stats)
+    metrics.registry.register_stats("blocklist", domain_blocklist.stats)
+    metrics.registry.register_stats("threat_db", threat_db.stats)
+    metrics.registry.register_stats("qr_cache", qr_cache.stats)
+    metrics.registry.register_stats("qr_pool", qr_pool.stats)
+    metrics.registry.register_stats("qr_export", qr_exporter.stats)
+    metrics.registry.register_stats("conversation_states", conversation_states.stats)
+
+
+_register_metrics_sources()
+
+
 # ==================== Application Lifecycle ====================
 
+async def _run_periodically(name: str, interval: float, func):
+    """
+    הרצת משימת תחזוקה כל interval שניות (הרצה ראשונה מיידית).
+    שגיאות נרשמות ללוג ולא עוצרות את הלולאה.
+    """
+    while True:
+        try:
+            await func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Maintenance task '{name}' failed: {e}")
+        await asyncio.sleep(interval)
+
+
+async def _run_once(name: str, func):
+    """הרצת משימת רקע חד-פעמית (שגיאות נרשמות ללוג)"""
+    try:
+        await func()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Background task '{name}' failed: {e}")
+
+
+def _start_maintenance_tasks():
+    """הפעלת משימות רקע שתלויות בחיבור ל-DB"""
+    if _maintenance_tasks:
+        return
+
+    url_repo = get_async_url_repo()
+    _maintenance_tasks.append(asyncio.create_task(
+        _run_periodically("short_code_filter", Config.BLOOM_REFRESH_SECONDS, url_repo.refresh_code_filter)
+    ))
+
+    if Config.SNAPSHOT_ENABLED:
+        _maintenance_tasks.append(asyncio.create_task(
+            _run_periodically("redirect_snapshot", Config.SNAPSHOT_INTERVAL,
+                              lambda: redirect_snapshot.refresh(url_repo))
+        ))
+
+    _maintenance_tasks.append(asyncio.create_task(
+        _run_periodically("keyspace", Config.KEYSPACE_REFRESH_SECONDS,
+                          lambda: keyspace.refresh(url_repo))
+    ))
+
+    if Config.BLOCKLIST_PATH:
+        # טעינה מחדש ב-thread כדי שקובץ גדול לא יעצור את ה-event loop
+        _maintenance_tasks.append(asyncio.create_task(
+            _run_periodically("blocklist", Config.BLOCKLIST_RELOAD_SECONDS,
+                              lambda: asyncio.to_thread(domain_blocklist.reload_if_changed))
+        ))
+
+    if Config.THREAT_DB_PATH or Config.THREAT_DB_UPDATES_PATH:
+        _maintenance_tasks.append(asyncio.create_task(
+            _run_periodically("threat_db", Config.THREAT_DB_RELOAD_SECONDS,
+                              lambda: asyncio.to_thread(threat_db.reload_if_changed))
+        ))
+
+    if Config.REPLICA_MODE_ENABLED:
+        _maintenance_tasks.append(asyncio.create_task(link_replica.run(url_repo)))
+
+    if shared_redirect_cache.enabled:
+        _maintenance_tasks.append(asyncio.create_task(
+            _run_once("shared_cache_fill",
+                      lambda: shared_redirect_cache.fill(url_repo, Config.SHARED_CACHE_FILL))
+        ))
+
+    if Config.HOT_LINKS_ENABLED:
+        _maintenance_tasks.append(asyncio.create_task(
+            _run_periodically("hot_links", Config.HOT_LINKS_INTERVAL,
+                              lambda: hot_links.refresh(url_repo))
+        ))
+
+
+async def _warm_redirect_cache():
+    """
+    חימום ה-redirect cache מהקישורים הכי נקלקים ומהאחרונים שנקלקו,
+    כדי שגל ה-redirects הראשון אחרי deploy לא יגיע כולו ל-Mongo.
+    חסום ב-WARMUP_BUDGET_SECONDS - מה שנטען עד אז נשאר ב-cache.
+    """
+    url_repo = get_async_url_repo()
+    size_before = len(url_repo.cache)
+    start = time.perf_counter()
+
+    async def warm():
+        for sort_field, limit in (("clicks", Config.WARMUP_TOP_CLICKS),
+                                  ("last_clicked", Config.WARMUP_RECENT)):
+            await url_repo.preload_cache(sort_field, limit, Config.WARMUP_BATCH_SIZE)
+
+    try:
+        await asyncio.wait_for(warm(), timeout=Config.WARMUP_BUDGET_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("⚠️ Redirect cache warm-up hit its time budget")
+    except Exception as e:
+        logger.error(f"❌ Redirect cache warm-up failed: {e}")
+
+    logger.info(
+        f"✅ Redirect cache warmed: {len(url_repo.cache) - size_before} links "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
 async def _start_services_in_background():
     """
     Start Telegram bot + configure webhook without blocking ASGI lifespan startup.
@@ -357,9 +667,20 @@ async def _start_services_in_background():
     backoff_seconds = 2
     max_attempts = 10
     bot_started = False
+    db_connected = False
 
     for attempt in range(1, max_attempts + 1):
         try:
+            # Connect async MongoDB client (ping + indexes)
+            if not db_connected:
+                logger.info("🗄️ Connecting to MongoDB...")
+                await connect_db()
+                db_connected = True
+                _start_maintenance_tasks()
+
+                if Config.WARMUP_ENABLED:
+                    await _warm_redirect_cache()
+
             # Start bot (if not already running)
             if not bot_started:
                 logger.info("🤖 Initializing Telegram bot...")
@@ -409,6 +730,18 @@ async def startup():
     """
     logger.info("🚀 Starting Quart server...")
 
+    # snapshot מקומי - redirects זמינים עוד לפני החיבור ל-MongoDB
+    if Config.SNAPSHOT_ENABLED:
+        with suppress(Exception):
+            redirect_snapshot.open()
+
+    # cache משותף בין workers (ה-segment נוצר ע"י ה-worker הראשון)
+    if Config.SHARED_CACHE_ENABLED:
+        shared_redirect_cache.open()
+
+    # תהליכי רינדור QR - מתחממים ברקע
+    qr_pool.start()
+
     # IMPORTANT:
     # Hypercorn enforces an ASGI lifespan startup timeout. Any slow network calls
     # (Telegram API, DNS, etc.) here can cause "Lifespan failure in startup. 'Timed out'".
@@ -417,6 +750,8 @@ async def startup():
     if _services_task is None or _services_task.done():
         _services_task = asyncio.create_task(_start_services_in_background())
 
+    click_buffer.start()
+
     logger.info("✅ Server started (background init running)")
 
 
@@ -433,6 +768,13 @@ async def shutdown():
         _services_task.cancel()
         with suppress(Exception):
             await _services_task
+
+    for task in _maintenance_tasks:
+        task.cancel()
+    for task in _maintenance_tasks:
+        with suppress(BaseException):
+            await task
+    _maintenance_tasks.clear()
     
     # סגירת הבוט
     # בפרודקשן לא מוחקים webhook בזמן shutdown, כי restarts/deploys יגרמו
@@ -446,7 +788,15 @@ async def shutdown():
     with suppress(Exception):
         await bot_application.shutdown()
     
+    # flush אחרון של קליקים לפני סגירת החיבור
+    with suppress(Exception):
+        await click_buffer.stop()
+    
+    shared_redirect_cache.close()
+    qr_pool.stop()
+    
     # סגירת MongoDB
+    close_db()
     from database import db
     db.close()
     
@@ -0,0 +1,1254 @@
+"""
+URL Shortener Bot - Async Database Layer
+=========================================
+גרסת asyncio (motor) של שכבת ה-DB - לשימוש מתוך Quart routes ו-handlers של הבוט.
+ה-API הסינכרוני ב-database.py נשאר לסקריפטים.
+"""
+
+import asyncio
+import time
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, AsyncIterator, Sequence, Tuple
+from config import Config
+from utils import URLValidator
+from cache import redirect_cache
+from bloom import short_code_filter
+from snapshot import redirect_snapshot
+from sharded_counters import hot_codes
+from heavy_hitters import hot_links
+from shared_cache import shared_redirect_cache
+from replica import link_replica
+from qr_cache import qr_cache
+from database import _LazyProxy
+from metrics import instrument_repository
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDatabase:
+    """מחלקה לניהול MongoDB (asyncio)"""
+
+    def __init__(self):
+        """
+        יצירת ה-client (ללא פעולות רשת).
+        החיבור בפועל ויצירת האינדקסים נעשים ב-connect().
+        """
+        self.client = AsyncIOMotorClient(
+            Config.MONGODB_URI,
+            serverSelectionTimeoutMS=5000
+        )
+
+        self.db = self.client[Config.DB_NAME]
+
+        # Collections
+        self.urls = self.db.urls
+        self.users = self.db.users
+        self.clicks = self.db.clicks
+        self.click_shards = self.db.click_shards
+        self.counters = self.db.counters
+        self.conversation_states = self.db.conversation_states
+
+        self.ready = False
+
+    async def connect(self):
+        """בדיקת חיבור ויצירת אינדקסים"""
+        try:
+            await self.client.admin.command("ping")
+        except PyMongoError as e:
+            logger.error(f"❌ Failed to connect to MongoDB (async): {e}")
+            raise
+
+        await self._create_indexes()
+
+        self.ready = True
+        logger.info("✅ Connected to MongoDB successfully (async)")
+
+    async def _create_indexes(self):
+        """יצירת אינדקסים לביצועים טובים"""
+        try:
+            await self.urls.create_index([("short_code", ASCENDING)], unique=True)
+            await self.urls.create_index([("user_id", ASCENDING)])
+            await self.urls.create_index([("created_at", DESCENDING)])
+            await self.urls.create_index([
+                ("user_id", ASCENDING),
+                ("created_at", DESCENDING)
+            ])
+            await self.urls.create_index([
+                ("user_id", ASCENDING),
+                ("fingerprint", ASCENDING)
+            ])
+            if Config.GLOBAL_DEDUP:
+                await self.urls.create_index([("fingerprint", ASCENDING)])
+            await self.urls.create_index([("clicks", DESCENDING)])
+            # רק הקישורים המפוצלים (מעטים) - לדירוג top-N ולחימום
+            await self.urls.create_index(
+                [("sharded", ASCENDING)],
+                partialFilterExpression={"sharded": True}
+            )
+            await self.urls.create_index([("last_clicked", DESCENDING)])
+
+            await self.users.create_index([("user_id", ASCENDING)], unique=True)
+
+            # מוני קליקים מפוצלים לקישורים חמים
+            await self.click_shards.create_index([
+                ("short_code", ASCENDING),
+                ("shard", ASCENDING)
+            ], unique=True)
+
+            # מצבי שיחה - נמחקים אוטומטית כשפג expires_at
+            await self.conversation_states.create_index(
+                [("expires_at", ASCENDING)], expireAfterSeconds=0
+            )
+
+            logger.info("✅ Database indexes created successfully (async)")
+
+        except Exception as e:
+            logger.warning(f"⚠️ Error creating indexes: {e}")
+
+    def close(self):
+        """סגירת חיבור ל-MongoDB"""
+        if self.client:
+            self.client.close()
+            self.ready = False
+            logger.info("MongoDB connection closed (async)")
+
+
+class AsyncURLRepository:
+    """מחלקה לניהול URLs במסד הנתונים (asyncio)"""
+
+    def __init__(self, db: AsyncDatabase):
+        self.collection = db.urls
+        self.shards = db.click_shards
+        self.counters = db.counters
+        self.cache = redirect_cache
+        self.shared = shared_redirect_cache
+        self.replica = link_replica
+        self.code_filter = short_code_filter
+        self.snapshot = redirect_snapshot
+        self._filter_sync_lock: Optional[asyncio.Lock] = None
+
+    async def create(
+        self,
+        user_id: int,
+        original_url: str,
+        short_code: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        יצירת URL חדש
+
+        Args:
+            user_id: מזהה המשתמש
+            original_url: הכתובת המקורית
+            short_code: הקוד הקצר
+
+        Returns:
+            המסמך שנוצר או None אם נכשל
+        """
+        try:
+            return await self._insert(user_id, original_url, short_code)
+
+        except DuplicateKeyError:
+            logger.warning(f"⚠️ Duplicate short_code: {short_code}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Error creating URL: {e}")
+            return None
+
+    async def _insert(self, user_id: int, original_url: str, short_code: str) -> Dict[str, Any]:
+        """insert של מסמך URL חדש (DuplicateKeyError עולה למעלה)"""
+        doc = {
+            "user_id": user_id,
+            "original_url": original_url,
+            "short_code": short_code,
+            "fingerprint": URLValidator.fingerprint(original_url),
+            "created_at": datetime.utcnow(),
+            "clicks": 0,
+            "last_clicked": None
+        }
+
+        result = await self.collection.insert_one(doc)
+        doc["_id"] = result.inserted_id
+        self.code_filter.add(short_code)
+        # רק replica פעילה; בזמן טעינה / resume ה-insert יגיע מה-change stream
+        if self.replica.ready:
+            self.replica.add(doc["_id"], short_code, original_url)
+
+        logger.info(f"✅ Created URL: {short_code} for user {user_id}")
+        return doc
+
+    async def create_with_generated_code(
+        self,
+        user_id: int,
+        original_url: str,
+        max_attempts: int = 5
+    ) -> Optional[Dict[str, Any]]:
+        """
+        יצירת URL עם קוד מה-allocator - בלי בדיקת קיום מראש;
+        התנגשות (למשל עם קוד אקראי ישן) נתפסת ב-unique index ומנסים קוד הבא
+
+        Args:
+            user_id: מזהה המשתמש
+            original_url: הכתובת המקורית
+            max_attempts: כמות ניסיונות
+
+        Returns:
+            המסמך שנוצר או None אם נכשל
+        """
+        from id_allocator import short_code_allocator
+
+        for _ in range(max_attempts):
+            try:
+                short_code = await short_code_allocator.next_code()
+                doc = await self._insert(user_id, original_url, short_code)
+                short_code_allocator.note_result(collided=False)
+                return doc
+            except DuplicateKeyError:
+                short_code_allocator.note_result(collided=True)
+                logger.warning(f"⚠️ Duplicate short_code: {short_code}")
+            except Exception as e:
+                logger.error(f"❌ Error creating URL: {e}")
+                return None
+
+        return None
+
+    async def count_links(self) -> int:
+        """
+        כמות הקישורים (מה-metadata, בלי סריקה)
+
+        Returns:
+            הערכת כמות המסמכים ב-urls
+        """
+        return await self.collection.estimated_document_count()
+
+    async def reserve_id_block(self, name: str, size: int) -> int:
+        """
+        שמירת בלוק מזהים רצים ממונה אטומי (collection counters)
+
+        Args:
+            name: שם המונה
+            size: גודל הבלוק
+
+        Returns:
+            המזהה הראשון בבלוק (הבלוק: [start, start + size))
+        """
+        doc = await self.counters.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"seq": size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["seq"] - size
+
+    async def get_by_short_code(self, short_code: str) -> Optional[Dict[str, Any]]:
+        """
+        משיכת URL לפי קוד קצר
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            המסמך או None אם לא נמצא
+        """
+        try:
+            return await self.collection.find_one({"short_code": short_code})
+        except Exception as e:
+            logger.error(f"❌ Error getting URL by code: {e}")
+            return None
+
+    async def set_qr_file_id(self, short_code: str, variant: str, file_id: str) -> bool:
+        """
+        שמירת ה-file_id של תמונת QR שכבר הועלתה לטלגרם
+
+        Args:
+            short_code: הקוד הקצר
+            variant: מפתח פרמטרי הרינדור (qr_file_ids.<variant>)
+            file_id: ה-file_id שטלגרם החזיר
+
+        Returns:
+            True אם עודכן
+        """
+        try:
+            result = await self.collection.update_one(
+                {"short_code": short_code},
+                {"$set": {f"qr_file_ids.{variant}": file_id}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"❌ Error saving QR file_id: {e}")
+            return False
+
+    async def resolve(self, short_code: str) -> Optional[str]:
+        """
+        משיכת הכתובת המקורית לפי קוד קצר דרך ה-cache (נתיב ה-redirect)
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            הכתובת המקורית או None אם לא נמצא
+
+        Raises:
+            PyMongoError: אם ה-DB לא זמין (כדי שנתיב ה-redirect יוכל ליפול ל-snapshot)
+        """
+        # replica mode: כל הטבלה בזיכרון ומסונכרנת - התשובה סופית, בלי רשת
+        if self.replica.ready:
+            return self.replica.get(short_code)
+
+        # worker כלשהו מחק קישור - ה-cache המקומי עלול להחזיק אותו
+        if self.shared.generation_changed():
+            self.cache.clear()
+
+        original_url = self.cache.get(short_code)
+        if original_url is not None:
+            return original_url
+
+        # קוד שבוודאות לא קיים (למשל סורקים עם מחרוזות אקראיות) - בלי DB
+        if await self._definitely_absent(short_code):
+            return None
+
+        # cache משותף ל-workers על אותו host
+        original_url = self.shared.get(short_code)
+        if original_url is not None:
+            self.cache.set(short_code, original_url)
+            return original_url
+
+        doc = await self.collection.find_one(
+            {"short_code": short_code},
+            {"original_url": 1, "_id": 0}
+        )
+        if not doc:
+            return None
+
+        original_url = doc["original_url"]
+        self.cache.set(short_code, original_url)
+        self.shared.set(short_code, original_url)
+        return original_url
+
+    async def resolve_and_count(self, short_code: str) -> Optional[str]:
+        """
+        redirect ב-round trip אחד: משיכת הכתובת והגדלת מונה הקליקים
+        ב-find_one_and_update אטומי (projection של original_url בלבד)
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            הכתובת המקורית או None אם לא נמצא
+
+        Raises:
+            PyMongoError: אם ה-DB לא זמין
+        """
+        # אותו נתיב miss כמו resolve(): קוד לא קיים לא עולה find_one_and_update
+        if self.replica.ready:
+            if self.replica.get(short_code) is None:
+                return None
+        elif await self._definitely_absent(short_code):
+            return None
+
+        doc = await self.collection.find_one_and_update(
+            {"short_code": short_code},
+            {
+                "$inc": {"clicks": 1},
+                "$set": {"last_clicked": datetime.utcnow()}
+            },
+            projection={"original_url": 1, "_id": 0}
+        )
+
+        if not doc:
+            return None
+
+        original_url = doc["original_url"]
+        self.cache.set(short_code, original_url)
+        self.shared.set(short_code, original_url)
+        return original_url
+
+    async def _definitely_absent(self, short_code: str) -> bool:
+        """
+        בדיקת ה-filter לפני ה-DB: miss על filter ישן מסנכרן אותו ובודק שוב
+        (כך גם קוד שנוצר ב-worker אחר נמצא, בלי find_one לכל קוד לא קיים)
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            True אם הקוד בוודאות לא קיים
+        """
+        code_filter = self.code_filter
+        if code_filter.definitely_absent(short_code):
+            return True
+        if not code_filter.missing(short_code):
+            return False
+
+        await self.sync_code_filter()
+        return code_filter.definitely_absent(short_code)
+
+    async def sync_code_filter(self) -> None:
+        """refresh של ה-filter אם הוא לא טרי - ה-misses שממתינים חולקים סנכרון אחד"""
+        if self._filter_sync_lock is None:
+            self._filter_sync_lock = asyncio.Lock()
+
+        async with self._filter_sync_lock:
+            if not self.code_filter.fresh:
+                await self.refresh_code_filter()
+
+    async def get_by_id(self, url_id: str) -> Optional[Dict[str, Any]]:
+        """
+        משיכת URL לפי ID
+
+        Args:
+            url_id: מזהה המסמך
+
+        Returns:
+            המסמך או None אם לא נמצא
+        """
+        try:
+            from bson import ObjectId
+            return await self.collection.find_one({"_id": ObjectId(url_id)})
+        except Exception as e:
+            logger.error(f"❌ Error getting URL by ID: {e}")
+            return None
+
+    async def find_by_user(
+        self,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        משיכת כל ה-URLs של משתמש עם pagination
+
+        Args:
+            user_id: מזהה המשתמש
+            skip: כמה לדלג (לפגינציה)
+            limit: כמה להחזיר
+
+        Returns:
+            רשימת מסמכים
+        """
+        try:
+            cursor = self.collection.find(
+                {"user_id": user_id}
+            ).sort(
+                "created_at", DESCENDING
+            ).skip(skip).limit(limit)
+
+            return await self.apply_sharded_clicks(await cursor.to_list(length=limit))
+
+        except Exception as e:
+            logger.error(f"❌ Error finding URLs by user: {e}")
+            return []
+
+    async def iter_by_user(
+        self,
+        user_id: int,
+        limit: int = 0,
+        batch_size: int = 200
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        מעבר (streaming) על הקישורים של משתמש, מהחדש לישן
+
+        Args:
+            user_id: מזהה המשתמש
+            limit: כמות מקסימלית (0 = הכל)
+            batch_size: גודל batch של ה-cursor
+
+        Yields:
+            (short_code, original_url)
+        """
+        cursor = self.collection.find(
+            {"user_id": user_id},
+            {"short_code": 1, "original_url": 1, "_id": 0}
+        ).sort("created_at", DESCENDING).limit(limit).batch_size(batch_size)
+
+        async for doc in cursor:
+            yield doc["short_code"], doc["original_url"]
+
+    async def count_by_user(self, user_id: int) -> int:
+        """
+        ספירת כמות ה-URLs של משתמש
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            מספר ה-URLs
+        """
+        try:
+            return await self.collection.count_documents({"user_id": user_id})
+        except Exception as e:
+            logger.error(f"❌ Error counting URLs: {e}")
+            return 0
+
+    async def increment_clicks(self, short_code: str) -> bool:
+        """
+        הגדלת מונה הקליקים
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            True אם הצליח, False אחרת
+        """
+        try:
+            result = await self.collection.update_one(
+                {"short_code": short_code},
+                {
+                    "$inc": {"clicks": 1},
+                    "$set": {"last_clicked": datetime.utcnow()}
+                }
+            )
+
+            return result.modified_count > 0
+
+        except Exception as e:
+            logger.error(f"❌ Error incrementing clicks: {e}")
+            return False
+
+    async def bulk_increment_clicks(self, deltas: Dict[str, Sequence]) -> bool:
+        """
+        עדכון מרוכז של מוני קליקים (flush מה-ClickBuffer)
+
+        Args:
+            deltas: {short_code: (clicks, last_clicked)}
+
+        Returns:
+            True אם הצליח, False אחרת
+        """
+        if not deltas:
+            return True
+
+        try:
+            operations = [
+                UpdateOne(
+                    {"short_code": short_code},
+                    {
+                        "$inc": {"clicks": clicks},
+                        "$max": {"last_clicked": last_clicked}
+                    }
+                )
+                for short_code, (clicks, last_clicked) in deltas.items()
+            ]
+
+            await self.collection.bulk_write(operations, ordered=False)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error flushing clicks ({len(deltas)} codes): {e}")
+            return False
+
+    async def increment_sharded(self, short_code: str) -> bool:
+        """
+        הגדלת מונה קליקים של קישור חם ב-shard אקראי
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            True אם הצליח, False אחרת
+        """
+        return await self.bulk_increment_sharded({short_code: (1, datetime.utcnow())})
+
+    async def bulk_increment_sharded(self, deltas: Dict[str, Sequence]) -> bool:
+        """
+        עדכון מרוכז של מוני קליקים מפוצלים (upsert ל-shard אקראי לכל קוד)
+
+        Args:
+            deltas: {short_code: (clicks, last_clicked)}
+
+        Returns:
+            True אם הצליח, False אחרת
+        """
+        if not deltas:
+            return True
+
+        try:
+            operations = [
+                UpdateOne(
+                    {"short_code": short_code, "shard": hot_codes.pick_shard()},
+                    {
+                        "$inc": {"clicks": clicks},
+                        "$max": {"last_clicked": last_clicked}
+                    },
+                    upsert=True
+                )
+                for short_code, (clicks, last_clicked) in deltas.items()
+            ]
+
+            await self.shards.bulk_write(operations, ordered=False)
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error flushing sharded clicks ({len(deltas)} codes): {e}")
+            return False
+
+    async def mark_sharded(self, short_codes) -> bool:
+        """
+        סימון קישורים כ-sharded (כדי שהקריאות יסכמו את ה-shards)
+
+        Args:
+            short_codes: קודים שעברו את סף הקצב
+
+        Returns:
+            True אם הצליח, False אחרת
+        """
+        try:
+            await self.collection.update_many(
+                {"short_code": {"$in": list(short_codes)}},
+                {"$set": {"sharded": True}}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error marking sharded URLs: {e}")
+            return False
+
+    async def shard_totals(self, short_codes) -> Dict[str, tuple]:
+        """
+        סכימת ה-shards לכל קוד
+
+        Args:
+            short_codes: רשימת קודים
+
+        Returns:
+            {short_code: (clicks, last_clicked)}
+        """
+        pipeline = [
+            {"$match": {"short_code": {"$in": list(short_codes)}}},
+            {"$group": {
+                "_id": "$short_code",
+                "clicks": {"$sum": "$clicks"},
+                "last_clicked": {"$max": "$last_clicked"}
+            }}
+        ]
+
+        result = await self.shards.aggregate(pipeline).to_list(length=None)
+        return {doc["_id"]: (doc["clicks"], doc.get("last_clicked")) for doc in result}
+
+    async def apply_sharded_clicks(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        הוספת סכום ה-shards ל-clicks/last_clicked של מסמכים מסומנים sharded
+
+        Args:
+            docs: מסמכי urls
+
+        Returns:
+            אותם מסמכים (מעודכנים במקום)
+        """
+        sharded = [doc["short_code"] for doc in docs if doc.get("sharded")]
+        if not sharded:
+            return docs
+
+        totals = await self.shard_totals(sharded)
+
+        for doc in docs:
+            if doc["short_code"] not in totals:
+                continue
+            clicks, last_clicked = totals[doc["short_code"]]
+            doc["clicks"] = doc.get("clicks", 0) + clicks
+            if last_clicked and (not doc.get("last_clicked") or last_clicked > doc["last_clicked"]):
+                doc["last_clicked"] = last_clicked
+
+        return docs
+
+    async def get_with_clicks(self, short_code: str) -> Optional[Dict[str, Any]]:
+        """
+        משיכת URL לפי קוד קצר כולל סכום מוני ה-shards (לתצוגת סטטיסטיקות)
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            המסמך או None אם לא נמצא
+        """
+        doc = await self.get_by_short_code(short_code)
+        if not doc:
+            return None
+
+        try:
+            await self.apply_sharded_clicks([doc])
+        except Exception as e:
+            logger.error(f"❌ Error summing sharded clicks: {e}")
+
+        return doc
+
+    async def delete(self, short_code: str, user_id: int) -> bool:
+        """
+        מחיקת URL
+
+        Args:
+            short_code: הקוד הקצר
+            user_id: מזהה המשתמש (לאימות בעלות)
+
+        Returns:
+            True אם נמחק, False אחרת
+        """
+        try:
+            deleted = await self.collection.find_one_and_delete(
+                {"short_code": short_code, "user_id": user_id},
+                projection={"_id": 1}
+            )
+
+            if deleted is not None:
+                self.cache.invalidate(short_code)
+                self.shared.delete(short_code)
+                self.replica.discard(short_code, deleted["_id"])
+                self.code_filter.note_deleted(short_code)
+                self.snapshot.note_deleted(short_code)
+                hot_codes.forget(short_code)
+                hot_links.forget(short_code)
+                await self.shards.delete_many({"short_code": short_code})
+                await qr_cache.forget(short_code)
+                logger.info(f"✅ Deleted URL: {short_code}")
+                return True
+
+            return False
+
+        except Exception as e:
+            logger.error(f"❌ Error deleting URL: {e}")
+            return False
+
+    async def find_existing(self, user_id: int, original_url: str) -> Optional[Dict[str, Any]]:
+        """
+        חיפוש אם המשתמש כבר קיצר את אותו URL
+
+        Args:
+            user_id: מזהה המשתמש
+            original_url: הכתובת המקורית
+
+        Returns:
+            המסמך או None אם לא נמצא
+        """
+        try:
+            # האינדקס על (user_id, fingerprint) מצמצם למסמך אחד; original_url מגן מהתנגשות hash
+            return await self.collection.find_one({
+                "user_id": user_id,
+                "fingerprint": URLValidator.fingerprint(original_url),
+                "original_url": original_url
+            })
+        except Exception as e:
+            logger.error(f"❌ Error finding existing URL: {e}")
+            return None
+
+    async def find_existing_global(self, original_url: str) -> Optional[Dict[str, Any]]:
+        """
+        חיפוש קישור קיים לאותו URL אצל כל המשתמשים (GLOBAL_DEDUP)
+
+        Args:
+            original_url: הכתובת המקורית
+
+        Returns:
+            המסמך או None אם לא נמצא
+        """
+        try:
+            return await self.collection.find_one({
+                "fingerprint": URLValidator.fingerprint(original_url),
+                "original_url": original_url
+            })
+        except Exception as e:
+            logger.error(f"❌ Error finding existing URL: {e}")
+            return None
+
+    async def get_top_urls(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        משיכת ה-URLs הכי פופולריים של משתמש
+
+        Args:
+            user_id: מזהה המשתמש
+            limit: כמה להחזיר
+
+        Returns:
+            רשימת URLs ממוינת לפי קליקים (כולל ה-shards)
+        """
+        try:
+            cursor = self.collection.find(
+                {"user_id": user_id}
+            ).sort(
+                "clicks", DESCENDING
+            ).limit(limit)
+            docs = await cursor.to_list(length=limit)
+
+            # בקישורים מפוצלים ה-clicks במסמך חסר את ה-shards - הם מדורגים
+            # רק אחרי מיזוג הסכומים, ולכן נמשכים תמיד (מעטים - רק קישורים חמים)
+            seen = {doc["short_code"] for doc in docs}
+            async for doc in self.collection.find({"user_id": user_id, "sharded": True}):
+                if doc["short_code"] not in seen:
+                    docs.append(doc)
+
+            docs = await self.apply_sharded_clicks(docs)
+            docs.sort(key=lambda doc: doc.get("clicks", 0), reverse=True)
+            return docs[:limit]
+
+        except Exception as e:
+            logger.error(f"❌ Error getting top URLs: {e}")
+            return []
+
+    async def get_total_clicks(self, user_id: int) -> int:
+        """
+        סכימת כל הקליקים של משתמש
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            סה"כ קליקים
+        """
+        try:
+            pipeline = [
+                {"$match": {"user_id": user_id}},
+                {"$group": {"_id": None, "total": {"$sum": "$clicks"}}}
+            ]
+
+            result = await self.collection.aggregate(pipeline).to_list(length=1)
+            total = result[0]["total"] if result else 0
+
+            sharded = await self.collection.distinct(
+                "short_code", {"user_id": user_id, "sharded": True}
+            )
+            if sharded:
+                totals = await self.shard_totals(sharded)
+                total += sum(clicks for clicks, _ in totals.values())
+
+            return total
+
+        except Exception as e:
+            logger.error(f"❌ Error calculating total clicks: {e}")
+            return 0
+
+    async def build_code_filter(self, batch_size: int = 5000) -> int:
+        """
+        בנייה מלאה של ה-filter מכל הקודים ב-collection
+
+        Args:
+            batch_size: גודל batch של ה-cursor
+
+        Returns:
+            כמות הקודים שנטענו
+        """
+        synced_at = time.monotonic()
+        expected = await self.collection.estimated_document_count()
+        bloom = self.code_filter.begin_build(expected)
+        watermark = None
+        loaded = 0
+
+        cursor = self.collection.find(
+            {},
+            {"short_code": 1, "created_at": 1, "_id": 0}
+        ).batch_size(batch_size)
+
+        async for doc in cursor:
+            bloom.add(doc["short_code"])
+            created_at = doc.get("created_at")
+            if created_at and (watermark is None or created_at > watermark):
+                watermark = created_at
+            loaded += 1
+
+        self.code_filter.finish_build(bloom, watermark, synced_at)
+        logger.info(f"✅ Short code filter built: {loaded} codes")
+        return loaded
+
+    async def refresh_code_filter(self, batch_size: int = 5000) -> int:
+        """
+        סנכרון תקופתי: הוספת קודים שנוצרו מאז ה-watermark (גם ב-workers אחרים),
+        או בנייה מלאה אם ה-filter לא מוכן / התמלא / יש יותר מדי מחיקות
+
+        Returns:
+            כמות הקודים שנוספו
+        """
+        code_filter = self.code_filter
+
+        if not code_filter.ready or code_filter.needs_rebuild:
+            return await self.build_code_filter(batch_size)
+
+        synced_at = time.monotonic()
+        query = {}
+        if code_filter.watermark is not None:
+            # מרווח ביטחון לסטיית שעונים בין תהליכים - הוספה חוזרת אינה מזיקה
+            since = code_filter.watermark - timedelta(seconds=Config.BLOOM_REFRESH_MARGIN)
+            query = {"created_at": {"$gte": since}}
+
+        cursor = self.collection.find(
+            query,
+            {"short_code": 1, "created_at": 1, "_id": 0}
+        ).batch_size(batch_size)
+
+        added = 0
+        async for doc in cursor:
+            code_filter.add(doc["short_code"])
+            created_at = doc.get("created_at")
+            if created_at and (code_filter.watermark is None or created_at > code_filter.watermark):
+                code_filter.watermark = created_at
+            added += 1
+
+        if code_filter.synced_at is None or synced_at > code_filter.synced_at:
+            code_filter.synced_at = synced_at
+        return added
+
+    async def iter_links(
+        self,
+        since: Optional[datetime] = None,
+        batch_size: int = 5000
+    ) -> AsyncIterator[Tuple[str, str, Optional[datetime]]]:
+        """
+        מעבר (streaming) על כל הקישורים, או רק על אלה שנוצרו מאז since
+
+        Args:
+            since: created_at מינימלי (None = הכל)
+            batch_size: גודל batch של ה-cursor
+
+        Yields:
+            (short_code, original_url, created_at)
+        """
+        query = {"created_at": {"$gte": since}} if since is not None else {}
+
+        cursor = self.collection.find(
+            query,
+            {"short_code": 1, "original_url": 1, "created_at": 1, "_id": 0}
+        ).batch_size(batch_size)
+
+        async for doc in cursor:
+            yield doc["short_code"], doc["original_url"], doc.get("created_at")
+
+    async def preload_cache(self, sort_field: str, limit: int, batch_size: int = 500) -> int:
+        """
+        טעינת top-N קישורים ל-redirect cache (streaming עם projection)
+
+        Args:
+            sort_field: שדה למיון יורד (clicks / last_clicked)
+            limit: כמות מקסימלית (חסומה בגודל ה-cache)
+            batch_size: גודל batch של ה-cursor
+
+        Returns:
+            כמות הקישורים שנטענו
+        """
+        limit = min(int(limit), self.cache.max_size)
+
+        loaded = 0
+        async for short_code, original_url in self.iter_top_links(sort_field, limit, batch_size):
+            if short_code not in self.cache:
+                self.cache.set(short_code, original_url)
+                loaded += 1
+        return loaded
+
+    async def iter_top_links(
+        self,
+        sort_field: str,
+        limit: int,
+        batch_size: int = 500
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        מעבר (streaming) על top-N קישורים לפי שדה במיון יורד
+
+        Args:
+            sort_field: שדה למיון (clicks / last_clicked)
+            limit: כמות מקסימלית
+            batch_size: גודל batch של ה-cursor
+
+        Yields:
+            (short_code, original_url)
+        """
+        if limit <= 0:
+            return
+
+        # קישורים מפוצלים הם החמים ביותר, אבל clicks / last_clicked שלהם
+        # מתעדכנים ב-click_shards ולא במסמך - נכנסים ראשונים
+        seen = set()
+        sharded = self.collection.find(
+            {"sharded": True},
+            {"short_code": 1, "original_url": 1, "_id": 0}
+        ).limit(limit)
+        async for doc in sharded:
+            seen.add(doc["short_code"])
+            yield doc["short_code"], doc["original_url"]
+
+        cursor = self.collection.find(
+            {sort_field: {"$ne": None}},
+            {"short_code": 1, "original_url": 1, "_id": 0}
+        ).sort(sort_field, DESCENDING).limit(limit).batch_size(batch_size)
+
+        async for doc in cursor:
+            if len(seen) >= limit:
+                return
+            if doc["short_code"] not in seen:
+                seen.add(doc["short_code"])
+                yield doc["short_code"], doc["original_url"]
+
+    async def iter_link_table(self, batch_size: int = 5000) -> AsyncIterator[Tuple[Any, str, str]]:
+        """
+        מעבר (streaming) על כל הקישורים לטעינת ה-replica
+
+        Args:
+            batch_size: גודל batch של ה-cursor
+
+        Yields:
+            (_id, short_code, original_url)
+        """
+        cursor = self.collection.find(
+            {},
+            {"short_code": 1, "original_url": 1}
+        ).batch_size(batch_size)
+
+        async for doc in cursor:
+            yield doc["_id"], doc["short_code"], doc["original_url"]
+
+    async def warm_cache(self, short_codes: Sequence[str]) -> int:
+        """
+        טעינת קודים שחסרים ב-redirect cache בשאילתה אחת ($in)
+
+        Args:
+            short_codes: הקודים לחימום
+
+        Returns:
+            כמות הקודים שנטענו
+        """
+        missing = [code for code in short_codes if code not in self.cache]
+        if not missing:
+            return 0
+
+        cursor = self.collection.find(
+            {"short_code": {"$in": missing}},
+            {"short_code": 1, "original_url": 1, "_id": 0}
+        )
+
+        loaded = 0
+        async for doc in cursor:
+            self.cache.set(doc["short_code"], doc["original_url"])
+            loaded += 1
+        return loaded
+
+
+class AsyncUserRepository:
+    """מחלקה לניהול משתמשים במסד הנתונים (asyncio)"""
+
+    def __init__(self, db: AsyncDatabase):
+        self.collection = db.users
+
+    async def create_or_update(
+        self,
+        user_id: int,
+        username: Optional[str] = None,
+        first_name: Optional[str] = None,
+        last_name: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        יצירת משתמש חדש או עדכון קיים
+
+        Args:
+            user_id: מזהה המשתמש
+            username: שם משתמש (אופציונלי)
+            first_name: שם פרטי (אופציונלי)
+            last_name: שם משפחה (אופציונלי)
+
+        Returns:
+            המסמך המעודכן
+        """
+        try:
+            now = datetime.utcnow()
+
+            result = await self.collection.find_one_and_update(
+                {"user_id": user_id},
+                {
+                    "$set": {
+                        "username": username,
+                        "first_name": first_name,
+                        "last_name": last_name,
+                        "last_seen": now
+                    },
+                    "$setOnInsert": {
+                        "created_at": now
+                    }
+                },
+                upsert=True,
+                return_document=True
+            )
+
+            return result
+
+        except Exception as e:
+            logger.error(f"❌ Error creating/updating user: {e}")
+            return None
+
+    async def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        משיכת פרטי משתמש
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            המסמך או None אם לא נמצא
+        """
+        try:
+            return await self.collection.find_one({"user_id": user_id})
+        except Exception as e:
+            logger.error(f"❌ Error getting user: {e}")
+            return None
+
+    async def update_last_seen(self, user_id: int) -> bool:
+        """
+        עדכון זמן ביקור אחרון
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            True אם הצליח, False אחרת
+        """
+        try:
+            result = await self.collection.update_one(
+                {"user_id": user_id},
+                {"$set": {"last_seen": datetime.utcnow()}}
+            )
+
+            return result.modified_count > 0
+
+        except Exception as e:
+            logger.error(f"❌ Error updating last seen: {e}")
+            return False
+
+    async def get_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        משיכת סטטיסטיקות משתמש
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            dict עם סטטיסטיקות
+        """
+        try:
+            user = await self.get(user_id)
+            if not user:
+                return None
+
+            repo = get_async_url_repo()
+
+            total_urls = await repo.count_by_user(user_id)
+            total_clicks = await repo.get_total_clicks(user_id)
+            top_urls = await repo.get_top_urls(user_id, limit=1)
+
+            return {
+                "user_id": user_id,
+                "member_since": user.get("created_at"),
+                "total_urls": total_urls,
+                "total_clicks": total_clicks,
+                "top_url": top_urls[0] if top_urls else None
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Error getting user stats: {e}")
+            return None
+
+
+instrument_repository(AsyncURLRepository, "urls")
+instrument_repository(AsyncUserRepository, "users")
+
+
+_db: AsyncDatabase | None = None
+_url_repo: AsyncURLRepository | None = None
+_user_repo: AsyncUserRepository | None = None
+
+
+def _ensure_initialized() -> None:
+    """
+    Lazy initialization. Creating the motor client does no network I/O;
+    the connection check and index creation happen in AsyncDatabase.connect().
+    """
+    global _db, _url_repo, _user_repo
+    if _db is not None and _url_repo is not None and _user_repo is not None:
+        return
+
+    _db = AsyncDatabase()
+    _url_repo = AsyncURLRepository(_db)
+    _user_repo = AsyncUserRepository(_db)
+
+
+def get_async_db() -> AsyncDatabase:
+    _ensure_initialized()
+    return _db  # type: ignore[return-value]
+
+
+def get_async_url_repo() -> AsyncURLRepository:
+    _ensure_initialized()
+    return _url_repo  # type: ignore[return-value]
+
+
+def get_async_user_repo() -> AsyncUserRepository:
+    _ensure_initialized()
+    return _user_repo  # type: ignore[return-value]
+
+
+async def connect_db() -> None:
+    """חיבור ל-MongoDB ויצירת אינדקסים (נקרא מה-startup ברקע)"""
+    await get_async_db().connect()
+
+
+def close_db() -> None:
+    """סגירת החיבור - בלי לאתחל אם מעולם לא נוצר"""
+    if _db is None:
+        return
+    _db.close()
+
+
+# Module attributes (parallel to database.url_repo / database.user_repo)
+url_repo = _LazyProxy(get_async_url_repo)
+user_repo = _LazyProxy(get_async_user_repo)
+
+
+# Helper functions (shortcuts) - awaitable
+async def create_url(user_id: int, original_url: str, short_code: str) -> Optional[Dict]:
+    """Shortcut for url_repo.create()"""
+    return await get_async_url_repo().create(user_id, original_url, short_code)
+
+
+async def create_short_url(user_id: int, original_url: str) -> Optional[Dict]:
+    """Shortcut for url_repo.create_with_generated_code()"""
+    return await get_async_url_repo().create_with_generated_code(user_id, original_url)
+
+
+async def get_url(short_code: str) -> Optional[Dict]:
+    """Shortcut for url_repo.get_by_short_code()"""
+    return await get_async_url_repo().get_by_short_code(short_code)
+
+
+async def set_qr_file_id(short_code: str, variant: str, file_id: str) -> bool:
+    """Shortcut for url_repo.set_qr_file_id()"""
+    return await get_async_url_repo().set_qr_file_id(short_code, variant, file_id)
+
+
+async def get_url_with_clicks(short_code: str) -> Optional[Dict]:
+    """Shortcut for url_repo.get_with_clicks()"""
+    return await get_async_url_repo().get_with_clicks(short_code)
+
+
+async def resolve_url(short_code: str) -> Optional[str]:
+    """Shortcut for url_repo.resolve()"""
+    return await get_async_url_repo().resolve(short_code)
+
+
+async def increment_clicks(short_code: str) -> bool:
+    """Shortcut for url_repo.increment_clicks()"""
+    return await get_async_url_repo().increment_clicks(short_code)
+
+
+async def get_user_urls(user_id: int, page: int = 1, per_page: int = 10) -> List[Dict]:
+    """Shortcut for url_repo.find_by_user() with page calculation"""
+    skip = (page - 1) * per_page
+    return await get_async_url_repo().find_by_user(user_id, skip=skip, limit=per_page)
+
+
+async def count_user_urls(user_id: int) -> int:
+    """Shortcut for url_repo.count_by_user()"""
+    return await get_async_url_repo().count_by_user(user_id)
+
+
+async def create_or_update_user(user_id: int, **kwargs) -> Optional[Dict]:
+    """Shortcut for user_repo.create_or_update()"""
+    return await get_async_user_repo().create_or_update(user_id, **kwargs)
+
+
+async def get_user_stats(user_id: int) -> Optional[Dict]:
+    """Shortcut for user_repo.get_stats()"""
+    return await get_async_user_repo().get_stats(user_id)
@@ -0,0 +1,70 @@
+"""
+URL Shortener Bot - QR Format Benchmark
+========================================
+גודל בבתים וזמן רינדור לכל שילוב של פורמט / רמת תיקון שגיאות / גודל,
+מול הרינדור הקודם (qrcode.make_image + PNG, ERROR_CORRECT_H).
+
+הרצה:
+    python benchmarks/qr_formats.py [--url URL] [--repeat N]
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode  # noqa: E402
+from utils import QRCodeGenerator  # noqa: E402
+
+
+def _legacy_png(url: str, box_size: int, border: int) -> bytes:
+    """הרינדור הישן - לשם השוואה"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    byte_io = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(byte_io, format='PNG')
+    return byte_io.getvalue()
+
+
+def _measure(render, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = render()
+        timings.append(time.perf_counter() - start)
+    return len(image), statistics.median(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='https://your-app.onrender.com/dQw4w9')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--border', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'variant':<18}{'ec':<4}{'size':>5}{'bytes':>9}{'ms':>9}")
+    for box_size in (4, 10):
+        size, ms = _measure(lambda: _legacy_png(args.url, box_size, args.border), args.repeat)
+        print(f"{'legacy-png':<18}{'H':<4}{box_size:>5}{size:>9}{ms:>9.2f}")
+
+        for fmt in QRCodeGenerator.FORMATS:
+            for ec in QRCodeGenerator.ERROR_CORRECTION:
+                size, ms = _measure(
+                    lambda: QRCodeGenerator.render(args.url, fmt, box_size, args.border, ec),
+                    args.repeat,
+                )
+                print(f"{fmt:<18}{ec:<4}{box_size:>5}{size:>9}{ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+URL Shortener Bot - Replica Mode Check
+=======================================
+בדיקה מקצה לקצה של LinkReplica מול single-node replica set (ראו DEPLOYMENT.md):
+טעינה מלאה, insert / delete מה-change stream, resume אחרי ניתוק, ו-drop של ה-collection.
+
+עובד על DB זמני (נמחק בסוף), לא על ה-DB של הבוט.
+
+הרצה:
+    mongod --replSet rs0 --port 27017 --dbpath ./data/db
+    mongosh --eval "rs.initiate()"
+    python benchmarks/replica_check.py [--uri mongodb://localhost:27017/?replicaSet=rs0&directConnection=true]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+from async_database import AsyncURLRepository  # noqa: E402
+from replica import LinkReplica  # noqa: E402
+
+
+class _Repo:
+    """מה ש-LinkReplica צריך מה-repository: collection + iter_link_table"""
+
+    iter_link_table = AsyncURLRepository.iter_link_table
+
+    def __init__(self, collection):
+        self.collection = collection
+
+
+async def _wait_for(predicate, what: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError(f"timed out waiting for: {what}")
+        await asyncio.sleep(0.05)
+    print(f"  ok - {what}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default='mongodb://localhost:27017/?replicaSet=rs0&directConnection=true')
+    parser.add_argument('--links', type=int, default=20000)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.uri, serverSelectionTimeoutMS=5000)
+    db_name = f"replica_check_{os.getpid()}"
+    collection = client[db_name].urls
+    repo = _Repo(collection)
+    replica = LinkReplica(batch_size=5000)
+
+    try:
+        print("bulk load")
+        await collection.insert_many(
+            [{"short_code": f"c{i}", "original_url": f"https://example.com/{i}"} for i in range(args.links)]
+        )
+        task = asyncio.create_task(replica.run(repo))
+        await _wait_for(lambda: replica.ready and len(replica._links) == args.links, f"{args.links} links loaded")
+
+        print("change stream")
+        result = await collection.insert_one({"short_code": "new", "original_url": "https://example.com/new"})
+        await _wait_for(lambda: replica.get("new") == "https://example.com/new", "insert applied")
+        await collection.delete_one({"_id": result.inserted_id})
+        await _wait_for(lambda: replica.get("new") is None, "delete applied")
+        await collection.update_one({"short_code": "c0"}, {"$inc": {"clicks": 1}})
+
+        print("resume")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        loads = replica.loads
+        await collection.insert_one({"short_code": "offline", "original_url": "https://example.com/offline"})
+        task = asyncio.create_task(replica.run(repo))
+        await _wait_for(lambda: replica.get("offline") is not None, "change made while down applied")
+        assert replica.loads == loads, "resume must not trigger a full reload"
+        print("  ok - resumed from token without a full reload")
+
+        print("drop")
+        loads = replica.loads
+        await collection.drop()
+        await collection.insert_one({"short_code": "after", "original_url": "https://example.com/after"})
+        await _wait_for(lambda: replica.loads > loads, "full reload after drop / invalidate")
+        await _wait_for(lambda: replica.ready and replica.get("after") is not None, "ready again after drop")
+        assert replica.get("c1") is None, "dropped links must be gone"
+        print("  ok - dropped links removed")
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        print(f"\nall checks passed: {replica.stats()}")
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
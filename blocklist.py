@@ -0,0 +1,148 @@
+"""
+URL Shortener Bot - Domain Blocklist
+=====================================
+רשימת דומיינים חסומים (Config.BLOCKED_DOMAINS + קובץ מקומי עם 100k+ רשומות).
+בדיקה לפי סיומות labels: a.b.example.com נבדק מול a.b.example.com, b.example.com,
+example.com, com - O(labels) חיפושי hash, בלי התאמות חלקיות (ad.com לא חוסם bad.com).
+הקובץ נטען מחדש כשהוא משתנה, בלי restart.
+"""
+
+import logging
+import os
+import time
+from typing import FrozenSet, Iterable, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_domain(domain: str) -> str:
+    """
+    צורה אחידה לדומיין: lowercase, בלי '*.' / נקודות בקצוות, IDNA
+
+    Args:
+        domain: דומיין מהרשימה או מ-URL
+
+    Returns:
+        הדומיין המנורמל (או מחרוזת ריקה)
+    """
+    domain = domain.strip().lower()
+    if domain.startswith('*.'):
+        domain = domain[2:]
+    domain = domain.strip('.')
+    try:
+        return domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        return domain
+
+
+def _parse_lines(lines: Iterable[str]) -> Iterable[str]:
+    """שורה לכל דומיין; '#' להערות; תומך גם בפורמט hosts (0.0.0.0 domain)"""
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        domain = normalize_domain(line.split()[-1])
+        if domain:
+            yield domain
+
+
+class DomainBlocklist:
+    """
+    דומיינים חסומים כ-frozenset (ההחלפה בטעינה מחדש היא השמה אחת)
+
+    - is_blocked(): עד labels חיפושים ב-set
+    - reload_if_changed(): טעינה מחדש אם ה-mtime/size של הקובץ השתנו
+    """
+
+    def __init__(self, path: Optional[str], static_domains: Iterable[str], check_seconds: float = 30):
+        self.path = path
+        self.check_seconds = float(check_seconds)
+        self._static = frozenset(d for d in (normalize_domain(x) for x in static_domains) if d)
+        self._domains: FrozenSet[str] = self._static
+        self._identity: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+
+        self.loads = 0
+        self.blocked = 0
+
+    def reload_if_changed(self) -> bool:
+        """
+        טעינת הקובץ אם השתנה (לכל היותר פעם ב-check_seconds)
+
+        Returns:
+            True אם נטענה רשימה חדשה
+        """
+        now = time.monotonic()
+        if not self.path or now < self._next_check:
+            return False
+        self._next_check = now + self.check_seconds
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._identity is not None:
+                logger.warning(f"⚠️ Blocklist file removed: {self.path}")
+                self._domains, self._identity = self._static, None
+            return False
+
+        identity = (st.st_mtime_ns, st.st_size)
+        if identity == self._identity:
+            return False
+
+        try:
+            with open(self.path, 'r', encoding='utf-8', errors='ignore') as f:
+                domains = self._static | frozenset(_parse_lines(f))
+        except OSError as e:
+            logger.error(f"❌ Error loading blocklist: {e}")
+            return False
+
+        self._domains, self._identity = domains, identity
+        self.loads += 1
+        logger.info(f"✅ Blocklist loaded: {len(domains)} domains")
+        return True
+
+    def is_blocked(self, host: str) -> bool:
+        """
+        האם ה-host או אחד מה-parent domains שלו חסום
+
+        Args:
+            host: ה-hostname מה-URL
+
+        Returns:
+            True אם חסום
+        """
+        if self._identity is None:
+            self.reload_if_changed()
+
+        domains = self._domains
+        if not domains or not host:
+            return False
+
+        host = normalize_domain(host)
+        while True:
+            if host in domains:
+                self.blocked += 1
+                return True
+            dot = host.find('.')
+            if dot < 0:
+                return False
+            host = host[dot + 1:]
+
+    def __len__(self) -> int:
+        return len(self._domains)
+
+    def stats(self) -> dict:
+        return {
+            "domains": len(self._domains),
+            "loads": self.loads,
+            "blocked": self.blocked,
+        }
+
+
+# Singleton instance
+domain_blocklist = DomainBlocklist(
+    path=Config.BLOCKLIST_PATH,
+    static_domains=Config.BLOCKED_DOMAINS,
+    check_seconds=Config.BLOCKLIST_RELOAD_SECONDS,
+)
@@ -0,0 +1,228 @@
+"""
+URL Shortener Bot - Short Code Filter
+======================================
+Bloom filter של כל הקודים הקיימים - תשובת "בוודאות לא קיים" בלי לגשת ל-MongoDB
+"""
+
+import hashlib
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+from config import Config
+
+
+class BloomFilter:
+    """
+    Bloom filter קלאסי על bytearray
+
+    - might_contain() == False  =>  הקוד בוודאות לא הוכנס
+    - might_contain() == True   =>  ייתכן שקיים (בהסתברות false positive)
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = max(1, int(capacity))
+        self.fp_rate = min(max(float(fp_rate), 1e-9), 0.5)
+
+        # m = -n*ln(p) / ln(2)^2 ,  k = (m/n) * ln(2)
+        self.num_bits = max(8, int(math.ceil(-self.capacity * math.log(self.fp_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / self.capacity * math.log(2))))
+
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        """מיקומי הביטים לפריט (double hashing על blake2b)"""
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        return ((h1 + i * h2) % m for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        """
+        הוספת פריט (הוספה חוזרת של פריט קיים לא מגדילה את count)
+
+        Args:
+            item: הפריט (short_code)
+        """
+        bits = self._bits
+        changed = False
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                changed = True
+        if changed:
+            self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        """
+        בדיקת שייכות
+
+        Args:
+            item: הפריט (short_code)
+
+        Returns:
+            False אם בוודאות לא קיים, True אם ייתכן שקיים
+        """
+        bits = self._bits
+        for pos in self._positions(item):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def estimated_fp_rate(self) -> float:
+        """הסתברות false positive משוערת לפי כמות הפריטים בפועל"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
+
+
+class ShortCodeFilter:
+    """
+    עטיפה ל-BloomFilter עם מצב מוכנות ומעקב סנכרון מול ה-DB
+
+    - עד שה-filter נבנה (ready=False) כל בדיקה מחזירה "ייתכן שקיים"
+    - קודים חדשים נכנסים ב-create ובסנכרון תקופתי לפי watermark של created_at
+      (כדי לתפוס קודים שנוצרו ב-workers אחרים)
+    - Bloom לא תומך במחיקה: מחיקות נספרות, ומעל סף יחסי ה-filter נבנה מחדש
+    - כמה workers / כותבים חיצוניים: קוד שנוצר בתהליך אחר חסר ב-filter עד הסנכרון הבא.
+      לכן "לא נמצא" סופי רק כשה-filter סונכרן לפני פחות מ-fresh_seconds; miss על filter
+      ישן מסנכרן אותו (refresh לפי ה-watermark, פעם אחת לכל ה-misses) ובודק שוב
+    - trust_negatives=True (כותב יחיד): כל "לא נמצא" סופי, בלי סנכרון
+    """
+
+    def __init__(self, capacity: int, fp_rate: float, trust_negatives: bool = True, fresh_seconds: float = 1.0):
+        self.min_capacity = capacity
+        self.target_fp_rate = fp_rate
+        self._bloom = BloomFilter(capacity, fp_rate)
+
+        # קודים שנוספו בזמן בנייה מלאה (יועתקו ל-filter החדש בהחלפה)
+        self._added_during_build: Optional[list] = None
+
+        self.ready = False
+        self.watermark: Optional[datetime] = None
+        self.trust_negatives = trust_negatives
+        self.fresh_seconds = max(0.0, float(fresh_seconds))
+        # time.monotonic() של תחילת הסנכרון האחרון שהושלם
+        self.synced_at: Optional[float] = None
+        self.deleted_since_build = 0
+        self.negatives = 0
+        self.stale_misses = 0
+
+    def begin_build(self, expected_items: int) -> BloomFilter:
+        """
+        התחלת בנייה מלאה - ה-filter הנוכחי ממשיך לשרת עד ההחלפה
+
+        Args:
+            expected_items: כמות הקודים הצפויה (הקיבולת תהיה לפחות פי 2)
+
+        Returns:
+            BloomFilter ריק למילוי
+        """
+        capacity = max(self.min_capacity, int(expected_items) * 2)
+        self._added_during_build = []
+        return BloomFilter(capacity, self.target_fp_rate)
+
+    def finish_build(self, bloom: BloomFilter, watermark: Optional[datetime], synced_at: float) -> None:
+        """
+        החלפה אטומית ל-filter שנבנה
+
+        Args:
+            bloom: ה-filter החדש (מלא)
+            watermark: ה-created_at המקסימלי שנטען
+            synced_at: time.monotonic() מתחילת הבנייה
+        """
+        for short_code in self._added_during_build or ():
+            bloom.add(short_code)
+
+        self._bloom = bloom
+        self._added_during_build = None
+        self.watermark = watermark
+        self.synced_at = synced_at
+        self.deleted_since_build = 0
+        self.ready = True
+
+    def add(self, short_code: str) -> None:
+        """הוספת קוד (ב-create או בסנכרון)"""
+        self._bloom.add(short_code)
+        if self._added_during_build is not None:
+            self._added_during_build.append(short_code)
+
+    def note_deleted(self, short_code: str) -> None:
+        """רישום מחיקה (הביטים נשארים - הקוד פשוט ייפול ל-DB)"""
+        self.deleted_since_build += 1
+
+    @property
+    def fresh(self) -> bool:
+        """האם ה-filter סונכרן מול ה-DB לפני פחות מ-fresh_seconds"""
+        return self.synced_at is not None and time.monotonic() - self.synced_at < self.fresh_seconds
+
+    def missing(self, short_code: str) -> bool:
+        """האם הקוד חסר ב-filter מוכן (בלי להכריע אם זה סופי)"""
+        return self.ready and not self._bloom.might_contain(short_code)
+
+    def definitely_absent(self, short_code: str) -> bool:
+        """
+        האם הקוד בוודאות לא קיים
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            True אם הקוד חסר ב-filter, וה-filter טרי או שאין כותבים אחרים
+        """
+        if not self.missing(short_code):
+            return False
+
+        if not (self.trust_negatives or self.fresh):
+            self.stale_misses += 1
+            return False
+
+        self.negatives += 1
+        return True
+
+    @property
+    def needs_rebuild(self) -> bool:
+        """יותר מדי מחיקות או חריגה מהקיבולת - עדיף לבנות מחדש"""
+        bloom = self._bloom
+        if bloom.count > bloom.capacity:
+            return True
+        return self.deleted_since_build > max(1000, bloom.count // 4)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        סטטיסטיקות ה-filter
+
+        Returns:
+            dict עם גודל ו-false positive rate
+        """
+        bloom = self._bloom
+        return {
+            "ready": self.ready,
+            "trust_negatives": self.trust_negatives,
+            "fresh": self.fresh,
+            "items": bloom.count,
+            "capacity": bloom.capacity,
+            "size_bytes": bloom.size_bytes,
+            "num_bits": bloom.num_bits,
+            "num_hashes": bloom.num_hashes,
+            "target_fp_rate": bloom.fp_rate,
+            "estimated_fp_rate": round(bloom.estimated_fp_rate(), 8),
+            "deleted_since_build": self.deleted_since_build,
+            "negatives": self.negatives,
+            "stale_misses": self.stale_misses,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+        }
+
+
+# Singleton instance
+short_code_filter = ShortCodeFilter(
+    capacity=Config.BLOOM_CAPACITY,
+    fp_rate=Config.BLOOM_FP_RATE,
+    trust_negatives=Config.BLOOM_SINGLE_WRITER,
+    fresh_seconds=Config.BLOOM_MISS_FRESH_SECONDS,
+)
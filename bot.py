@@ -4,7 +4,10 @@ URL Shortener Bot - Main Bot Logic
 כל ההנדלרים והלוגיקה של הבוט
 """
 
+import asyncio
+import io
 import logging
+import tempfile
 from telegram import Update, InputFile, CallbackQuery
 from telegram.ext import (
     Application,
@@ -15,22 +18,23 @@ from telegram.ext import (
     filters
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from activity_reporter import create_reporter
 from config import Config, Messages
-from database import (
+from async_database import (
     url_repo,
     user_repo,
-    create_url,
+    create_short_url,
     get_url,
+    get_url_with_clicks,
+    set_qr_file_id,
     get_user_urls,
     count_user_urls,
     create_or_update_user,
     get_user_stats
 )
 from utils import (
-    generate_short_code,
     validate_url,
-    generate_qr,
     format_time_ago,
     truncate_text,
     rate_limiter,
@@ -47,7 +51,13 @@ from keyboards import (
     back_keyboard,
     user_stats_keyboard
 )
+from metrics import timed, BOT_HANDLER_SECONDS, BOT_HANDLER_ERRORS
+from qr_cache import qr_cache
+from qr_pool import qr_pool, QRPoolBusy
+from qr_export import qr_exporter, QRExportBusy, QRExportTooLarge
+from state_store import conversation_states
 import math
+import time
 
 # ה (שמור בראש הקובץ אחרי טעינת משתנים)
 reporter = create_reporter(
@@ -68,8 +78,8 @@ class BotHandlers:
     """מחלקה המכילה את כל ה-handlers של הבוט"""
     
     def __init__(self):
-        # מצב המשתמש (לשמירת context בין הודעות)
-        self.user_states = {}
+        # מצב המשתמש (לשמירת context בין הודעות) - TTL, חסום, משותף ל-workers ב-mongo
+        self.user_states = conversation_states
 
     async def _edit_or_reply_text(
         self,
@@ -128,6 +138,7 @@ class BotHandlers:
         
         raise RuntimeError("Cannot respond: no message/callback_query/effective_chat available")
     
+    @timed(BOT_HANDLER_SECONDS, "command", "start", errors=BOT_HANDLER_ERRORS)
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         פקודת /start - הודעת פתיחה
@@ -136,7 +147,7 @@ class BotHandlers:
         user = update.effective_user
         
         # שמירת פרטי המשתמש ב-DB
-        create_or_update_user(
+        await create_or_update_user(
             user_id=user.id,
             username=user.username,
             first_name=user.first_name,
@@ -151,6 +162,7 @@ class BotHandlers:
         
         logger.info(f"User {user.id} (@{user.username}) started the bot")
     
+    @timed(BOT_HANDLER_SECONDS, "command", "help", errors=BOT_HANDLER_ERRORS)
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         פקודת /help - עזרה
@@ -162,6 +174,7 @@ class BotHandlers:
             parse_mode=ParseMode.MARKDOWN
         )
     
+    @timed(BOT_HANDLER_SECONDS, "command", "shorten", errors=BOT_HANDLER_ERRORS)
     async def shorten_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         פקודת /shorten - קיצור קישור
@@ -183,7 +196,7 @@ class BotHandlers:
             return
         
         # הגדרת מצב המתנה ל-URL
-        self.user_states[user_id] = 'waiting_for_url'
+        await self.user_states.set(user_id, 'waiting_for_url')
         
         await update.message.reply_text(
             Messages.SEND_URL,
@@ -191,6 +204,7 @@ class BotHandlers:
             parse_mode=ParseMode.MARKDOWN
         )
     
+    @timed(BOT_HANDLER_SECONDS, "command", "mylinks", errors=BOT_HANDLER_ERRORS)
     async def mylinks_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         פקודת /mylinks - הצגת קישורים של המשתמש
@@ -200,6 +214,7 @@ class BotHandlers:
         
         await self._show_my_links(update, context, user_id, page=1)
     
+    @timed(BOT_HANDLER_SECONDS, "command", "stats", errors=BOT_HANDLER_ERRORS)
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         פקודת /stats - סטטיסטיקות משתמש
@@ -209,6 +224,50 @@ class BotHandlers:
         
         await self._show_user_stats(update, context, user_id)
     
+    @timed(BOT_HANDLER_SECONDS, "command", "export", errors=BOT_HANDLER_ERRORS)
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        פקודת /export - ZIP עם QR לכל הקישורים של המשתמש
+        """
+        reporter.report_activity(update.effective_user.id)
+        user_id = update.effective_user.id
+        
+        if await count_user_urls(user_id) == 0:
+            await update.message.reply_text(Messages.EXPORT_EMPTY, reply_markup=back_keyboard())
+            return
+        
+        try:
+            # תופס את המקום של המשתמש - /export מקביל נדחה כאן
+            chunks = qr_exporter.stream(user_id)
+        except QRExportBusy:
+            await update.message.reply_text(Messages.EXPORT_BUSY)
+            return
+        
+        try:
+            await update.message.reply_text(Messages.EXPORT_STARTED, parse_mode=ParseMode.MARKDOWN)
+            
+            # הארכיון נבנה בקובץ זמני בדיסק; PTB קורא אותו לזיכרון בהעלאה,
+            # ולכן הגודל חסום ב-QR_EXPORT_MAX_BYTES
+            with tempfile.TemporaryFile() as archive:
+                size = await qr_exporter.export_to_file(chunks, archive)
+                archive.seek(0)
+                
+                await update.message.reply_document(
+                    document=InputFile(archive, filename='qr_codes.zip'),
+                    caption=Messages.EXPORT_DONE
+                )
+            
+            logger.info(f"Exported QR ZIP for user {user_id} ({size} bytes)")
+        
+        except QRExportTooLarge:
+            await update.message.reply_text(Messages.EXPORT_TOO_LARGE)
+        except Exception as e:
+            logger.error(f"Error exporting QR ZIP for user {user_id}: {e}")
+            await update.message.reply_text(Messages.ERROR_GENERAL, parse_mode=ParseMode.MARKDOWN)
+        finally:
+            await chunks.aclose()
+            qr_exporter.release(user_id)
+    
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         טיפול בלחיצות על כפתורים
@@ -222,6 +281,32 @@ class BotHandlers:
         
         logger.info(f"User {user_id} clicked button: {data}")
         
+        action = self._callback_action(data)
+        start = time.perf_counter()
+        try:
+            await self._route_callback(query, context, user_id, data)
+        except Exception:
+            BOT_HANDLER_ERRORS.inc("callback", action)
+            raise
+        finally:
+            BOT_HANDLER_SECONDS.observe(time.perf_counter() - start, "callback", action)
+    
+    # פעולות כפתור ידועות (label ל-metrics בלי הפרמטרים - למשל qr_abc123 -> qr)
+    _CALLBACK_ACTIONS = (
+        'main_menu', 'shorten_new', 'my_links', 'user_stats', 'help',
+        'view_', 'stats_', 'qr_', 'delete_confirmed_', 'delete_confirm_', 'page_'
+    )
+    
+    @classmethod
+    def _callback_action(cls, data: str) -> str:
+        """שם הפעולה מתוך callback_data"""
+        for action in cls._CALLBACK_ACTIONS:
+            if data == action or (action.endswith('_') and data.startswith(action)):
+                return action.rstrip('_')
+        return 'other'
+    
+    async def _route_callback(self, query, context, user_id: int, data: str):
+        """ניתוב לחיצה על כפתור ל-handler המתאים"""
         # ניתוב לפי סוג הכפתור
         if data == 'main_menu':
             await self._handle_main_menu(query, context)
@@ -262,6 +347,7 @@ class BotHandlers:
             page = int(data.replace('page_', ''))
             await self._handle_pagination(query, context, user_id, page)
     
+    @timed(BOT_HANDLER_SECONDS, "message", "text", errors=BOT_HANDLER_ERRORS)
     async def message_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
         טיפול בהודעות טקסט (בעיקר URLs)
@@ -270,11 +356,9 @@ class BotHandlers:
         user_id = update.effective_user.id
         text = update.message.text
         
-        # בדיקה אם המשתמש במצב המתנה ל-URL
-        if self.user_states.get(user_id) == 'waiting_for_url':
+        # בדיקה אם המשתמש במצב המתנה ל-URL (pop - המצב מאופס מיד)
+        if await self.user_states.pop(user_id) == 'waiting_for_url':
             await self._process_url_shortening(update, context, user_id, text)
-            # איפוס המצב
-            self.user_states[user_id] = None
         else:
             # הודעה כללית
             await update.message.reply_text(
@@ -293,7 +377,7 @@ class BotHandlers:
     ):
         """הצגת רשימת קישורים של המשתמש"""
         # ספירת סה"כ קישורים
-        total_urls = count_user_urls(user_id)
+        total_urls = await count_user_urls(user_id)
         
         if total_urls == 0:
             message = Messages.MY_LINKS_EMPTY
@@ -304,7 +388,7 @@ class BotHandlers:
             total_pages = math.ceil(total_urls / per_page)
             
             # משיכת קישורים לעמוד הנוכחי
-            urls = get_user_urls(user_id, page=page, per_page=per_page)
+            urls = await get_user_urls(user_id, page=page, per_page=per_page)
             
             # בניית הודעה
             message = Messages.MY_LINKS_HEADER.format(
@@ -329,7 +413,7 @@ class BotHandlers:
         user_id: int
     ):
         """הצגת סטטיסטיקות המשתמש"""
-        stats = get_user_stats(user_id)
+        stats = await get_user_stats(user_id)
         
         if not stats:
             message = "❌ לא נמצאו נתונים"
@@ -389,6 +473,8 @@ class BotHandlers:
                 )
             elif reason == 'blocked_domain':
                 message = Messages.ERROR_BLOCKED_DOMAIN
+            elif reason == 'malicious_url':
+                message = Messages.ERROR_MALICIOUS_URL
             else:
                 message = Messages.ERROR_GENERAL
             
@@ -399,7 +485,7 @@ class BotHandlers:
             return
         
         # בדיקה אם המשתמש כבר קיצר את הקישור הזה
-        existing = url_repo.find_existing(user_id, url)
+        existing = await url_repo.find_existing(user_id, url)
         
         if existing:
             # הקישור כבר קיים - פשוט נחזיר אותו
@@ -415,27 +501,8 @@ class BotHandlers:
                          created_at=created_at
                      )
         else:
-            # יצירת קוד קצר חדש
-            max_attempts = 5
-            short_code = None
-            
-            for _ in range(max_attempts):
-                temp_code = generate_short_code()
-                
-                # בדיקה שהקוד לא קיים
-                if not get_url(temp_code):
-                    short_code = temp_code
-                    break
-            
-            if not short_code:
-                await update.message.reply_text(
-                    Messages.ERROR_GENERAL,
-                    reply_markup=back_keyboard()
-                )
-                return
-            
-            # שמירה ב-DB
-            url_doc = create_url(user_id, url, short_code)
+            # יצירת קוד קצר חדש ושמירה ב-DB (בלי בדיקת קיום - ה-allocator מבטיח ייחודיות)
+            url_doc = await create_short_url(user_id, url)
             
             if not url_doc:
                 await update.message.reply_text(
@@ -444,6 +511,8 @@ class BotHandlers:
                 )
                 return
             
+            short_code = url_doc['short_code']
+            
             # הוספה ל-rate limiter
             rate_limiter.add_request(user_id)
             
@@ -496,7 +565,7 @@ class BotHandlers:
             return
         
         # הגדרת מצב המתנה
-        self.user_states[user_id] = 'waiting_for_url'
+        await self.user_states.set(user_id, 'waiting_for_url')
         
         await query.edit_message_text(
             Messages.SEND_URL,
@@ -522,7 +591,7 @@ class BotHandlers:
     
     async def _handle_view_url(self, query, context, short_code):
         """טיפול בצפייה בקישור"""
-        url_doc = get_url(short_code)
+        url_doc = await get_url(short_code)
         
         if not url_doc:
             await query.edit_message_text(
@@ -550,7 +619,7 @@ class BotHandlers:
     
     async def _handle_stats(self, query, context, short_code):
         """טיפול בצפייה בסטטיסטיקות קישור"""
-        url_doc = get_url(short_code)
+        url_doc = await get_url_with_clicks(short_code)
         
         if not url_doc:
             await query.edit_message_text(
@@ -584,7 +653,7 @@ class BotHandlers:
     
     async def _handle_qr(self, query, context, short_code, user_id):
         """טיפול ביצירת QR Code"""
-        url_doc = get_url(short_code)
+        url_doc = await get_url(short_code)
         
         if not url_doc:
             await query.answer("❌ הקישור לא נמצא", show_alert=True)
@@ -596,28 +665,62 @@ class BotHandlers:
         #     return
         
         try:
-            # יצירת QR
             short_url = f"{Config.BASE_URL}/{short_code}"
-            qr_image = generate_qr(short_url)
+            variant = qr_cache.variant(
+                short_url, Config.QR_BOX_SIZE, Config.QR_BORDER, 'png', Config.QR_ERROR_CORRECTION
+            )
+            
+            # התמונה כבר הועלתה לטלגרם - שליחה לפי file_id, בלי רינדור והעלאה
+            file_id = (url_doc.get('qr_file_ids') or {}).get(variant)
+            if file_id:
+                try:
+                    await query.message.reply_photo(
+                        photo=file_id,
+                        caption=Messages.QR_GENERATED,
+                        reply_markup=qr_keyboard(short_code)
+                    )
+                    await query.answer("✅ QR Code נוצר!")
+                    return
+                except BadRequest as e:
+                    # file_id לא תקף (למשל טוקן אחר) - מעלים מחדש
+                    logger.warning(f"Stale QR file_id for {short_code}: {e}")
+            
+            # QR מה-cache (זיכרון / דיסק) או רינדור ב-process pool
+            image, _ = await qr_cache.get_or_render(
+                short_code,
+                short_url,
+                lambda: qr_pool.render(
+                    short_url, Config.QR_BOX_SIZE, Config.QR_BORDER, 'png', Config.QR_ERROR_CORRECTION
+                ),
+                box_size=Config.QR_BOX_SIZE,
+                border=Config.QR_BORDER,
+                error_correction=Config.QR_ERROR_CORRECTION,
+            )
             
             # שליחת התמונה
-            await query.message.reply_photo(
-                photo=InputFile(qr_image, filename=f'qr_{short_code}.png'),
+            sent = await query.message.reply_photo(
+                photo=InputFile(io.BytesIO(image), filename=f'qr_{short_code}.png'),
                 caption=Messages.QR_GENERATED,
                 reply_markup=qr_keyboard(short_code)
             )
             
+            # הגודל הגדול ביותר - זה שנשלח בפעם הבאה
+            if sent and sent.photo:
+                await set_qr_file_id(short_code, variant, sent.photo[-1].file_id)
+            
             await query.answer("✅ QR Code נוצר!")
             
             logger.info(f"Generated QR for {short_code}")
             
+        except (QRPoolBusy, asyncio.TimeoutError):
+            await query.answer("⏳ עומס ביצירת QR, נסה שוב בעוד רגע", show_alert=True)
         except Exception as e:
             logger.error(f"Error generating QR: {e}")
             await query.answer("❌ שגיאה ביצירת QR", show_alert=True)
     
     async def _handle_delete_confirm(self, query, context, short_code):
         """טיפול באישור מחיקה"""
-        url_doc = get_url(short_code)
+        url_doc = await get_url(short_code)
         
         if not url_doc:
             await query.answer("❌ הקישור לא נמצא", show_alert=True)
@@ -636,7 +739,7 @@ class BotHandlers:
     async def _handle_delete_confirmed(self, query, context, short_code, user_id):
         """טיפול במחיקה מאושרת"""
         # מחיקה מה-DB
-        success = url_repo.delete(short_code, user_id)
+        success = await url_repo.delete(short_code, user_id)
         
         if success:
             await query.edit_message_text(
@@ -676,6 +779,7 @@ def create_bot_application() -> Application:
     application.add_handler(CommandHandler("shorten", handlers.shorten_command))
     application.add_handler(CommandHandler("mylinks", handlers.mylinks_command))
     application.add_handler(CommandHandler("stats", handlers.stats_command))
+    application.add_handler(CommandHandler("export", handlers.export_command))
     
     # Callback handlers
     application.add_handler(CallbackQueryHandler(handlers.button_callback))
@@ -715,5 +819,4 @@ async def main():
 
 
 if __name__ == '__main__':
-    import asyncio
     asyncio.run(main())
@@ -0,0 +1,177 @@
+"""
+URL Shortener Bot - Redirect Cache
+===================================
+Cache בזיכרון (LRU + TTL) עבור short_code -> original_url בנתיב ה-redirect
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+from config import Config
+
+
+class LRUTTLCache:
+    """
+    Cache חסום בגודל ובזמן חיים לכל רשומה
+
+    - הרשומה הכי פחות בשימוש נזרקת כשהגודל עובר את max_size
+    - רשומה שעבר ה-TTL שלה נחשבת miss ונמחקת בקריאה
+    - מפתחות מוצמדים (pin) נשמרים בנפרד ולא נזרקים ב-LRU (רק TTL)
+    - מונים: hits / misses / evictions / expirations / invalidations
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max(1, int(max_size))
+        self.ttl_seconds = float(ttl_seconds)
+        # מבנה: {key: (value, expires_at)}
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # רשומות מוצמדות (קישורים חמים) - מחוץ ל-LRU ולא נספרות ב-max_size
+        self._pinned_keys: Set[Hashable] = set()
+        self._pinned: Dict[Hashable, tuple] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        משיכת ערך מה-cache
+
+        Args:
+            key: המפתח
+
+        Returns:
+            הערך או None אם לא קיים / פג תוקף
+        """
+        entry = self._pinned.get(key)
+        pinned = entry is not None
+        if not pinned:
+            entry = self._data.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+
+        if expires_at <= time.monotonic():
+            if pinned:
+                del self._pinned[key]
+            else:
+                del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        if not pinned:
+            self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        הכנסת ערך ל-cache (עם זריקת הישן ביותר אם צריך)
+
+        Args:
+            key: המפתח
+            value: הערך
+        """
+        entry = (value, time.monotonic() + self.ttl_seconds)
+
+        if key in self._pinned_keys:
+            self._pinned[key] = entry
+            return
+
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pin(self, keys: Iterable[Hashable]) -> None:
+        """
+        החלפת קבוצת המפתחות המוצמדים (רשומות קיימות עוברות בין האזורים)
+
+        Args:
+            keys: המפתחות שלא ייזרקו ב-LRU
+        """
+        new_keys = set(keys)
+
+        for key in self._pinned_keys - new_keys:
+            entry = self._pinned.pop(key, None)
+            if entry is not None:
+                self._data[key] = entry
+
+        for key in new_keys - self._pinned_keys:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._pinned[key] = entry
+
+        self._pinned_keys = new_keys
+        self._evict()
+
+    def is_pinned(self, key: Hashable) -> bool:
+        return key in self._pinned_keys
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        הסרת מפתח מה-cache (למשל אחרי מחיקת קישור)
+
+        Args:
+            key: המפתח
+
+        Returns:
+            True אם המפתח היה ב-cache
+        """
+        if self._data.pop(key, None) is None and self._pinned.pop(key, None) is None:
+            return False
+
+        self.invalidations += 1
+        return True
+
+    def clear(self) -> None:
+        """ריקון ה-cache (המונים וקבוצת ה-pin נשמרים)"""
+        self._data.clear()
+        self._pinned.clear()
+
+    def __len__(self) -> int:
+        return len(self._data) + len(self._pinned)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._pinned.get(key) or self._data.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        סטטיסטיקות ה-cache
+
+        Returns:
+            dict עם גודל, מגבלות ומונים
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "pinned": len(self._pinned),
+            "pinned_keys": len(self._pinned_keys),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+# Singleton instance - משותף לכל ה-repositories בתהליך
+redirect_cache = LRUTTLCache(
+    max_size=Config.REDIRECT_CACHE_SIZE,
+    ttl_seconds=Config.REDIRECT_CACHE_TTL,
+)
@@ -0,0 +1,197 @@
+"""
+URL Shortener Bot - Click Buffer
+=================================
+צבירת קליקים בזיכרון (write-behind) וכתיבה מרוכזת ל-MongoDB עם bulk_write
+"""
+
+import asyncio
+import logging
+from contextlib import suppress
+from datetime import datetime
+from typing import Dict, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """
+    צובר קליקים לפי short_code ומבצע flush תקופתי
+
+    - record() סינכרוני ולא ממתין ל-Mongo (נקרא מנתיב ה-redirect)
+    - flush כל interval_ms או כשמצטברים max_events קליקים
+    - לכל קוד נשמרים סכום הקליקים וזמן הקליק האחרון (max)
+    - אם ה-flush נכשל, הדלתאות מוחזרות לבאפר לניסיון הבא
+    """
+
+    def __init__(self, interval_ms: int, max_events: int):
+        self.interval = max(1, int(interval_ms)) / 1000
+        self.max_events = max(1, int(max_events))
+
+        # מבנה: {short_code: [clicks, last_clicked]}
+        self._pending: Dict[str, List] = {}
+        self._events = 0
+
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        self.flushes = 0
+        self.flushed_clicks = 0
+        self.failed_flushes = 0
+
+    def record(self, short_code: str) -> None:
+        """
+        רישום קליק בודד
+
+        Args:
+            short_code: הקוד הקצר
+        """
+        now = datetime.utcnow()
+        entry = self._pending.get(short_code)
+
+        if entry is None:
+            self._pending[short_code] = [1, now]
+        else:
+            entry[0] += 1
+            entry[1] = now
+
+        self._events += 1
+
+        if self._events >= self.max_events and self._wake is not None:
+            self._wake.set()
+
+    @property
+    def pending_clicks(self) -> int:
+        """כמות הקליקים שעדיין לא נכתבו"""
+        return self._events
+
+    def start(self) -> None:
+        """הפעלת לולאת ה-flush ברקע (חייב לרוץ בתוך event loop)"""
+        if self._task is not None and not self._task.done():
+            return
+
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """עצירת הלולאה ו-flush אחרון (drain) כדי שלא יאבדו קליקים"""
+        # עצירה שיתופית: בלי cancel, כדי לא לקטוע bulk_write באמצע
+        if self._task is not None and not self._task.done():
+            self._stopping = True
+            self._wake.set()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        self._task = None
+
+        await self.flush()
+
+        if self._pending:
+            logger.error(f"❌ Click buffer drained with {self._events} clicks not persisted")
+
+    async def _run(self) -> None:
+        """לולאת flush: כל interval או כשהבאפר מתמלא"""
+        while not self._stopping:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            self._wake.clear()
+            if self._stopping:
+                break
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Error in click buffer loop: {e}")
+
+    async def flush(self) -> bool:
+        """
+        כתיבת כל הדלתאות המצטברות ב-bulk_write אחד
+        (קישורים חמים נכתבים ל-click_shards ב-bulk נפרד)
+
+        Returns:
+            True אם הכתיבה הצליחה (או שלא היה מה לכתוב)
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            from async_database import get_async_url_repo
+            from sharded_counters import hot_codes
+
+            repo = get_async_url_repo()
+
+            # סימון sharded=True לקישורים שעברו לסכמה המפוצלת
+            flags = hot_codes.take_pending_flags()
+            if flags and not await repo.mark_sharded(flags):
+                hot_codes.pending_flags |= flags
+
+            if not self._pending:
+                return True
+
+            batch, self._pending = self._pending, {}
+            self._events = 0
+
+            sharded = {code: delta for code, delta in batch.items() if hot_codes.is_hot(code)}
+            plain = {code: delta for code, delta in batch.items() if code not in sharded}
+
+            ok = True
+            writes = ((plain, repo.bulk_increment_clicks), (sharded, repo.bulk_increment_sharded))
+            done = 0
+            try:
+                for deltas, write in writes:
+                    if deltas:
+                        if await write(deltas):
+                            self.flushed_clicks += sum(clicks for clicks, _ in deltas.values())
+                        else:
+                            ok = False
+                            self._requeue(deltas)
+                    done += 1
+            finally:
+                # cancel / חריגה באמצע - מה שלא אושר חוזר לבאפר ל-drain הבא
+                # (עדיף ספירה כפולה נדירה על פני קליקים שנעלמים)
+                for deltas, _ in writes[done:]:
+                    self._requeue(deltas)
+
+            if ok:
+                self.flushes += 1
+            else:
+                self.failed_flushes += 1
+            return ok
+
+    def _requeue(self, deltas: Dict[str, List]) -> None:
+        """החזרת דלתאות לבאפר (מיזוג עם קליקים שנרשמו בינתיים)"""
+        for short_code, (clicks, last_clicked) in deltas.items():
+            entry = self._pending.get(short_code)
+            if entry is None:
+                self._pending[short_code] = [clicks, last_clicked]
+            else:
+                entry[0] += clicks
+                entry[1] = max(entry[1], last_clicked)
+            self._events += clicks
+
+    def stats(self) -> Dict[str, int]:
+        """
+        סטטיסטיקות הבאפר
+
+        Returns:
+            dict עם מונים
+        """
+        return {
+            "pending_codes": len(self._pending),
+            "pending_clicks": self._events,
+            "flushes": self.flushes,
+            "flushed_clicks": self.flushed_clicks,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+# Singleton instance
+click_buffer = ClickBuffer(
+    interval_ms=Config.CLICK_FLUSH_INTERVAL_MS,
+    max_events=Config.CLICK_FLUSH_MAX_EVENTS,
+)
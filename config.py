@@ -34,13 +34,104 @@ class Config:
     
     # Web Server (Quart)
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
+    # ערכי placeholder ציבוריים (ברירת המחדל כאן וב-.env.example) - לא סוד
+    PUBLIC_SECRET_KEYS = frozenset({
+        '',
+        'your-secret-key-change-in-production',
+        'your-secret-key-change-this-in-production',
+    })
     PORT = int(os.getenv('PORT', 5000))
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     
     # URL Shortener Settings
     SHORT_CODE_LENGTH = int(os.getenv('SHORT_CODE_LENGTH', 6))
+    # sequential - מזהים רצים מבלוקים שמורים + פרמוטציה עם מפתח (ברירת מחדל)
+    # random     - קוד אקראי, התנגשות נתפסת ב-unique index
+    SHORT_CODE_STRATEGY = os.getenv('SHORT_CODE_STRATEGY', 'sequential').lower()
+    SHORT_CODE_BLOCK_SIZE = int(os.getenv('SHORT_CODE_BLOCK_SIZE', 100))
+    SHORT_CODE_KEY = os.getenv('SHORT_CODE_KEY')  # ברירת מחדל: נגזר מ-SECRET_KEY
+    # Dedup גלובלי: /api/shorten אנונימי (user_id=0) מחזיר קוד קיים של כל משתמש לאותו URL
+    GLOBAL_DEDUP = os.getenv('GLOBAL_DEDUP', 'False').lower() == 'true'
+    
+    # Keyspace - הגדלת אורך הקוד האקראי לפני שההתנגשויות מורגשות
+    KEYSPACE_MAX_FILL = float(os.getenv('KEYSPACE_MAX_FILL', 0.01))
+    KEYSPACE_MAX_COLLISION_RATE = float(os.getenv('KEYSPACE_MAX_COLLISION_RATE', 0.02))
+    KEYSPACE_REFRESH_SECONDS = float(os.getenv('KEYSPACE_REFRESH_SECONDS', 300))
     BASE_URL = os.getenv('BASE_URL', 'https://yourapp.onrender.com')
     
+    # Redirect Mode:
+    # buffered - cache + צבירת קליקים בזיכרון ו-bulk flush (ברירת מחדל)
+    # atomic   - find_one_and_update אחד לכל redirect (ספירה מדויקת, בלי באפר)
+    REDIRECT_MODE = os.getenv('REDIRECT_MODE', 'buffered').lower()
+    
+    # ASGI fast path ל-GET /<short_code> (עוקף routing ו-jsonify של Quart)
+    FAST_REDIRECT_ENABLED = os.getenv('FAST_REDIRECT_ENABLED', 'True').lower() == 'true'
+    
+    # Redirect Cache (LRU + TTL בזיכרון התהליך)
+    REDIRECT_CACHE_SIZE = int(os.getenv('REDIRECT_CACHE_SIZE', 10000))
+    REDIRECT_CACHE_TTL = float(os.getenv('REDIRECT_CACHE_TTL', 300))
+    
+    # Click Buffer (כתיבה מרוכזת של קליקים)
+    CLICK_FLUSH_INTERVAL_MS = int(os.getenv('CLICK_FLUSH_INTERVAL_MS', 1000))
+    CLICK_FLUSH_MAX_EVENTS = int(os.getenv('CLICK_FLUSH_MAX_EVENTS', 500))
+    
+    # Short Code Filter (Bloom - "בוודאות לא קיים" בלי DB)
+    BLOOM_CAPACITY = int(os.getenv('BLOOM_CAPACITY', 100000))
+    BLOOM_FP_RATE = float(os.getenv('BLOOM_FP_RATE', 0.01))
+    BLOOM_REFRESH_SECONDS = float(os.getenv('BLOOM_REFRESH_SECONDS', 10))
+    BLOOM_REFRESH_MARGIN = float(os.getenv('BLOOM_REFRESH_MARGIN', 60))
+    # miss על filter שסונכרן לפני יותר מזה - סנכרון לפי watermark ובדיקה חוזרת
+    BLOOM_MISS_FRESH_SECONDS = float(os.getenv('BLOOM_MISS_FRESH_SECONDS', 1))
+    # כותב יחיד (worker אחד, בלי database.py) - כל miss סופי, בלי סנכרון
+    BLOOM_SINGLE_WRITER = os.getenv('BLOOM_SINGLE_WRITER', 'False').lower() == 'true'
+    
+    # Sharded Click Counters (קישורים חמים - פיזור $inc על N מסמכים)
+    SHARDED_COUNTERS_ENABLED = os.getenv('SHARDED_COUNTERS_ENABLED', 'True').lower() == 'true'
+    SHARDED_COUNTER_THRESHOLD = float(os.getenv('SHARDED_COUNTER_THRESHOLD', 20))  # קליקים לשנייה
+    SHARDED_COUNTER_WINDOW = float(os.getenv('SHARDED_COUNTER_WINDOW', 10))  # שניות
+    SHARDED_COUNTER_SHARDS = int(os.getenv('SHARDED_COUNTER_SHARDS', 16))
+    
+    # Hot Links (top-K בזרם ה-redirects - מוצמדים ב-cache ומחוממים אחרי restart)
+    HOT_LINKS_ENABLED = os.getenv('HOT_LINKS_ENABLED', 'True').lower() == 'true'
+    HOT_LINKS_CAPACITY = int(os.getenv('HOT_LINKS_CAPACITY', 512))  # מונים ב-sketch
+    HOT_LINKS_TOP_K = int(os.getenv('HOT_LINKS_TOP_K', 100))
+    HOT_LINKS_INTERVAL = float(os.getenv('HOT_LINKS_INTERVAL', 30))
+    HOT_LINKS_DECAY = float(os.getenv('HOT_LINKS_DECAY', 0.5))
+    HOT_LINKS_PATH = os.getenv('HOT_LINKS_PATH', 'data/hot_links.json')
+    
+    # Cache Warm-up (אחרי deploy / wake-up, לפני שהבוט מסומן מוכן)
+    WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'True').lower() == 'true'
+    WARMUP_TOP_CLICKS = int(os.getenv('WARMUP_TOP_CLICKS', 2000))
+    WARMUP_RECENT = int(os.getenv('WARMUP_RECENT', 2000))
+    WARMUP_BATCH_SIZE = int(os.getenv('WARMUP_BATCH_SIZE', 500))
+    WARMUP_BUDGET_SECONDS = float(os.getenv('WARMUP_BUDGET_SECONDS', 3))
+    
+    # Shared Redirect Cache (shared memory בין workers על אותו host)
+    SHARED_CACHE_ENABLED = os.getenv('SHARED_CACHE_ENABLED', 'False').lower() == 'true'
+    SHARED_CACHE_NAME = os.getenv('SHARED_CACHE_NAME', 'urlshortener_redirects')
+    SHARED_CACHE_SLOTS = int(os.getenv('SHARED_CACHE_SLOTS', 65536))
+    SHARED_CACHE_ARENA_MB = int(os.getenv('SHARED_CACHE_ARENA_MB', 16))
+    SHARED_CACHE_TTL = float(os.getenv('SHARED_CACHE_TTL', 3600))
+    SHARED_CACHE_FILL = int(os.getenv('SHARED_CACHE_FILL', 20000))  # מילוי ראשוני
+    
+    # Replica Mode (כל טבלת הקישורים בזיכרון, מסונכרנת מ-change stream - דורש replica set)
+    REPLICA_MODE_ENABLED = os.getenv('REPLICA_MODE_ENABLED', 'False').lower() == 'true'
+    
+    # Redirect Snapshot (קובץ ממופה לזיכרון ל-cold start ולזמן ש-Mongo לא זמין)
+    SNAPSHOT_ENABLED = os.getenv('SNAPSHOT_ENABLED', 'True').lower() == 'true'
+    SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'data/redirect_snapshot.bin')
+    SNAPSHOT_INTERVAL = float(os.getenv('SNAPSHOT_INTERVAL', 300))
+    SNAPSHOT_FULL_EVERY = int(os.getenv('SNAPSHOT_FULL_EVERY', 12))
+    SNAPSHOT_FALLBACK_SECONDS = float(os.getenv('SNAPSHOT_FALLBACK_SECONDS', 30))
+    
+    # Ops endpoints (/api/ops/*) - אם מוגדר, נדרש header X-Ops-Token
+    OPS_TOKEN = os.getenv('OPS_TOKEN')
+    
+    # מצב שיחה (waiting_for_url וכו') - local לתהליך יחיד, mongo למספר workers
+    STATE_BACKEND = os.getenv('STATE_BACKEND', 'local').lower()
+    STATE_TTL_SECONDS = float(os.getenv('STATE_TTL_SECONDS', 900))
+    STATE_MAX_ENTRIES = int(os.getenv('STATE_MAX_ENTRIES', 10000))  # local בלבד
+    
     # Rate Limiting (קישורים לשעה למשתמש)
     MAX_URLS_PER_HOUR = int(os.getenv('MAX_URLS_PER_HOUR', 10))
     MAX_URLS_PER_DAY = int(os.getenv('MAX_URLS_PER_DAY', 50))
@@ -48,10 +139,40 @@ class Config:
     # QR Code Settings
     QR_BOX_SIZE = int(os.getenv('QR_BOX_SIZE', 10))
     QR_BORDER = int(os.getenv('QR_BORDER', 4))
+    QR_ERROR_CORRECTION = os.getenv('QR_ERROR_CORRECTION', 'M').upper()  # L / M / Q / H
+    QR_MAX_BOX_SIZE = int(os.getenv('QR_MAX_BOX_SIZE', 40))  # תקרה ל-?size=
+    QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 500))  # תמונות בזיכרון
+    QR_CACHE_DIR = os.getenv('QR_CACHE_DIR', 'data/qr_cache')  # ריק = בלי דיסק
+    QR_POOL_WORKERS = int(os.getenv('QR_POOL_WORKERS', 2))  # 0 = thread במקום תהליכים
+    QR_POOL_MAX_PENDING = int(os.getenv('QR_POOL_MAX_PENDING', 32))
+    QR_POOL_TIMEOUT = float(os.getenv('QR_POOL_TIMEOUT', 10))
+    QR_EXPORT_CONCURRENCY = int(os.getenv('QR_EXPORT_CONCURRENCY', 2))  # רינדורים במקביל לייצוא
+    QR_EXPORT_MAX_LINKS = int(os.getenv('QR_EXPORT_MAX_LINKS', 1000))  # 0 = בלי הגבלה
+    QR_EXPORT_MAX_BYTES = int(os.getenv('QR_EXPORT_MAX_BYTES', 20 * 1024 * 1024))  # שליחה בטלגרם
+    
+    # Canonical URLs (dedup / cache) - פרמטרים עם * בסוף הם prefix
+    URL_CANONICALIZE = os.getenv('URL_CANONICALIZE', 'True').lower() == 'true'
+    URL_TRACKING_PARAMS = os.getenv(
+        'URL_TRACKING_PARAMS',
+        'utm_*,fbclid,gclid,dclid,gbraid,wbraid,msclkid,yclid,mc_cid,mc_eid,igshid,_hsenc,_hsmi,mkt_tok'
+    ).split(',')
+    URL_SORT_QUERY = os.getenv('URL_SORT_QUERY', 'True').lower() == 'true'
     
     # Validation
     MAX_URL_LENGTH = int(os.getenv('MAX_URL_LENGTH', 2048))
     BLOCKED_DOMAINS = os.getenv('BLOCKED_DOMAINS', '').split(',')
+    BLOCKLIST_PATH = os.getenv('BLOCKLIST_PATH')  # קובץ דומיין לשורה (נטען מחדש כשמשתנה)
+    BLOCKLIST_RELOAD_SECONDS = float(os.getenv('BLOCKLIST_RELOAD_SECONDS', 30))
+    # מאגר malware/phishing מקומי: SHA-256 של ביטויי URL (hex) + קובץ עדכונים (+hash / -hash)
+    THREAT_DB_PATH = os.getenv('THREAT_DB_PATH')
+    THREAT_DB_UPDATES_PATH = os.getenv('THREAT_DB_UPDATES_PATH')
+    THREAT_DB_RELOAD_SECONDS = float(os.getenv('THREAT_DB_RELOAD_SECONDS', 60))
+    
+    @classmethod
+    def short_code_secret(cls):
+        """הסוד לפרמוטציית הקודים (SHORT_CODE_KEY או SECRET_KEY), או None אם הוא ציבורי"""
+        secret = cls.SHORT_CODE_KEY or cls.SECRET_KEY or ''
+        return None if secret in cls.PUBLIC_SECRET_KEYS else secret
     
     @classmethod
     def validate(cls):
@@ -64,6 +185,20 @@ class Config:
         if not cls.MONGODB_URI:
             errors.append("MONGODB_URI is required")
         
+        if cls.REDIRECT_MODE not in ('buffered', 'atomic'):
+            errors.append("REDIRECT_MODE must be 'buffered' or 'atomic'")
+        
+        if cls.SHORT_CODE_STRATEGY not in ('sequential', 'random'):
+            errors.append("SHORT_CODE_STRATEGY must be 'sequential' or 'random'")
+        elif cls.SHORT_CODE_STRATEGY == 'sequential' and cls.short_code_secret() is None and not cls.DEBUG:
+            errors.append("SHORT_CODE_STRATEGY=sequential requires SHORT_CODE_KEY or a non-default SECRET_KEY")
+        
+        if cls.STATE_BACKEND not in ('local', 'mongo'):
+            errors.append("STATE_BACKEND must be 'local' or 'mongo'")
+        
+        if cls.QR_ERROR_CORRECTION not in ('L', 'M', 'Q', 'H'):
+            errors.append("QR_ERROR_CORRECTION must be one of L, M, Q, H")
+        
         if not cls.WEBHOOK_URL and not cls.DEBUG:
             errors.append("WEBHOOK_URL is required in production")
 
@@ -107,6 +242,7 @@ class Messages:
 • `/shorten` - קצר קישור חדש
 • `/mylinks` - הקישורים שלי
 • `/stats` - סטטיסטיקות כלליות
+• `/export` - ZIP עם QR לכל הקישורים
 
 **איך לקצר קישור:**
 1. לחץ על "🔗 קצר קישור חדש"
@@ -213,6 +349,14 @@ class Messages:
 
 הדומיין הזה נחסם במערכת מסיבות אבטחה.
 
+אם אתה חושב שזו שגיאה, צור קשר עם התמיכה.
+    """
+    
+    ERROR_MALICIOUS_URL = """
+⚠️ **קישור מסוכן**
+
+הקישור הזה מופיע ברשימת אתרים זדוניים (malware / phishing) ולא ניתן לקצר אותו.
+
 אם אתה חושב שזו שגיאה, צור קשר עם התמיכה.
     """
     
@@ -259,6 +403,20 @@ class Messages:
 
 סרוק את הקוד כדי לפתוח את הקישור.
     """
+    
+    EXPORT_STARTED = """
+📦 **מכין ZIP עם QR לכל הקישורים שלך...**
+
+זה עשוי לקחת כמה רגעים.
+    """
+    
+    EXPORT_DONE = "📦 QR codes לכל הקישורים שלך (ה-index.csv מקשר בין קוד לקישור)"
+    
+    EXPORT_EMPTY = "📭 אין לך עדיין קישורים לייצוא."
+    
+    EXPORT_BUSY = "⏳ ייצוא קודם עדיין רץ, נסה שוב בעוד רגע."
+    
+    EXPORT_TOO_LARGE = "📦 הארכיון גדול מדי לשליחה בטלגרם. פנה למנהל לייצוא דרך ה-API."
 
 
 class Keyboards:
@@ -4,11 +4,14 @@ URL Shortener Bot - Database Layer
 כל הפעולות על MongoDB: יצירה, קריאה, עדכון, מחיקה
 """
 
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
 from pymongo.errors import DuplicateKeyError, ConnectionFailure
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from config import Config
+from cache import redirect_cache
+from utils import URLValidator
+from metrics import instrument_repository
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,6 +37,7 @@ class Database:
             self.urls = self.db.urls
             self.users = self.db.users
             self.clicks = self.db.clicks
+            self.click_shards = self.db.click_shards
             
             # יצירת אינדקסים
             self._create_indexes()
@@ -62,9 +66,31 @@ class Database:
                 ("created_at", DESCENDING)
             ])
             
+            # אינדקס dedup: טביעת אצבע של ה-URL לכל משתמש
+            self.urls.create_index([
+                ("user_id", ASCENDING),
+                ("fingerprint", ASCENDING)
+            ])
+            if Config.GLOBAL_DEDUP:
+                self.urls.create_index([("fingerprint", ASCENDING)])
+            
+            # אינדקסים לחימום ה-cache (top לפי קליקים / קליק אחרון)
+            self.urls.create_index([("clicks", DESCENDING)])
+            self.urls.create_index([("last_clicked", DESCENDING)])
+            self.urls.create_index(
+                [("sharded", ASCENDING)],
+                partialFilterExpression={"sharded": True}
+            )
+            
             # אינדקס על users
             self.users.create_index([("user_id", ASCENDING)], unique=True)
             
+            # מוני קליקים מפוצלים לקישורים חמים
+            self.click_shards.create_index([
+                ("short_code", ASCENDING),
+                ("shard", ASCENDING)
+            ], unique=True)
+            
             logger.info("✅ Database indexes created successfully")
             
         except Exception as e:
@@ -82,6 +108,8 @@ class URLRepository:
     
     def __init__(self, db: Database):
         self.collection = db.urls
+        self.shards = db.click_shards
+        self.cache = redirect_cache
     
     def create(
         self,
@@ -105,6 +133,7 @@ class URLRepository:
                 "user_id": user_id,
                 "original_url": original_url,
                 "short_code": short_code,
+                "fingerprint": URLValidator.fingerprint(original_url),
                 "created_at": datetime.utcnow(),
                 "clicks": 0,
                 "last_clicked": None
@@ -139,6 +168,59 @@ class URLRepository:
             logger.error(f"❌ Error getting URL by code: {e}")
             return None
     
+    def resolve(self, short_code: str) -> Optional[str]:
+        """
+        משיכת הכתובת המקורית לפי קוד קצר דרך ה-cache (נתיב ה-redirect)
+        
+        Args:
+            short_code: הקוד הקצר
+            
+        Returns:
+            הכתובת המקורית או None אם לא נמצא
+        """
+        original_url = self.cache.get(short_code)
+        if original_url is not None:
+            return original_url
+        
+        doc = self.get_by_short_code(short_code)
+        if not doc:
+            return None
+        
+        original_url = doc["original_url"]
+        self.cache.set(short_code, original_url)
+        return original_url
+    
+    def resolve_and_count(self, short_code: str) -> Optional[str]:
+        """
+        redirect ב-round trip אחד: משיכת הכתובת והגדלת מונה הקליקים
+        ב-find_one_and_update אטומי (projection של original_url בלבד)
+        
+        Args:
+            short_code: הקוד הקצר
+            
+        Returns:
+            הכתובת המקורית או None אם לא נמצא
+        """
+        try:
+            doc = self.collection.find_one_and_update(
+                {"short_code": short_code},
+                {
+                    "$inc": {"clicks": 1},
+                    "$set": {"last_clicked": datetime.utcnow()}
+                },
+                projection={"original_url": 1, "_id": 0}
+            )
+        except Exception as e:
+            logger.error(f"❌ Error resolving and counting URL: {e}")
+            return None
+        
+        if not doc:
+            return None
+        
+        original_url = doc["original_url"]
+        self.cache.set(short_code, original_url)
+        return original_url
+    
     def get_by_id(self, url_id: str) -> Optional[Dict[str, Any]]:
         """
         משיכת URL לפי ID
@@ -245,6 +327,7 @@ class URLRepository:
             })
             
             if result.deleted_count > 0:
+                self.cache.invalidate(short_code)
                 logger.info(f"✅ Deleted URL: {short_code}")
                 return True
             
@@ -268,12 +351,46 @@ class URLRepository:
         try:
             return self.collection.find_one({
                 "user_id": user_id,
+                "fingerprint": URLValidator.fingerprint(original_url),
                 "original_url": original_url
             })
         except Exception as e:
             logger.error(f"❌ Error finding existing URL: {e}")
             return None
     
+    def backfill_fingerprints(self, batch_size: int = 1000) -> int:
+        """
+        השלמת fingerprint למסמכים ישנים (חד-פעמי, להרצה ידנית)
+        
+        Args:
+            batch_size: כמות עדכונים ב-bulk_write אחד
+            
+        Returns:
+            כמות המסמכים שעודכנו
+        """
+        cursor = self.collection.find(
+            {"fingerprint": {"$exists": False}},
+            {"original_url": 1}
+        ).batch_size(batch_size)
+        
+        updated = 0
+        operations = []
+        
+        for doc in cursor:
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"fingerprint": URLValidator.fingerprint(doc["original_url"])}}
+            ))
+            if len(operations) >= batch_size:
+                updated += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        
+        if operations:
+            updated += self.collection.bulk_write(operations, ordered=False).modified_count
+        
+        logger.info(f"✅ Backfilled fingerprints: {updated} URLs")
+        return updated
+    
     def get_top_urls(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
         """
         משיכת ה-URLs הכי פופולריים של משתמש
@@ -283,7 +400,7 @@ class URLRepository:
             limit: כמה להחזיר
             
         Returns:
-            רשימת URLs ממוינת לפי קליקים
+            רשימת URLs ממוינת לפי קליקים (כולל ה-shards)
         """
         try:
             cursor = self.collection.find(
@@ -291,8 +408,29 @@ class URLRepository:
             ).sort(
                 "clicks", DESCENDING
             ).limit(limit)
+            docs = list(cursor)
             
-            return list(cursor)
+            # קישורים מפוצלים מדורגים רק אחרי הוספת סכום ה-shards
+            seen = {doc["short_code"] for doc in docs}
+            docs += [
+                doc for doc in self.collection.find({"user_id": user_id, "sharded": True})
+                if doc["short_code"] not in seen
+            ]
+            
+            sharded = [doc["short_code"] for doc in docs if doc.get("sharded")]
+            if sharded:
+                totals = {
+                    row["_id"]: row["clicks"]
+                    for row in self.shards.aggregate([
+                        {"$match": {"short_code": {"$in": sharded}}},
+                        {"$group": {"_id": "$short_code", "clicks": {"$sum": "$clicks"}}}
+                    ])
+                }
+                for doc in docs:
+                    doc["clicks"] = doc.get("clicks", 0) + totals.get(doc["short_code"], 0)
+            
+            docs.sort(key=lambda doc: doc.get("clicks", 0), reverse=True)
+            return docs[:limit]
             
         except Exception as e:
             logger.error(f"❌ Error getting top URLs: {e}")
@@ -315,11 +453,21 @@ class URLRepository:
             ]
             
             result = list(self.collection.aggregate(pipeline))
+            total = result[0]["total"] if result else 0
             
-            if result:
-                return result[0]["total"]
+            # קישורים חמים - חלק מהקליקים נמצא ב-click_shards
+            sharded = self.collection.distinct(
+                "short_code", {"user_id": user_id, "sharded": True}
+            )
+            if sharded:
+                shard_result = list(self.shards.aggregate([
+                    {"$match": {"short_code": {"$in": sharded}}},
+                    {"$group": {"_id": None, "total": {"$sum": "$clicks"}}}
+                ]))
+                if shard_result:
+                    total += shard_result[0]["total"]
             
-            return 0
+            return total
             
         except Exception as e:
             logger.error(f"❌ Error calculating total clicks: {e}")
@@ -449,6 +597,10 @@ class UserRepository:
             return None
 
 
+instrument_repository(URLRepository, "urls_sync")
+instrument_repository(UserRepository, "users_sync")
+
+
 _db: Database | None = None
 _url_repo: URLRepository | None = None
 _user_repo: UserRepository | None = None
@@ -525,6 +677,11 @@ def get_url(short_code: str) -> Optional[Dict]:
     return get_url_repo().get_by_short_code(short_code)
 
 
+def resolve_url(short_code: str) -> Optional[str]:
+    """Shortcut for url_repo.resolve()"""
+    return get_url_repo().resolve(short_code)
+
+
 def increment_clicks(short_code: str) -> bool:
     """Shortcut for url_repo.increment_clicks()"""
     return get_url_repo().increment_clicks(short_code)
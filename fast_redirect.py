@@ -0,0 +1,101 @@
+"""
+URL Shortener Bot - Fast Redirect Middleware
+=============================================
+ASGI middleware שמטפל ב-GET /<short_code> ישירות, בלי request context, routing
+ו-jsonify של Quart. כל שאר הבקשות (webhook, /api/*, /qr/*, /health) עוברות ל-Quart.
+"""
+
+import logging
+import re
+from urllib.parse import quote
+from redirects import resolve_redirect
+
+logger = logging.getLogger(__name__)
+
+# קוד קצר תקין לנתיב המהיר (Base62). קודים אחרים נופלים ל-route של Quart.
+_SHORT_CODE_RE = re.compile(r"[A-Za-z0-9]{1,64}")
+
+# נתיבים בני סגמנט אחד שמטופלים ע"י Quart
+RESERVED_PATHS = frozenset({"health", "metrics"})
+
+# תווים מותרים ב-Location אחרי quote (לא נוגעים ב-URL שכבר מקודד)
+_LOCATION_SAFE = "/:?#[]@!$&'()*+,;=%~"
+
+# Headers ו-bodies מוכנים מראש
+_HEADERS_301_BASE = [
+    (b"content-length", b"0"),
+]
+_CONTENT_TYPE_JSON = b"application/json"
+
+_BODY_404_PREFIX = b'{"error":"URL not found","short_code":"'
+_BODY_404_SUFFIX = b'"}\n'
+_BODY_500 = b'{"error":"Internal server error"}\n'
+_HEADERS_500 = [
+    (b"content-type", _CONTENT_TYPE_JSON),
+    (b"content-length", str(len(_BODY_500)).encode()),
+]
+
+
+def _location_header(url: str) -> bytes:
+    """
+    קידוד הכתובת ל-header Location (ASCII בלבד, בלי תווי בקרה)
+
+    Args:
+        url: הכתובת המקורית
+
+    Returns:
+        bytes ל-header
+    """
+    if url.isascii() and url.isprintable() and " " not in url:
+        return url.encode("ascii")
+    return quote(url, safe=_LOCATION_SAFE).encode("ascii")
+
+
+class FastRedirectMiddleware:
+    """
+    עוטף את app.asgi_app:
+    GET/HEAD של /<short_code> מקבל 301/404 מוכנים, כל השאר ל-Quart
+    """
+
+    def __init__(self, app, reserved=RESERVED_PATHS):
+        self.app = app
+        self.reserved = frozenset(reserved)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        short_code = scope["path"][1:]
+
+        if short_code in self.reserved or not _SHORT_CODE_RE.fullmatch(short_code):
+            await self.app(scope, receive, send)
+            return
+
+        head_only = scope["method"] == "HEAD"
+
+        try:
+            original_url = await resolve_redirect(short_code)
+        except Exception as e:
+            logger.error(f"Error in fast redirect: {e}")
+            await self._send(send, 500, _HEADERS_500, _BODY_500, head_only)
+            return
+
+        if not original_url:
+            body = _BODY_404_PREFIX + short_code.encode("ascii") + _BODY_404_SUFFIX
+            headers = [
+                (b"content-type", _CONTENT_TYPE_JSON),
+                (b"content-length", str(len(body)).encode()),
+            ]
+            await self._send(send, 404, headers, body, head_only)
+            return
+
+        headers = [(b"location", _location_header(original_url))]
+        headers.extend(_HEADERS_301_BASE)
+        await self._send(send, 301, headers, b"", head_only)
+
+    @staticmethod
+    async def _send(send, status: int, headers, body: bytes, head_only: bool) -> None:
+        """שליחת תגובה מלאה ב-2 הודעות ASGI"""
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if head_only else body})
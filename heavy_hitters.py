@@ -0,0 +1,218 @@
+"""
+URL Shortener Bot - Heavy Hitters
+==================================
+מעקב streaming אחרי הקישורים הכי חמים (Space-Saving, זיכרון קבוע)
+והצמדתם ב-redirect cache. רשימת ה-top-K נשמרת לקובץ לחימום אחרי restart.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class SpaceSaving:
+    """
+    Space-Saving: לכל היותר capacity מונים; קוד חדש כשהטבלה מלאה מחליף
+    את המונה הקטן ביותר ויורש את ערכו (כ-error - חסם עליון לטעות)
+
+    המינימום נמצא ב-heap עם רשומות "עצלות": כל עדכון דוחף (count, key)
+    ורשומות שלא תואמות את המונה הנוכחי מדולגות בשליפה.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def offer(self, key: str, count: int = 1) -> None:
+        """
+        רישום מופע/ים של מפתח
+
+        Args:
+            key: המפתח
+            count: כמות
+        """
+        current = self._counts.get(key)
+
+        if current is None:
+            if len(self._counts) >= self.capacity:
+                min_count, min_key = self._pop_min()
+                del self._counts[min_key]
+                del self._errors[min_key]
+                current, error = min_count, min_count
+            else:
+                current, error = 0, 0
+            self._errors[key] = error
+
+        current += count
+        self._counts[key] = current
+        heapq.heappush(self._heap, (current, key))
+
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self._counts.get(key) == count:
+                return count, key
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(count, key) for key, count in self._counts.items()]
+        heapq.heapify(self._heap)
+
+    def decay(self, factor: float) -> None:
+        """
+        הקטנת כל המונים (כדי שה-top-K ישקף את הקצב הנוכחי ולא היסטוריה)
+
+        Args:
+            factor: מכפיל בין 0 ל-1
+        """
+        for key, count in self._counts.items():
+            self._counts[key] = int(count * factor)
+            self._errors[key] = int(self._errors[key] * factor)
+        self._rebuild_heap()
+
+    def forget(self, key: str) -> None:
+        """הסרת מפתח (רשומת ה-heap שלו תדולג)"""
+        self._counts.pop(key, None)
+        self._errors.pop(key, None)
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """
+        k המפתחות עם המונה הגבוה ביותר
+
+        Returns:
+            רשימת (key, count, error)
+        """
+        items = heapq.nlargest(k, self._counts.items(), key=lambda item: item[1])
+        return [(key, count, self._errors[key]) for key, count in items]
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class HotLinkTracker:
+    """
+    top-K הקישורים החמים בתהליך
+
+    - note() נקרא לכל redirect מוצלח
+    - refresh() תקופתי: הצמדת ה-top-K ב-cache, decay ושמירה לקובץ
+    - ההרצה הראשונה טוענת את הרשימה מהקובץ ומחממת את ה-cache מה-DB
+    """
+
+    def __init__(self, capacity: int, top_k: int, decay: float, path: Optional[str]):
+        self.sketch = SpaceSaving(capacity)
+        self.top_k = max(1, int(top_k))
+        self.decay = float(decay)
+        self.path = path
+
+        self.pinned: List[str] = []
+        self._restored = False
+        self.refreshes = 0
+        self.warmed = 0
+
+    def note(self, short_code: str) -> None:
+        self.sketch.offer(short_code)
+
+    def forget(self, short_code: str) -> None:
+        """הסרת קוד (אחרי מחיקה)"""
+        self.sketch.forget(short_code)
+
+    def top(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        הקישורים החמים כרגע
+
+        Args:
+            limit: כמות (ברירת מחדל top_k)
+
+        Returns:
+            רשימת dict עם short_code, count, error
+        """
+        return [
+            {"short_code": key, "count": count, "error": error}
+            for key, count, error in self.sketch.top(limit or self.top_k)
+            if count > 0
+        ]
+
+    async def refresh(self, repo) -> int:
+        """
+        עדכון הקישורים המוצמדים (נקרא תקופתית)
+
+        Args:
+            repo: AsyncURLRepository
+
+        Returns:
+            כמות הקישורים המוצמדים
+        """
+        if not self._restored:
+            self._restored = True
+            codes = await asyncio.to_thread(self._load)
+        else:
+            codes = [entry["short_code"] for entry in self.top()]
+            self.sketch.decay(self.decay)
+            if self.path:
+                await asyncio.to_thread(self._save, codes)
+
+        self.pinned = codes
+        repo.cache.pin(codes)
+        self.warmed += await repo.warm_cache(codes)
+        self.refreshes += 1
+        return len(codes)
+
+    def _load(self) -> List[str]:
+        if not self.path:
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                codes = json.load(f).get("codes", [])
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Error loading hot links file: {e}")
+            return []
+
+        logger.info(f"✅ Loaded {len(codes)} hot links for pre-warm")
+        return [code for code in codes if isinstance(code, str)][:self.top_k]
+
+    def _save(self, codes: List[str]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"codes": codes}, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        סטטיסטיקות המעקב
+
+        Returns:
+            dict עם מונים
+        """
+        return {
+            "enabled": Config.HOT_LINKS_ENABLED,
+            "tracked": len(self.sketch),
+            "capacity": self.sketch.capacity,
+            "pinned": len(self.pinned),
+            "refreshes": self.refreshes,
+            "warmed": self.warmed,
+        }
+
+
+# Singleton instance
+hot_links = HotLinkTracker(
+    capacity=Config.HOT_LINKS_CAPACITY,
+    top_k=Config.HOT_LINKS_TOP_K,
+    decay=Config.HOT_LINKS_DECAY,
+    path=Config.HOT_LINKS_PATH,
+)
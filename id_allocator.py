@@ -0,0 +1,124 @@
+"""
+URL Shortener Bot - Short Code Allocator
+=========================================
+הקצאת קודים קצרים בלי בדיקת קיום: בלוקים של מזהים רצים נשמרים מראש
+ממונה אטומי ב-MongoDB (counters), וכל מזהה מקודד ב-Base62 דרך פרמוטציה
+עם מפתח (URLShortener.code_for_id) - כך שהקודים לא ניתנים לניחוש.
+"""
+
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Optional
+from config import Config
+from utils import URLShortener, generate_short_code
+from keyspace import keyspace
+
+logger = logging.getLogger(__name__)
+
+COUNTER_NAME = "short_code"
+
+
+class ShortCodeAllocator:
+    """
+    מקצה קודים קצרים לתהליך
+
+    - sequential: מזהים מבלוק שמור (round trip אחד לכל block_size קודים)
+    - random: קוד אקראי באורך לפי keyspace; התנגשות נתפסת ב-unique index וננסה שוב
+    """
+
+    def __init__(self, strategy: str, block_size: int, key: bytes):
+        self.strategy = strategy
+        self.block_size = max(1, int(block_size))
+        self.key = key
+
+        self._next_id = 0
+        self._end_id = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+        self.blocks_reserved = 0
+        self.allocated = 0
+
+    async def next_code(self) -> str:
+        """
+        הקוד הבא להקצאה
+
+        Returns:
+            קוד קצר
+
+        Raises:
+            PyMongoError: אם שמירת בלוק חדש נכשלה
+        """
+        self.allocated += 1
+
+        if self.strategy != "sequential":
+            return generate_short_code(keyspace.length)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._next_id >= self._end_id:
+                from async_database import get_async_url_repo
+
+                start = await get_async_url_repo().reserve_id_block(COUNTER_NAME, self.block_size)
+                self._next_id, self._end_id = start, start + self.block_size
+                self.blocks_reserved += 1
+
+            num = self._next_id
+            self._next_id += 1
+
+        return URLShortener.code_for_id(num, self.key)
+
+    def note_result(self, collided: bool) -> None:
+        """
+        דיווח תוצאת insert (להגדלת אורך הקוד האקראי לפי שיעור ההתנגשויות)
+
+        Args:
+            collided: האם הקוד כבר היה תפוס
+        """
+        if self.strategy != "sequential":
+            keyspace.note_attempt(collided)
+
+    def stats(self) -> Dict[str, object]:
+        """
+        סטטיסטיקות המקצה
+
+        Returns:
+            dict עם מונים
+        """
+        return {
+            "strategy": self.strategy,
+            "allocated": self.allocated,
+            "blocks_reserved": self.blocks_reserved,
+            "block_remaining": max(0, self._end_id - self._next_id),
+        }
+
+
+def _permutation_key() -> bytes:
+    """מפתח הפרמוטציה - SHORT_CODE_KEY, או נגזר מ-SECRET_KEY"""
+    secret = Config.SHORT_CODE_KEY or Config.SECRET_KEY
+    return hashlib.sha256(f"short-code:{secret}".encode("utf-8")).digest()
+
+
+def _strategy() -> str:
+    """
+    האסטרטגיה בפועל: sequential עם מפתח ציבורי הופך את הקודים לניתנים למנייה
+    (מזהים רצים + פרמוטציה ידועה), ולכן נופלים ל-random
+    """
+    if Config.SHORT_CODE_STRATEGY == "sequential" and Config.short_code_secret() is None:
+        logger.error(
+            "❌ SHORT_CODE_STRATEGY=sequential with the default SECRET_KEY and no SHORT_CODE_KEY "
+            "would make short codes enumerable - using random codes instead. "
+            "Set SHORT_CODE_KEY (or SECRET_KEY) to a private value to enable sequential codes."
+        )
+        return "random"
+    return Config.SHORT_CODE_STRATEGY
+
+
+# Singleton instance
+short_code_allocator = ShortCodeAllocator(
+    strategy=_strategy(),
+    block_size=Config.SHORT_CODE_BLOCK_SIZE,
+    key=_permutation_key(),
+)
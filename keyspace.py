@@ -0,0 +1,128 @@
+"""
+URL Shortener Bot - Keyspace Tracker
+=====================================
+מעקב אחרי תפוסת מרחב הקודים הקצרים (כמות קישורים / 62^length) ושיעור
+ההתנגשויות בפועל, והגדלת אורך הקוד האקראי לפני שהניסיונות החוזרים מורגשים.
+"""
+
+import logging
+from typing import Dict
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# החלקה של שיעור ההתנגשויות (EWMA) ומינימום דגימות לפני שמחליטים לפיו
+_COLLISION_ALPHA = 0.05
+_MIN_SAMPLES = 20
+
+
+class KeyspaceTracker:
+    """
+    אורך הקוד הנוכחי לפי תפוסה ושיעור התנגשויות
+
+    - refresh() תקופתי: כמות הקישורים (estimated count - חסם עליון, כולל קודים
+      באורכים אחרים) והאורך המינימלי שבו התפוסה מתחת ל-max_fill
+    - note_attempt() לכל insert: התנגשויות מעל max_collision_rate מגדילות את האורך
+    - האורך רק גדל (קודים קיימים לא משתנים)
+    """
+
+    def __init__(self, base_length: int, max_fill: float, max_collision_rate: float, max_length: int = 16):
+        self.base_length = max(1, int(base_length))
+        self.max_fill = float(max_fill)
+        self.max_collision_rate = float(max_collision_rate)
+        self.max_length = max(self.base_length, int(max_length))
+
+        self.length = self.base_length
+        self.occupied = 0
+        self.collision_rate = 0.0
+        self._samples = 0
+
+        self.attempts = 0
+        self.collisions = 0
+        self.growths = 0
+
+    def fill_ratio(self, length: int = None) -> float:
+        """תפוסת המרחב באורך נתון (ברירת מחדל - הנוכחי)"""
+        return self.occupied / (62 ** (length or self.length))
+
+    def update_occupancy(self, occupied: int) -> int:
+        """
+        עדכון כמות הקודים הקיימים והגדלת האורך לפי התפוסה
+
+        Args:
+            occupied: כמות הקישורים
+
+        Returns:
+            האורך הנוכחי
+        """
+        self.occupied = max(0, int(occupied))
+
+        length = self.length
+        while self.fill_ratio(length) > self.max_fill and length < self.max_length:
+            length += 1
+
+        if length > self.length:
+            self._grow(length, f"fill ratio {self.fill_ratio():.4f}")
+
+        return self.length
+
+    def note_attempt(self, collided: bool) -> None:
+        """
+        רישום ניסיון insert של קוד אקראי
+
+        Args:
+            collided: האם הייתה התנגשות (DuplicateKeyError)
+        """
+        self.attempts += 1
+        self.collisions += int(collided)
+        self._samples += 1
+        self.collision_rate += _COLLISION_ALPHA * (float(collided) - self.collision_rate)
+
+        if (self._samples >= _MIN_SAMPLES
+                and self.collision_rate > self.max_collision_rate
+                and self.length < self.max_length):
+            self._grow(self.length + 1, f"collision rate {self.collision_rate:.4f}")
+
+    def _grow(self, length: int, reason: str) -> None:
+        logger.warning(f"⚠️ Short code length {self.length} -> {length} ({reason})")
+        self.length = length
+        self.collision_rate = 0.0
+        self._samples = 0
+        self.growths += 1
+
+    async def refresh(self, repo) -> int:
+        """
+        ריענון התפוסה מה-DB (נקרא תקופתית)
+
+        Args:
+            repo: AsyncURLRepository
+
+        Returns:
+            האורך הנוכחי
+        """
+        return self.update_occupancy(await repo.count_links())
+
+    def stats(self) -> Dict[str, float]:
+        """
+        סטטיסטיקות מרחב הקודים
+
+        Returns:
+            dict עם אורך, תפוסה ושיעור התנגשויות
+        """
+        return {
+            "code_length": self.length,
+            "occupied": self.occupied,
+            "fill_ratio": round(self.fill_ratio(), 8),
+            "collision_rate": round(self.collision_rate, 4),
+            "attempts": self.attempts,
+            "collisions": self.collisions,
+            "growths": self.growths,
+        }
+
+
+# Singleton instance
+keyspace = KeyspaceTracker(
+    base_length=Config.SHORT_CODE_LENGTH,
+    max_fill=Config.KEYSPACE_MAX_FILL,
+    max_collision_rate=Config.KEYSPACE_MAX_COLLISION_RATE,
+)
@@ -0,0 +1,258 @@
+"""
+URL Shortener Bot - Metrics
+============================
+Counters ו-histograms בסגנון Prometheus (בלי תלות חיצונית), וחשיפה בפורמט טקסט
+ל-/metrics. נבנה לעלות זניחה לכל בקשה: dict lookup + bisect + הגדלת מונה.
+"""
+
+import functools
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PREFIX = "urlshortener_"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """מונה מצטבר עם labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Histogram של זמני תגובה (שניות) עם labels"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # מבנה: {labels: [counts_per_bucket..., +Inf count, sum]}
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {series[-1]}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class ActiveUsers:
+    """Gauge של משתמשים פעילים בחלונות זמן (מוזן מ-note_active_user)"""
+
+    WINDOWS = (("5m", 300), ("1h", 3600), ("24h", 86400))
+
+    def __init__(self):
+        self._last_seen: Dict[int, float] = {}
+        self._next_prune = 0.0
+
+    def note(self, user_id: int) -> None:
+        now = time.monotonic()
+        self._last_seen[user_id] = now
+        if now >= self._next_prune:
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        horizon = now - self.WINDOWS[-1][1]
+        self._last_seen = {uid: ts for uid, ts in self._last_seen.items() if ts >= horizon}
+        self._next_prune = now + 60
+
+    def render(self) -> List[str]:
+        name = PREFIX + "active_users"
+        now = time.monotonic()
+        self._prune(now)
+        lines = [f"# HELP {name} Distinct users active in the window", f"# TYPE {name} gauge"]
+        for label, seconds in self.WINDOWS:
+            cutoff = now - seconds
+            count = sum(1 for ts in self._last_seen.values() if ts >= cutoff)
+            lines.append(f'{name}{{window="{label}"}} {count}')
+        return lines
+
+
+class Registry:
+    """אוסף המטריקות + gauges שנאספים בזמן ה-scrape מפונקציות stats()"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._stats_sources: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, component: str, stats_fn: Callable[[], Dict[str, Any]]) -> None:
+        """
+        חשיפת ערכים מספריים מ-stats() של רכיב כ-gauges
+
+        Args:
+            component: שם הרכיב (חלק משם המטריקה)
+            stats_fn: פונקציה שמחזירה dict
+        """
+        self._stats_sources.append((component, stats_fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+
+        for component, stats_fn in self._stats_sources:
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f"{PREFIX}{component}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ==================== Metrics ====================
+
+REDIRECT_SECONDS = registry.register(Histogram(
+    "redirect_duration_seconds", "Redirect resolution latency", ("outcome",)
+))
+WEBHOOK_SECONDS = registry.register(Histogram(
+    "webhook_duration_seconds", "Telegram webhook processing latency", ("status",)
+))
+BOT_HANDLER_SECONDS = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Bot command/callback handler latency", ("kind", "handler")
+))
+BOT_HANDLER_ERRORS = registry.register(Counter(
+    "bot_handler_errors_total", "Bot handler exceptions", ("kind", "handler")
+))
+REPOSITORY_SECONDS = registry.register(Histogram(
+    "repository_duration_seconds", "Repository method latency", ("repository", "method")
+))
+REPOSITORY_ERRORS = registry.register(Counter(
+    "repository_errors_total", "Repository method exceptions", ("repository", "method")
+))
+QR_SECONDS = registry.register(Histogram(
+    "qr_render_duration_seconds", "QR code render latency", ("format",)
+))
+ACTIVE_USERS = registry.register(ActiveUsers())
+
+
+# ==================== Helpers ====================
+
+def note_active_user(user_id: int) -> None:
+    """עדכון gauge המשתמשים הפעילים (נקרא מ-activity_reporter)"""
+    ACTIVE_USERS.note(user_id)
+
+
+def timed(histogram: Histogram, *labelvalues: str, errors: Optional[Counter] = None):
+    """
+    Decorator למדידת זמן ריצה של פונקציה (sync או async)
+
+    Args:
+        histogram: ה-histogram למדידה
+        labelvalues: ערכי ה-labels
+        errors: counter אופציונלי לחריגות
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    if errors is not None:
+                        errors.inc(*labelvalues)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start, *labelvalues)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(*labelvalues)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, *labelvalues)
+        return wrapper
+
+    return decorator
+
+
+def instrument_repository(cls, repository: str):
+    """
+    עטיפת כל המתודות הציבוריות של repository במדידת זמן
+    (async generators לא נעטפים - הם נצרכים הדרגתית)
+
+    Args:
+        cls: מחלקת ה-repository
+        repository: שם ל-label
+    """
+    for name, func in list(vars(cls).items()):
+        if name.startswith("_") or not callable(func) or inspect.isasyncgenfunction(func):
+            continue
+        setattr(cls, name, timed(REPOSITORY_SECONDS, repository, name, errors=REPOSITORY_ERRORS)(func))
+    return cls
+
+
+def render() -> str:
+    """טקסט בפורמט Prometheus exposition"""
+    return registry.render()
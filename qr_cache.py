@@ -0,0 +1,206 @@
+"""
+URL Shortener Bot - QR Image Cache
+===================================
+Cache דו-שכבתי לתמונות QR: LRU בזיכרון של הבתים המקודדים, ומאחוריו תיקייה
+בדיסק. התמונה של קוד לא משתנה, ולכן אין TTL - המפתח כולל את התוכן המקודד
+ופרמטרי הרינדור (box_size, border, format, error correction).
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from cache import LRUTTLCache
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# entity-tag (RFC 9110): W/ אופציונלי + opaque-tag במירכאות
+_ENTITY_TAG = re.compile(r'(?:W/)?("[\x21\x23-\x7e\x80-\xff]*")')
+
+
+class QRImageCache:
+    """
+    (short_code, data, box_size, border, format, ec) -> (bytes, etag)
+
+    - זיכרון: LRUTTLCache בלי תפוגה
+    - דיסק: רק וריאנט ברירת המחדל (QR_BOX_SIZE / QR_BORDER / png / QR_ERROR_CORRECTION),
+      קובץ לכל קוד (כתיבה אטומית), משותף ל-workers ושורד restart. וריאנטים של
+      ?size / ?format / ?ec נשמרים בזיכרון בלבד - אחרת כל לקוח יכול לנפח את התיקייה
+    - forget() מוחק את הקובץ של קישור שנמחק
+    - ה-ETag נגזר מתוכן התמונה
+    """
+
+    def __init__(self, max_items: int, directory: Optional[str]):
+        self.memory = LRUTTLCache(max_size=max_items, ttl_seconds=float('inf'))
+        self.directory = directory or None
+
+        self.disk_hits = 0
+        self.renders = 0
+
+    @staticmethod
+    def variant(data: str, box_size: int, border: int, fmt: str = 'png', error_correction: str = 'M') -> str:
+        """
+        מזהה קצר לתוכן + פרמטרי הרינדור (גם מפתח ה-file_id של טלגרם)
+
+        Returns:
+            16 תווי hex
+        """
+        return hashlib.blake2b(
+            f"{data}|{box_size}|{border}|{fmt}|{error_correction}".encode('utf-8'), digest_size=8
+        ).hexdigest()
+
+    @classmethod
+    def _key(cls, short_code: str, data: str, box_size: int, border: int, fmt: str, error_correction: str) -> str:
+        return f"{short_code}-{cls.variant(data, box_size, border, fmt, error_correction)}.{fmt}"
+
+    @staticmethod
+    def etag_for(image: bytes) -> str:
+        return '"' + hashlib.blake2b(image, digest_size=16).hexdigest() + '"'
+
+    @staticmethod
+    def etag_matches(if_none_match: str, etag: str) -> bool:
+        """
+        השוואת If-None-Match ל-ETag: רשימת entity tags מופרדת בפסיקים או "*",
+        השוואה חלשה (W/ מתעלמים ממנו) ומדויקת לכל tag
+
+        Args:
+            if_none_match: ערך ה-header (ריק אם לא נשלח)
+            etag: ה-ETag של התמונה
+
+        Returns:
+            True אם אפשר להחזיר 304
+        """
+        header = if_none_match.strip()
+        if header == '*':
+            return True
+
+        opaque = _ENTITY_TAG.fullmatch(etag).group(1)
+        for candidate in header.split(','):
+            match = _ENTITY_TAG.fullmatch(candidate.strip())
+            if match and match.group(1) == opaque:
+                return True
+        return False
+
+    @staticmethod
+    def _is_default(box_size: int, border: int, fmt: str, error_correction: str) -> bool:
+        return (box_size, border, fmt, error_correction) == (
+            Config.QR_BOX_SIZE, Config.QR_BORDER, 'png', Config.QR_ERROR_CORRECTION
+        )
+
+    def _default_key(self, short_code: str) -> str:
+        return self._key(
+            short_code, f"{Config.BASE_URL}/{short_code}",
+            Config.QR_BOX_SIZE, Config.QR_BORDER, 'png', Config.QR_ERROR_CORRECTION
+        )
+
+    def _read_disk(self, name: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, name: str, image: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+
+    async def get_or_render(
+        self,
+        short_code: str,
+        data: str,
+        render: Callable[[], Awaitable[bytes]],
+        box_size: int,
+        border: int,
+        fmt: str = 'png',
+        error_correction: str = 'M'
+    ) -> Tuple[bytes, str]:
+        """
+        משיכת תמונה מה-cache, או רינדור ושמירה בשתי השכבות
+
+        Args:
+            short_code: הקוד הקצר (לשם הקובץ)
+            data: התוכן המקודד ב-QR
+            render: coroutine function שמחזירה את בתי התמונה (qr_pool.render)
+            box_size: גודל ריבוע
+            border: שוליים
+            fmt: פורמט
+            error_correction: רמת תיקון שגיאות
+
+        Returns:
+            (image_bytes, etag)
+        """
+        name = self._key(short_code, data, box_size, border, fmt, error_correction)
+        on_disk = bool(self.directory) and self._is_default(box_size, border, fmt, error_correction)
+
+        entry = self.memory.get(name)
+        if entry is not None:
+            return entry
+
+        image = None
+        if on_disk:
+            try:
+                image = await asyncio.to_thread(self._read_disk, name)
+            except OSError as e:
+                logger.warning(f"⚠️ Error reading QR cache: {e}")
+            if image is not None:
+                self.disk_hits += 1
+
+        if image is None:
+            image = await render()
+            self.renders += 1
+            if on_disk:
+                try:
+                    await asyncio.to_thread(self._write_disk, name, image)
+                except OSError as e:
+                    logger.warning(f"⚠️ Error writing QR cache: {e}")
+
+        entry = (image, self.etag_for(image))
+        self.memory.set(name, entry)
+        return entry
+
+    async def forget(self, short_code: str) -> None:
+        """
+        הסרת התמונה של קישור שנמחק (זיכרון + הקובץ בדיסק)
+
+        Args:
+            short_code: הקוד הקצר
+        """
+        name = self._default_key(short_code)
+        self.memory.invalidate(name)
+        if not self.directory:
+            return
+        try:
+            await asyncio.to_thread(os.remove, os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Error removing QR cache file: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        """
+        סטטיסטיקות ה-cache
+
+        Returns:
+            dict עם מונים
+        """
+        memory = self.memory.stats()
+        return {
+            "memory_size": memory["size"],
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "renders": self.renders,
+        }
+
+
+# Singleton instance
+qr_cache = QRImageCache(
+    max_items=Config.QR_CACHE_SIZE,
+    directory=Config.QR_CACHE_DIR,
+)
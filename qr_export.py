@@ -0,0 +1,243 @@
+"""
+URL Shortener Bot - QR ZIP Export
+==================================
+ייצוא QR לכל הקישורים של משתמש כ-ZIP אחד, בלי להחזיק את הארכיון בזיכרון:
+
+- הקישורים נקראים ב-streaming cursor (iter_by_user)
+- הרינדור רץ ב-qr_pool, עם חלון של QR_EXPORT_CONCURRENCY רינדורים במקביל
+- ה-ZIP נכתב ל-sink לא-seekable (data descriptors), וכל קובץ יוצא כ-chunk
+  ברגע שנכתב - ל-response ב-streaming או לקובץ זמני לשליחה בטלגרם
+  (PTB קורא את הקובץ כולו לזיכרון בהעלאה - לכן הוא חסום ב-QR_EXPORT_MAX_BYTES)
+"""
+
+import asyncio
+import csv
+import io
+import logging
+import time
+import zipfile
+from collections import deque
+from typing import AsyncIterator, BinaryIO, Dict, Optional
+from config import Config
+from qr_pool import qr_pool, QRPoolBusy
+
+logger = logging.getLogger(__name__)
+
+# הזמנה שה-stream שלה לא התחיל תוך כך (למשל הלקוח התנתק) משוחררת
+_RESERVATION_SECONDS = 60
+
+
+class QRExportBusy(Exception):
+    """כבר רץ ייצוא למשתמש"""
+
+
+class QRExportTooLarge(Exception):
+    """הארכיון עבר את QR_EXPORT_MAX_BYTES"""
+
+
+class _ZipSink:
+    """יעד כתיבה ל-ZipFile שצובר chunks עד שנשלפים (בלי tell/seek)"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class QRZipExporter:
+    """
+    ZIP של QR codes לכל הקישורים של משתמש
+
+    - ייצוא אחד פעיל לכל משתמש: stream() תופס את המקום מיד (לפני שה-generator רץ),
+      וה-generator משחרר אותו ב-finally
+    - רינדור שנכשל (timeout / pool עמוס) מדולג ומסומן ב-index.csv
+    """
+
+    def __init__(self, concurrency: int, max_links: int, max_bytes: int, batch_size: int = 200):
+        self.concurrency = max(1, int(concurrency))
+        self.max_links = max(0, int(max_links))
+        self.max_bytes = max(1, int(max_bytes))
+        self.batch_size = max(1, int(batch_size))
+
+        # {user_id: זמן ההזמנה, או None כשה-stream כבר רץ}
+        self._active: Dict[int, Optional[float]] = {}
+
+        self.exports = 0
+        self.files = 0
+        self.failed = 0
+
+    def is_active(self, user_id: int) -> bool:
+        """האם כבר רץ (או הוזמן) ייצוא למשתמש"""
+        if user_id not in self._active:
+            return False
+        reserved_at = self._active[user_id]
+        return reserved_at is None or time.monotonic() - reserved_at < _RESERVATION_SECONDS
+
+    def release(self, user_id: int) -> None:
+        """שחרור הזמנה של stream שלא התחיל (stream שרץ משחרר בעצמו ב-finally)"""
+        if self._active.get(user_id, None) is not None:
+            del self._active[user_id]
+
+    async def _render(self, data: str, fmt: str, box_size: int, error_correction: str) -> Optional[bytes]:
+        # ה-pool משותף לבקשות /qr - בעומס ממתינים במקום להיכשל
+        for _ in range(20):
+            try:
+                return await qr_pool.render(data, box_size, Config.QR_BORDER, fmt, error_correction)
+            except QRPoolBusy:
+                await asyncio.sleep(0.5)
+            except asyncio.TimeoutError:
+                return None
+        return None
+
+    async def _rendered(self, user_id: int, fmt: str, box_size: int, error_correction: str):
+        """(short_code, original_url, image) לפי סדר הקישורים, עם רינדור מקבילי בחלון"""
+        from async_database import get_async_url_repo
+
+        window = deque()
+        try:
+            async for short_code, original_url in get_async_url_repo().iter_by_user(
+                user_id, self.max_links, self.batch_size
+            ):
+                short_url = f"{Config.BASE_URL}/{short_code}"
+                task = asyncio.create_task(self._render(short_url, fmt, box_size, error_correction))
+                window.append((short_code, original_url, task))
+
+                if len(window) >= self.concurrency:
+                    short_code, original_url, task = window.popleft()
+                    yield short_code, original_url, await task
+
+            while window:
+                short_code, original_url, task = window.popleft()
+                yield short_code, original_url, await task
+        finally:
+            # הלקוח התנתק / שגיאה - לא להשאיר רינדורים תלויים
+            for _, _, task in window:
+                task.cancel()
+
+    def stream(
+        self,
+        user_id: int,
+        fmt: str = 'png',
+        box_size: Optional[int] = None,
+        error_correction: Optional[str] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        ה-ZIP כ-chunks (קובץ QR לכל קישור + index.csv)
+
+        Args:
+            user_id: מזהה המשתמש
+            fmt: png / svg
+            box_size: פיקסלים למודול (ברירת מחדל מ-Config)
+            error_correction: L / M / Q / H (ברירת מחדל מ-Config)
+
+        Returns:
+            async iterator של chunks של קובץ ה-ZIP
+
+        Raises:
+            QRExportBusy: אם כבר רץ ייצוא למשתמש
+        """
+        if self.is_active(user_id):
+            raise QRExportBusy()
+        self._active[user_id] = time.monotonic()
+        return self._stream(user_id, fmt, box_size, error_correction)
+
+    async def _stream(
+        self,
+        user_id: int,
+        fmt: str,
+        box_size: Optional[int],
+        error_correction: Optional[str]
+    ) -> AsyncIterator[bytes]:
+        self._active[user_id] = None
+        box_size = box_size or Config.QR_BOX_SIZE
+        error_correction = error_correction or Config.QR_ERROR_CORRECTION
+        # PNG כבר דחוס - deflate רק ל-SVG
+        compression = zipfile.ZIP_DEFLATED if fmt == 'svg' else zipfile.ZIP_STORED
+
+        index = io.StringIO()
+        writer = csv.writer(index)
+        writer.writerow(["short_code", "short_url", "original_url", "file"])
+
+        sink = _ZipSink()
+        rendered = self._rendered(user_id, fmt, box_size, error_correction)
+        self.exports += 1
+        try:
+            with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+                async for short_code, original_url, image in rendered:
+                    name = f"{short_code}.{fmt}"
+                    if image is None:
+                        self.failed += 1
+                        name = ""
+                    else:
+                        archive.writestr(name, image)
+                        self.files += 1
+                    writer.writerow([short_code, f"{Config.BASE_URL}/{short_code}", original_url, name])
+
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+
+                archive.writestr("index.csv", index.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+
+            yield sink.drain()
+        finally:
+            await rendered.aclose()
+            self._active.pop(user_id, None)
+
+    async def export_to_file(self, chunks: AsyncIterator[bytes], fileobj: BinaryIO) -> int:
+        """
+        כתיבת ה-ZIP לקובץ (למשל קובץ זמני לשליחה בטלגרם), חסום ב-max_bytes
+
+        Args:
+            chunks: התוצאה של stream()
+            fileobj: קובץ בינארי פתוח לכתיבה
+
+        Returns:
+            כמות הבתים שנכתבו
+
+        Raises:
+            QRExportTooLarge: אם הארכיון עבר את max_bytes
+        """
+        written = 0
+        try:
+            async for chunk in chunks:
+                written += len(chunk)
+                if written > self.max_bytes:
+                    raise QRExportTooLarge()
+                fileobj.write(chunk)
+        finally:
+            # משחרר את המקום ומבטל רינדורים תלויים גם ביציאה באמצע
+            await chunks.aclose()
+        return written
+
+    def stats(self) -> Dict[str, int]:
+        """
+        סטטיסטיקות הייצוא
+
+        Returns:
+            dict עם מונים
+        """
+        return {
+            "active": len(self._active),
+            "exports": self.exports,
+            "files": self.files,
+            "failed": self.failed,
+        }
+
+
+# Singleton instance
+qr_exporter = QRZipExporter(
+    concurrency=Config.QR_EXPORT_CONCURRENCY,
+    max_links=Config.QR_EXPORT_MAX_LINKS,
+    max_bytes=Config.QR_EXPORT_MAX_BYTES,
+)
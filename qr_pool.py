@@ -0,0 +1,193 @@
+"""
+URL Shortener Bot - QR Render Pool
+===================================
+רינדור QR (qr.make + קידוד PNG של Pillow) ב-ProcessPoolExecutor חסום,
+כדי שגל בקשות QR לא יקפיא redirects ו-webhooks של אותו worker.
+
+- עומק תור מוגבל (QR_POOL_MAX_PENDING) - מעבר לו QRPoolBusy מיידי
+- timeout לכל רינדור; רינדור שכבר רץ לא נעצר, ונספר בתור עד שהוא מסתיים בפועל
+- התהליכים מחוממים עם qrcode / PIL כבר טעונים
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+from config import Config
+from metrics import QR_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class QRPoolBusy(Exception):
+    """תור הרינדור מלא - לנסות שוב מאוחר יותר"""
+
+
+def _warm_worker() -> None:
+    """initializer של תהליך ב-pool: טעינת qrcode / PIL ורינדור ראשון"""
+    import qrcode  # noqa: F401
+    from PIL import Image, PngImagePlugin  # noqa: F401
+    render_qr("warm-up", 1, 0, 'png', 'L')
+
+
+def _noop() -> None:
+    """משימה ריקה - גורמת ל-pool להרים תהליך"""
+
+
+def render_qr(data: str, box_size: int, border: int, fmt: str, error_correction: str) -> bytes:
+    """
+    רינדור QR (רץ בתהליך של ה-pool)
+
+    Args:
+        data: התוכן לקידוד
+        box_size: גודל ריבוע
+        border: שוליים
+        fmt: png / svg
+        error_correction: L / M / Q / H
+
+    Returns:
+        בתי התמונה
+    """
+    from utils import QRCodeGenerator
+    return QRCodeGenerator.render(data, fmt, box_size, border, error_correction)
+
+
+class QRRenderPool:
+    """
+    ProcessPoolExecutor עם הגבלת עומק ו-timeout
+
+    workers=0 - רינדור ב-thread (asyncio.to_thread) במקום תהליכים
+    """
+
+    def __init__(self, workers: int, max_pending: int, timeout: float):
+        self.workers = max(0, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.timeout = float(timeout)
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+        self.rendered = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        """הרמת ה-pool וחימום התהליכים (לא חוסם)"""
+        if self.workers == 0 or self._executor is not None:
+            return
+
+        # spawn: תהליכים נקיים, בלי להעתיק את ה-event loop / threads של Motor
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+        )
+        for _ in range(self.workers):
+            self._executor.submit(_noop)
+
+        logger.info(f"✅ QR render pool started: {self.workers} processes")
+
+    def stop(self) -> None:
+        """סגירת ה-pool (בלי להמתין לרינדורים פתוחים)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def render(
+        self,
+        data: str,
+        box_size: int,
+        border: int,
+        fmt: str = 'png',
+        error_correction: str = 'M'
+    ) -> bytes:
+        """
+        רינדור QR מחוץ ל-event loop
+
+        Args:
+            data: התוכן לקידוד
+            box_size: גודל ריבוע
+            border: שוליים
+            fmt: png / svg
+            error_correction: L / M / Q / H
+
+        Returns:
+            בתי התמונה
+
+        Raises:
+            QRPoolBusy: אם התור מלא
+            asyncio.TimeoutError: אם הרינדור לא הסתיים בזמן
+        """
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise QRPoolBusy()
+
+        args = (data, box_size, border, fmt, error_correction)
+        future = None
+        start = time.perf_counter()
+        try:
+            if self.workers == 0:
+                job = asyncio.ensure_future(asyncio.to_thread(render_qr, *args))
+            else:
+                self.start()
+                future = self._executor.submit(render_qr, *args)
+                job = asyncio.wrap_future(future)
+
+            # התור משתחרר כשהרינדור באמת מסתיים - לא כשהלקוח הפסיק לחכות
+            self._pending += 1
+            job.add_done_callback(self._release)
+
+            image = await asyncio.wait_for(asyncio.shield(job), timeout=self.timeout)
+            self.rendered += 1
+            if self.workers:
+                # ה-histogram של התהליך הבן לא מגיע ל-/metrics - נמדד כאן (כולל המתנה בתור)
+                QR_SECONDS.observe(time.perf_counter() - start, fmt)
+            return image
+
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if future is not None:
+                # עדיין בתור של ה-executor - לא ירוץ בכלל (רינדור שכבר רץ ממשיך)
+                future.cancel()
+            raise
+        except BrokenProcessPool:
+            # תהליך קרס - pool חדש לבקשה הבאה
+            self.restarts += 1
+            self._executor = None
+            raise
+
+    def _release(self, job: asyncio.Future) -> None:
+        """done-callback של רינדור (גם אחרי timeout) - שחרור המקום בתור"""
+        self._pending -= 1
+        if not job.cancelled():
+            # אחרי timeout אף אחד לא קורא את התוצאה - בלי "exception was never retrieved"
+            job.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        סטטיסטיקות ה-pool
+
+        Returns:
+            dict עם מונים
+        """
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+        }
+
+
+# Singleton instance
+qr_pool = QRRenderPool(
+    workers=Config.QR_POOL_WORKERS,
+    max_pending=Config.QR_POOL_MAX_PENDING,
+    timeout=Config.QR_POOL_TIMEOUT,
+)
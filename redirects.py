@@ -0,0 +1,107 @@
+"""
+URL Shortener Bot - Redirect Resolution
+========================================
+נתיב ה-redirect: קוד קצר -> כתובת מקורית + ספירת קליק, לפי Config.REDIRECT_MODE
+"""
+
+import logging
+import time
+from typing import Optional
+from pymongo.errors import PyMongoError
+from config import Config
+from async_database import get_async_db, get_async_url_repo
+from click_buffer import click_buffer
+from snapshot import redirect_snapshot
+from sharded_counters import hot_codes
+from heavy_hitters import hot_links
+from metrics import REDIRECT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# אחרי כשל חיבור ל-Mongo - הגשה מה-snapshot בלבד עד הזמן הזה (monotonic)
+_mongo_down_until = 0.0
+
+
+def _serve_from_snapshot(short_code: str) -> Optional[str]:
+    """הגשה מה-snapshot; הקליק נרשם בבאפר וייכתב כש-Mongo יחזור"""
+    original_url = redirect_snapshot.lookup(short_code)
+    if original_url:
+        click_buffer.record(short_code)
+    return original_url
+
+
+async def resolve_redirect(short_code: str) -> Optional[str]:
+    """
+    משיכת הכתובת המקורית ורישום הקליק (עם מדידת זמן לפי תוצאה)
+
+    Args:
+        short_code: הקוד הקצר
+
+    Returns:
+        הכתובת המקורית או None אם לא נמצא
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        original_url = await _resolve(short_code)
+        outcome = "found" if original_url else "not_found"
+        if original_url:
+            if Config.SHARDED_COUNTERS_ENABLED:
+                hot_codes.note(short_code)
+            if Config.HOT_LINKS_ENABLED:
+                hot_links.note(short_code)
+        return original_url
+    finally:
+        REDIRECT_SECONDS.observe(time.perf_counter() - start, outcome)
+
+
+async def _resolve(short_code: str) -> Optional[str]:
+    """
+    משיכת הכתובת המקורית ורישום הקליק
+
+    - buffered: cache/filter/DB ואז רישום הקליק בבאפר (בלי להמתין ל-Mongo)
+    - atomic:   find_one_and_update אחד שגם מחזיר את הכתובת וגם סופר
+    - לפני שהחיבור ל-DB מוכן, או כש-Mongo לא זמין: snapshot מקומי
+
+    Args:
+        short_code: הקוד הקצר
+
+    Returns:
+        הכתובת המקורית או None אם לא נמצא
+    """
+    global _mongo_down_until
+
+    repo = get_async_url_repo()
+
+    # Cold start / Mongo down: קודם snapshot, בלי להמתין ל-server selection
+    if not get_async_db().ready or time.monotonic() < _mongo_down_until:
+        original_url = _serve_from_snapshot(short_code)
+        if original_url:
+            return original_url
+
+    try:
+        if Config.REDIRECT_MODE == 'atomic':
+            if not hot_codes.is_hot(short_code):
+                return await repo.resolve_and_count(short_code)
+
+            # קישור חם: הכתובת מה-cache והקליק ל-shard אקראי (בלי נעילה על מסמך אחד)
+            original_url = await repo.resolve(short_code)
+            if original_url:
+                await repo.increment_sharded(short_code)
+            return original_url
+
+        original_url = await repo.resolve(short_code)
+
+    except PyMongoError as e:
+        _mongo_down_until = time.monotonic() + Config.SNAPSHOT_FALLBACK_SECONDS
+        logger.error(f"❌ MongoDB unavailable in redirect, serving from snapshot: {e}")
+
+        original_url = _serve_from_snapshot(short_code)
+        if original_url:
+            return original_url
+        raise
+
+    if original_url:
+        click_buffer.record(short_code)
+
+    return original_url
@@ -0,0 +1,186 @@
+"""
+URL Shortener Bot - Link Replica
+=================================
+"Replica mode": כל טבלת הקישורים (short_code -> original_url) בזיכרון התהליך,
+נטענת פעם אחת ומסונכרנת מ-change stream על urls (עם resume token).
+כשה-replica מוכנה, נתיב ה-redirect לא פונה לרשת בכלל.
+
+דורש replica set (גם single-node) - על mongod עצמאי ה-replica מושבתת
+ונתיב ה-redirect הרגיל ממשיך לעבוד.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# רק שינויים שמשפיעים על הטבלה (עדכוני clicks לא רלוונטיים ויוצרים עומס)
+_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "replace", "delete", "drop", "invalidate"]}}},
+    {"$project": {
+        "operationType": 1,
+        "documentKey": 1,
+        "fullDocument.short_code": 1,
+        "fullDocument.original_url": 1,
+    }},
+]
+
+# קודי שגיאה של השרת
+_NOT_REPLICA_SET = 40573
+_HISTORY_LOST = 286
+
+
+class LinkReplica:
+    """
+    עותק מקומי של urls
+
+    - run() רץ ברקע: פתיחת ה-stream, טעינה מלאה (רק בלי resume token), ואז tailing
+    - אחרי ניתוק ממשיכים מה-resume token; אם ההיסטוריה אבדה - טעינה מלאה מחדש
+    - get() הוא dict lookup בלבד
+    """
+
+    def __init__(self, batch_size: int = 5000):
+        self.batch_size = batch_size
+        self._links: Dict[str, str] = {}
+        self._codes_by_id: Dict[Any, str] = {}
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self.ready = False
+
+        self.loads = 0
+        self.events = 0
+        self.reconnects = 0
+        self._last_event_at: Optional[float] = None
+
+    def get(self, short_code: str) -> Optional[str]:
+        return self._links.get(short_code)
+
+    def add(self, doc_id: Any, short_code: str, original_url: str) -> None:
+        self._links[short_code] = original_url
+        self._codes_by_id[doc_id] = short_code
+
+    def discard(self, short_code: str, doc_id: Any = None) -> None:
+        """הסרת קוד (מחיקה מקומית - לפני שה-event מגיע מה-stream)"""
+        self._links.pop(short_code, None)
+        if doc_id is not None:
+            self._codes_by_id.pop(doc_id, None)
+
+    def _apply(self, change: Dict[str, Any]) -> bool:
+        """
+        החלת event מה-stream
+
+        Returns:
+            False אם ה-stream נסגר (drop / invalidate) ונדרשת טעינה מלאה
+        """
+        operation = change["operationType"]
+
+        if operation in ("insert", "replace"):
+            doc = change.get("fullDocument") or {}
+            if "short_code" in doc and "original_url" in doc:
+                self.add(change["documentKey"]["_id"], doc["short_code"], doc["original_url"])
+        elif operation == "delete":
+            short_code = self._codes_by_id.pop(change["documentKey"]["_id"], None)
+            if short_code is not None:
+                self._links.pop(short_code, None)
+        else:
+            # drop / invalidate - ה-stream נסגר; טעינה מלאה בפתיחה הבאה.
+            # את ה-token של ה-invalidate אי אפשר להעביר ל-resume_after
+            self.ready = False
+            self.resume_token = None
+            self.events += 1
+            return False
+
+        self.events += 1
+        self._last_event_at = time.monotonic()
+        return True
+
+    async def _load(self, repo) -> None:
+        links: Dict[str, str] = {}
+        codes_by_id: Dict[Any, str] = {}
+
+        async for doc_id, short_code, original_url in repo.iter_link_table(self.batch_size):
+            links[short_code] = original_url
+            codes_by_id[doc_id] = short_code
+
+        self._links, self._codes_by_id = links, codes_by_id
+        self.loads += 1
+        logger.info(f"✅ Link replica loaded: {len(links)} links")
+
+    async def _tail(self, repo) -> None:
+        kwargs = {"resume_after": self.resume_token} if self.resume_token else {}
+
+        async with repo.collection.watch(_PIPELINE, batch_size=self.batch_size, **kwargs) as stream:
+            # try_next פותח את ה-cursor - שינויים מרגע זה לא יפספסו בזמן הטעינה
+            first = await stream.try_next()
+
+            if self.resume_token is None:
+                await self._load(repo)
+            if first is not None and not self._apply(first):
+                return
+
+            self.resume_token = stream.resume_token
+            self.ready = True
+
+            async for change in stream:
+                if not self._apply(change):
+                    return
+                self.resume_token = stream.resume_token
+
+    async def run(self, repo) -> None:
+        """
+        לולאת הסנכרון (רצה עד ביטול)
+
+        Args:
+            repo: AsyncURLRepository
+        """
+        backoff = 1
+        while True:
+            try:
+                await self._tail(repo)
+                backoff = 1
+                continue
+            except asyncio.CancelledError:
+                self.ready = False
+                raise
+            except OperationFailure as e:
+                if e.code == _NOT_REPLICA_SET:
+                    logger.error("❌ Replica mode requires a replica set - falling back to the regular redirect path")
+                    self.ready = False
+                    return
+                if e.code == _HISTORY_LOST:
+                    self.resume_token = None
+                logger.error(f"❌ Link replica change stream failed: {e}")
+            except PyMongoError as e:
+                logger.error(f"❌ Link replica change stream failed: {e}")
+
+            # עד שה-stream חוזר הנתונים עלולים להתיישן - חזרה לנתיב הרגיל
+            self.ready = False
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        סטטיסטיקות ה-replica
+
+        Returns:
+            dict עם גודל ומונים
+        """
+        return {
+            "enabled": Config.REPLICA_MODE_ENABLED,
+            "ready": self.ready,
+            "links": len(self._links),
+            "loads": self.loads,
+            "events": self.events,
+            "reconnects": self.reconnects,
+            "seconds_since_event": (
+                round(time.monotonic() - self._last_event_at, 1) if self._last_event_at else -1
+            ),
+        }
+
+
+# Singleton instance
+link_replica = LinkReplica()
@@ -0,0 +1,96 @@
+"""
+URL Shortener Bot - Sharded Click Counters
+===========================================
+זיהוי קישורים "חמים" לפי קצב קליקים, ופיזור הכתיבות שלהם על N מסמכי shard
+ב-collection נפרד (click_shards) במקום $inc על אותו מסמך ב-urls.
+
+סכמה: click_shards {short_code, shard, clicks, last_clicked}
+קישור שעבר לסכמה מסומן ב-urls עם sharded=True, והקריאות סוכמות את ה-shards.
+"""
+
+import random
+import time
+from typing import Dict, Set
+from config import Config
+
+
+class HotCodeDetector:
+    """
+    מדידת קצב קליקים לכל קוד בחלונות זמן קבועים
+
+    - note() נקרא לכל redirect (dict lookup + חיבור)
+    - קוד שעבר את הסף (קליקים לשנייה) נהיה sharded לכל חיי התהליך
+    - קודים חדשים שעברו לסכמה ממתינים ב-pending_flags עד שיסומנו ב-DB
+    """
+
+    def __init__(self, threshold_per_second: float, window_seconds: float, num_shards: int):
+        self.threshold = float(threshold_per_second)
+        self.window = max(0.1, float(window_seconds))
+        self.num_shards = max(1, int(num_shards))
+
+        self._window_start = time.monotonic()
+        self._counts: Dict[str, int] = {}
+        self._hot: Set[str] = set()
+        self.pending_flags: Set[str] = set()
+
+    def note(self, short_code: str, clicks: int = 1) -> None:
+        """
+        רישום קליק/ים לקוד
+
+        Args:
+            short_code: הקוד הקצר
+            clicks: כמות קליקים
+        """
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._roll(now)
+
+        count = self._counts.get(short_code, 0) + clicks
+        self._counts[short_code] = count
+
+        if count >= self.threshold * self.window and short_code not in self._hot:
+            self._hot.add(short_code)
+            self.pending_flags.add(short_code)
+
+    def _roll(self, now: float) -> None:
+        self._counts = {}
+        self._window_start = now
+
+    def mark_hot(self, short_code: str) -> None:
+        """סימון קוד כ-sharded (למשל כשה-DB כבר מסמן אותו)"""
+        self._hot.add(short_code)
+
+    def forget(self, short_code: str) -> None:
+        """הסרת קוד (אחרי מחיקה)"""
+        self._hot.discard(short_code)
+        self.pending_flags.discard(short_code)
+        self._counts.pop(short_code, None)
+
+    def is_hot(self, short_code: str) -> bool:
+        return short_code in self._hot
+
+    def pick_shard(self) -> int:
+        """shard אקראי לכתיבה"""
+        return random.randrange(self.num_shards)
+
+    def take_pending_flags(self) -> Set[str]:
+        """הוצאת הקודים שצריך לסמן sharded=True ב-DB"""
+        flags, self.pending_flags = self.pending_flags, set()
+        return flags
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "enabled": Config.SHARDED_COUNTERS_ENABLED,
+            "hot_codes": len(self._hot),
+            "pending_flags": len(self.pending_flags),
+            "threshold_per_second": self.threshold,
+            "num_shards": self.num_shards,
+        }
+
+
+# Singleton instance
+hot_codes = HotCodeDetector(
+    threshold_per_second=Config.SHARDED_COUNTER_THRESHOLD,
+    window_seconds=Config.SHARDED_COUNTER_WINDOW,
+    num_shards=Config.SHARDED_COUNTER_SHARDS,
+)
@@ -0,0 +1,384 @@
+"""
+URL Shortener Bot - Shared Redirect Cache
+==========================================
+טבלת hash בגודל קבוע ב-shared memory, משותפת לכל ה-workers על אותו host
+(hypercorn -w N). קריאה בלי נעילה (seqlock לכל slot), כתיבה תחת flock.
+
+מבנה ה-segment (little endian):
+    header: magic(8) | slots(u32) | arena_size(u32) | generation(u64) | epoch(u32) | arena_used(u32)
+    slots:  slots x [hash(u64) | seq(u32) | epoch(u32) | written(u32) | offset(u32) | key_len(u16) | val_len(u16) | reserved(u32)]
+    arena:  בייטים של מפתחות וערכים (bump allocator)
+
+- generation עולה בכל מחיקה - כל worker שרואה שינוי מנקה את ה-cache המקומי שלו
+- epoch עולה כשה-arena מתמלאת ומאופסת - slot עם epoch ישן נחשב ריק
+- הזיכרון קבוע (slots + arena) ללא תלות בכמות ה-workers
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import sys
+import tempfile
+import time
+from typing import Any, Dict, Optional
+from config import Config
+
+try:
+    import fcntl
+    from multiprocessing import shared_memory
+    _SUPPORTED = True
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+    shared_memory = None  # type: ignore
+    _SUPPORTED = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"URLSHM01"
+_HEADER = struct.Struct("<8sIIQII")
+_SLOT = struct.Struct("<QIIIIHHI")
+_GENERATION_OFFSET = 16
+_EPOCH_OFFSET = 24
+_ARENA_USED_OFFSET = 28
+
+# כמה slots נבדקים לכל מפתח (linear probing חסום)
+_PROBES = 8
+
+
+def _hash(key: bytes) -> int:
+    value = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return value or 1  # 0 = slot ריק
+
+
+class SharedRedirectCache:
+    """
+    short_code -> original_url ב-shared memory
+
+    - get() בלי נעילה: קריאת seq, הנתונים, ו-seq שוב (שינוי = miss)
+    - set() best-effort: flock לא חוסם, אם worker אחר כותב - מדלגים
+    - delete() חוסם (נדיר) ומעלה את ה-generation
+    """
+
+    def __init__(self, name: str, slots: int, arena_bytes: int, ttl_seconds: float):
+        self.name = name
+        self.slots = max(_PROBES, int(slots))
+        self.arena_size = max(1024, int(arena_bytes))
+        self.ttl_seconds = float(ttl_seconds)
+
+        self._shm = None
+        self._buf: Optional[memoryview] = None
+        self._lock_file = None
+        self._slots_start = _HEADER.size
+        self._arena_start = _HEADER.size + self.slots * _SLOT.size
+        self._seen_generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.skipped_writes = 0
+        self.resets = 0
+
+    # ---------- Lifecycle ----------
+
+    @property
+    def enabled(self) -> bool:
+        return self._buf is not None
+
+    def open(self) -> bool:
+        """
+        חיבור ל-segment (או יצירתו ע"י ה-worker הראשון)
+
+        Returns:
+            True אם ה-cache המשותף זמין
+        """
+        if self.enabled:
+            return True
+        if not _SUPPORTED:
+            logger.warning("⚠️ Shared redirect cache not supported on this platform")
+            return False
+
+        size = self._arena_start + self.arena_size
+        lock_file = open(os.path.join(tempfile.gettempdir(), f"{self.name}.lock"), "a+")
+
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                shm = self._attach(create=True, size=size)
+                shm.buf[:_HEADER.size] = _HEADER.pack(MAGIC, self.slots, self.arena_size, 0, 1, 0)
+                created = True
+            except FileExistsError:
+                shm = self._attach(create=False)
+                created = False
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        except Exception as e:
+            lock_file.close()
+            logger.error(f"❌ Error opening shared redirect cache: {e}")
+            return False
+
+        magic, slots, arena_size, generation, _, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or slots != self.slots or arena_size != self.arena_size:
+            logger.warning("⚠️ Shared redirect cache layout mismatch - disabled in this worker")
+            shm.close()
+            lock_file.close()
+            return False
+
+        self._shm, self._buf, self._lock_file = shm, shm.buf, lock_file
+        self._seen_generation = generation
+        logger.info(f"✅ Shared redirect cache {'created' if created else 'attached'}: {self.name} ({size} bytes)")
+        return True
+
+    def _attach(self, create: bool, size: int = 0):
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name=self.name, create=create, size=size, track=False)
+
+        shm = shared_memory.SharedMemory(name=self.name, create=create, size=size)
+        # לפני 3.13 ה-resource tracker מוחק את ה-segment כשהתהליך יוצא - וה-workers האחרים עוד משתמשים בו
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+    def close(self) -> None:
+        """ניתוק מה-segment (ה-segment עצמו נשאר ל-workers האחרים)"""
+        if self._shm is None:
+            return
+        self._buf = None
+        self._shm.close()
+        self._shm = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # ---------- Reading ----------
+
+    def _slot_offset(self, index: int) -> int:
+        return self._slots_start + index * _SLOT.size
+
+    def get(self, short_code: str) -> Optional[str]:
+        """
+        חיפוש קוד בטבלה המשותפת
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            הכתובת המקורית או None
+        """
+        buf = self._buf
+        if buf is None:
+            return None
+
+        key = short_code.encode("utf-8")
+        key_hash = _hash(key)
+        epoch = struct.unpack_from("<I", buf, _EPOCH_OFFSET)[0]
+        min_written = time.time() - self.ttl_seconds
+        start = key_hash % self.slots
+
+        for i in range(_PROBES):
+            offset = self._slot_offset((start + i) % self.slots)
+            slot_hash, seq, slot_epoch, written, data_off, key_len, val_len, _ = _SLOT.unpack_from(buf, offset)
+
+            if slot_hash != key_hash or seq & 1 or slot_epoch != epoch or written < min_written:
+                continue
+
+            data_start = self._arena_start + data_off
+            if bytes(buf[data_start:data_start + key_len]) != key:
+                continue
+            value = bytes(buf[data_start + key_len:data_start + key_len + val_len])
+
+            # seqlock: ה-slot או ה-arena השתנו בזמן הקריאה
+            if (struct.unpack_from("<I", buf, offset + 8)[0] != seq
+                    or struct.unpack_from("<I", buf, _EPOCH_OFFSET)[0] != epoch):
+                break
+
+            self.hits += 1
+            return value.decode("utf-8")
+
+        self.misses += 1
+        return None
+
+    def generation_changed(self) -> bool:
+        """
+        האם היו מחיקות (בכל worker) מאז הבדיקה הקודמת
+
+        Returns:
+            True אם צריך לנקות את ה-cache המקומי
+        """
+        buf = self._buf
+        if buf is None:
+            return False
+        generation = struct.unpack_from("<Q", buf, _GENERATION_OFFSET)[0]
+        if generation == self._seen_generation:
+            return False
+        self._seen_generation = generation
+        return True
+
+    # ---------- Writing ----------
+
+    def _write_slot(self, offset: int, fields: tuple) -> None:
+        buf = self._buf
+        seq = struct.unpack_from("<I", buf, offset + 8)[0]
+        struct.pack_into("<I", buf, offset + 8, seq + 1)  # odd = בכתיבה
+        _SLOT.pack_into(buf, offset, fields[0], seq + 1, *fields[1:])
+        struct.pack_into("<I", buf, offset + 8, seq + 2)
+
+    def _reset_arena(self) -> int:
+        buf = self._buf
+        epoch = struct.unpack_from("<I", buf, _EPOCH_OFFSET)[0] + 1
+        struct.pack_into("<I", buf, _EPOCH_OFFSET, epoch)
+        struct.pack_into("<I", buf, _ARENA_USED_OFFSET, 0)
+        self.resets += 1
+        return epoch
+
+    def set(self, short_code: str, original_url: str) -> bool:
+        """
+        כתיבת קוד לטבלה (best-effort)
+
+        Args:
+            short_code: הקוד הקצר
+            original_url: הכתובת המקורית
+
+        Returns:
+            True אם נכתב
+        """
+        if self._buf is None:
+            return False
+
+        key = short_code.encode("utf-8")
+        value = original_url.encode("utf-8")
+        length = len(key) + len(value)
+        if length > self.arena_size or len(key) > 0xFFFF or len(value) > 0xFFFF:
+            return False
+
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.skipped_writes += 1
+            return False
+
+        try:
+            buf = self._buf
+            epoch = struct.unpack_from("<I", buf, _EPOCH_OFFSET)[0]
+            used = struct.unpack_from("<I", buf, _ARENA_USED_OFFSET)[0]
+            if used + length > self.arena_size:
+                epoch = self._reset_arena()
+                used = 0
+
+            data_start = self._arena_start + used
+            buf[data_start:data_start + len(key)] = key
+            buf[data_start + len(key):data_start + length] = value
+            struct.pack_into("<I", buf, _ARENA_USED_OFFSET, used + length)
+
+            key_hash = _hash(key)
+            start = key_hash % self.slots
+            now = int(time.time())
+            target, oldest = None, None
+
+            for i in range(_PROBES):
+                offset = self._slot_offset((start + i) % self.slots)
+                slot_hash, _, slot_epoch, written, *_ = _SLOT.unpack_from(buf, offset)
+                if slot_hash == key_hash or slot_hash == 0 or slot_epoch != epoch:
+                    target = offset
+                    break
+                if oldest is None or written < oldest[1]:
+                    oldest = (offset, written)
+
+            if target is None:
+                target = oldest[0]
+
+            self._write_slot(target, (key_hash, epoch, now, used, len(key), len(value), 0))
+            self.writes += 1
+            return True
+
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def delete(self, short_code: str) -> None:
+        """
+        הסרת קוד מהטבלה והעלאת ה-generation (ה-workers ינקו cache מקומי)
+
+        Args:
+            short_code: הקוד הקצר
+        """
+        if self._buf is None:
+            return
+
+        key_hash = _hash(short_code.encode("utf-8"))
+        start = key_hash % self.slots
+
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            buf = self._buf
+            for i in range(_PROBES):
+                offset = self._slot_offset((start + i) % self.slots)
+                if _SLOT.unpack_from(buf, offset)[0] == key_hash:
+                    self._write_slot(offset, (0, 0, 0, 0, 0, 0, 0))
+
+            generation = struct.unpack_from("<Q", buf, _GENERATION_OFFSET)[0] + 1
+            struct.pack_into("<Q", buf, _GENERATION_OFFSET, generation)
+            # ה-worker המוחק כבר ניקה את הרשומה מה-cache המקומי שלו
+            self._seen_generation = generation
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    async def fill(self, repo, limit: int) -> int:
+        """
+        מילוי ראשוני מהקישורים הכי נקלקים - רק worker אחד (flock על קובץ filler)
+
+        Args:
+            repo: AsyncURLRepository
+            limit: כמות מקסימלית
+
+        Returns:
+            כמות הקישורים שנכתבו (0 אם worker אחר ממלא)
+        """
+        if self._buf is None:
+            return 0
+
+        filler_lock = open(os.path.join(tempfile.gettempdir(), f"{self.name}.fill.lock"), "a+")
+        try:
+            try:
+                fcntl.flock(filler_lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0
+
+            written = 0
+            async for short_code, original_url in repo.iter_top_links("clicks", limit):
+                if self.get(short_code) is None and self.set(short_code, original_url):
+                    written += 1
+
+            logger.info(f"✅ Shared redirect cache filled: {written} links")
+            return written
+        finally:
+            filler_lock.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        סטטיסטיקות ה-cache המשותף
+
+        Returns:
+            dict עם מונים
+        """
+        stats: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "slots": self.slots,
+            "arena_bytes": self.arena_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "skipped_writes": self.skipped_writes,
+            "resets": self.resets,
+        }
+        if self._buf is not None:
+            _, _, _, generation, epoch, used = _HEADER.unpack_from(self._buf, 0)
+            stats.update({"generation": generation, "epoch": epoch, "arena_used": used})
+        return stats
+
+
+# Singleton instance
+shared_redirect_cache = SharedRedirectCache(
+    name=Config.SHARED_CACHE_NAME,
+    slots=Config.SHARED_CACHE_SLOTS,
+    arena_bytes=Config.SHARED_CACHE_ARENA_MB * 1024 * 1024,
+    ttl_seconds=Config.SHARED_CACHE_TTL,
+)
@@ -0,0 +1,353 @@
+"""
+URL Shortener Bot - Redirect Snapshot
+======================================
+קובץ snapshot ממוין של short_code -> original_url, ממופה לזיכרון (mmap)
+עם חיפוש בינארי. משמש ל-redirects מיד עם עליית התהליך ובזמן ש-MongoDB לא זמין.
+
+פורמט הקובץ (little endian):
+    header: magic(8) | count(u32) | reserved(u32) | watermark_ms(i64)
+    index:  count x [key_off(u32) | key_len(u32) | val_off(u32) | val_len(u32)]
+    data:   בייטים של המפתחות והערכים (offsets יחסיים לתחילת ה-data)
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, Tuple
+from config import Config
+
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
+    _HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"URLSNAP1"
+_HEADER = struct.Struct("<8sIIq")
+_ENTRY = struct.Struct("<IIII")
+
+# בדיקת החלפת קובץ ע"י worker אחר - לכל היותר פעם בשנייה
+_RELOAD_CHECK_SECONDS = 1.0
+
+# מרווח ביטחון לסטיית שעונים בבנייה אינקרמנטלית (הוספה חוזרת אינה מזיקה)
+_WATERMARK_MARGIN = timedelta(seconds=60)
+
+
+def _to_ms(dt: Optional[datetime]) -> int:
+    """datetime (naive UTC) -> epoch ms, או -1"""
+    if dt is None:
+        return -1
+    return int(dt.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _from_ms(ms: int) -> Optional[datetime]:
+    """epoch ms -> datetime (naive UTC), או None"""
+    if ms < 0:
+        return None
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def write_snapshot(path: str, links: Dict[str, str], watermark: Optional[datetime]) -> int:
+    """
+    כתיבת snapshot לקובץ זמני והחלפה אטומית (os.replace)
+
+    Args:
+        path: נתיב הקובץ
+        links: {short_code: original_url}
+        watermark: ה-created_at המקסימלי שנכלל
+
+    Returns:
+        כמות הרשומות שנכתבו
+    """
+    keys = sorted(links)
+    index = bytearray()
+    data = bytearray()
+
+    for key in keys:
+        key_bytes = key.encode("utf-8")
+        val_bytes = links[key].encode("utf-8")
+        key_off = len(data)
+        data += key_bytes
+        val_off = len(data)
+        data += val_bytes
+        index += _ENTRY.pack(key_off, len(key_bytes), val_off, len(val_bytes))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(keys), 0, _to_ms(watermark)))
+        f.write(index)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return len(keys)
+
+
+class RedirectSnapshot:
+    """
+    קורא snapshot ממופה לזיכרון + כותב תקופתי (worker אחד בכל פעם, לפי flock)
+
+    - lookup() בלי I/O מעבר ל-page cache, O(log n)
+    - הכתיבה אינקרמנטלית לפי watermark של created_at, ובנייה מלאה כל
+      full_every ריענונים (כדי להוציא קודים שנמחקו)
+    - מחיקות מקומיות נשמרות ב-tombstones עד הבנייה המלאה הבאה
+    """
+
+    def __init__(self, path: str, full_every: int = 12):
+        self.path = path
+        self.full_every = max(1, int(full_every))
+
+        self._file = None
+        self._mm: Optional[mmap.mmap] = None
+        self._count = 0
+        self._data_start = 0
+        self._identity: Optional[Tuple[int, int, int]] = None
+        self._next_reload_check = 0.0
+
+        self.watermark: Optional[datetime] = None
+        self._tombstones: set = set()
+        self._refreshes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- Reading ----------
+
+    def open(self) -> bool:
+        """
+        מיפוי הקובץ לזיכרון (אם קיים ותקין)
+
+        Returns:
+            True אם נטען snapshot
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+
+        identity = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if identity == self._identity:
+            return self._mm is not None
+
+        if st.st_size < _HEADER.size:
+            logger.warning(f"⚠️ Snapshot file too small: {self.path}")
+            return False
+
+        f = open(self.path, "rb")
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            f.close()
+            raise
+
+        magic, count, _, watermark_ms = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or _HEADER.size + count * _ENTRY.size > len(mm):
+            logger.warning(f"⚠️ Invalid snapshot file: {self.path}")
+            mm.close()
+            f.close()
+            return False
+
+        self._close_mapping()
+        self._file, self._mm = f, mm
+        self._count = count
+        self._data_start = _HEADER.size + count * _ENTRY.size
+        self._identity = identity
+        self.watermark = _from_ms(watermark_ms)
+
+        logger.info(f"✅ Redirect snapshot loaded: {count} links")
+        return True
+
+    def _close_mapping(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+        if self._file is not None:
+            self._file.close()
+        self._mm = None
+        self._file = None
+        self._count = 0
+
+    def close(self) -> None:
+        """שחרור ה-mmap"""
+        self._close_mapping()
+        self._identity = None
+
+    def _maybe_reload(self) -> None:
+        """טעינה מחדש אם worker אחר החליף את הקובץ"""
+        now = time.monotonic()
+        if now < self._next_reload_check:
+            return
+        self._next_reload_check = now + _RELOAD_CHECK_SECONDS
+
+        try:
+            self.open()
+        except Exception as e:
+            logger.warning(f"⚠️ Error reloading snapshot: {e}")
+
+    @property
+    def loaded(self) -> bool:
+        return self._mm is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._mm, _HEADER.size + i * _ENTRY.size)
+
+    def lookup(self, short_code: str) -> Optional[str]:
+        """
+        חיפוש בינארי של קוד ב-snapshot
+
+        Args:
+            short_code: הקוד הקצר
+
+        Returns:
+            הכתובת המקורית או None אם לא נמצא
+        """
+        self._maybe_reload()
+
+        mm = self._mm
+        if mm is None or short_code in self._tombstones:
+            self.misses += 1
+            return None
+
+        key = short_code.encode("utf-8")
+        data_start = self._data_start
+        lo, hi = 0, self._count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key_off, key_len, val_off, val_len = self._entry(mid)
+            start = data_start + key_off
+            candidate = mm[start:start + key_len]
+
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                self.hits += 1
+                start = data_start + val_off
+                return mm[start:start + val_len].decode("utf-8")
+
+        self.misses += 1
+        return None
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """מעבר על כל הרשומות (לבנייה אינקרמנטלית)"""
+        mm = self._mm
+        if mm is None:
+            return
+        data_start = self._data_start
+        for i in range(self._count):
+            key_off, key_len, val_off, val_len = self._entry(i)
+            yield (
+                mm[data_start + key_off:data_start + key_off + key_len].decode("utf-8"),
+                mm[data_start + val_off:data_start + val_off + val_len].decode("utf-8"),
+            )
+
+    def note_deleted(self, short_code: str) -> None:
+        """קוד שנמחק לא יוגש מה-snapshot (עד הבנייה המלאה הבאה)"""
+        self._tombstones.add(short_code)
+
+    # ---------- Writing ----------
+
+    def _try_lock(self):
+        """flock לא חוסם - רק worker אחד כותב בכל פעם"""
+        if not _HAS_FCNTL:
+            return None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        return lock_file
+
+    async def refresh(self, repo) -> int:
+        """
+        ריענון ה-snapshot מה-DB (נקרא תקופתית)
+
+        Args:
+            repo: AsyncURLRepository
+
+        Returns:
+            כמות הרשומות בקובץ החדש (0 אם worker אחר מחזיק את ה-lock)
+        """
+        lock_file = self._try_lock()
+        if lock_file is False:
+            return 0
+
+        try:
+            self._maybe_reload()
+            full = not self.loaded or self._refreshes % self.full_every == 0
+            self._refreshes += 1
+
+            if full:
+                links: Dict[str, str] = {}
+                since = None
+                tombstones_before = set(self._tombstones)
+            else:
+                links = dict(self.items())
+                since = self.watermark - _WATERMARK_MARGIN if self.watermark else None
+                tombstones_before = None
+                for short_code in self._tombstones:
+                    links.pop(short_code, None)
+
+            watermark = self.watermark if not full else None
+            async for short_code, original_url, created_at in repo.iter_links(since=since):
+                links[short_code] = original_url
+                if created_at and (watermark is None or created_at > watermark):
+                    watermark = created_at
+
+            count = await asyncio.to_thread(write_snapshot, self.path, links, watermark)
+            self.open()
+
+            if tombstones_before is not None:
+                # מחיקות שקרו לפני הבנייה המלאה כבר לא בקובץ
+                self._tombstones -= tombstones_before
+
+            logger.info(f"✅ Redirect snapshot written ({'full' if full else 'incremental'}): {count} links")
+            return count
+
+        finally:
+            if lock_file:
+                lock_file.close()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        סטטיסטיקות ה-snapshot
+
+        Returns:
+            dict עם גודל ומונים
+        """
+        return {
+            "loaded": self.loaded,
+            "links": self._count,
+            "size_bytes": len(self._mm) if self._mm is not None else 0,
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "tombstones": len(self._tombstones),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# Singleton instance
+redirect_snapshot = RedirectSnapshot(
+    path=Config.SNAPSHOT_PATH,
+    full_every=Config.SNAPSHOT_FULL_EVERY,
+)
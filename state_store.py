@@ -0,0 +1,233 @@
+"""
+URL Shortener Bot - Conversation State Store
+=============================================
+מצב שיחה של משתמש (למשל waiting_for_url) עם TTL לכל רשומה וגודל חסום,
+במקום dict שגדל לנצח ונראה רק ל-worker אחד.
+
+- local: OrderedDict חסום (LRU) בתהליך - ל-worker יחיד / פיתוח
+- mongo: collection conversation_states עם TTL index - משותף לכל ה-workers
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class StateEntry:
+    """רשומת מצב קומפקטית (בלי __dict__ לכל משתמש)"""
+
+    __slots__ = ("state", "expires_at")
+
+    def __init__(self, state: str, expires_at: float):
+        self.state = state
+        self.expires_at = expires_at
+
+
+class LocalStateBackend:
+    """מצבים בזיכרון התהליך: LRU חסום ב-max_size, תפוגה בקריאה"""
+
+    name = "local"
+
+    def __init__(self, max_size: int):
+        self.max_size = max(1, int(max_size))
+        self._data: "OrderedDict[int, StateEntry]" = OrderedDict()
+        self.evictions = 0
+
+    def _take(self, user_id: int, remove: bool) -> Optional[str]:
+        entry = self._data.pop(user_id, None) if remove else self._data.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._data.pop(user_id, None)
+            return None
+        return entry.state
+
+    async def get(self, user_id: int) -> Optional[str]:
+        return self._take(user_id, remove=False)
+
+    async def pop(self, user_id: int) -> Optional[str]:
+        return self._take(user_id, remove=True)
+
+    async def set(self, user_id: int, state: str, ttl: float) -> None:
+        self._data[user_id] = StateEntry(state, time.monotonic() + ttl)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, user_id: int) -> None:
+        self._data.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MongoStateBackend:
+    """
+    מצבים ב-MongoDB: מסמך לכל משתמש ({_id: user_id, state, expires_at})
+
+    ה-TTL index מוחק רשומות ישנות (ה-TTL monitor רץ פעם בדקה),
+    ולכן expires_at נבדק גם בקריאה.
+    """
+
+    name = "mongo"
+
+    @staticmethod
+    def _collection():
+        from async_database import get_async_db
+        return get_async_db().conversation_states
+
+    async def get(self, user_id: int) -> Optional[str]:
+        doc = await self._collection().find_one(
+            {"_id": user_id, "expires_at": {"$gt": datetime.utcnow()}}
+        )
+        return doc["state"] if doc else None
+
+    async def pop(self, user_id: int) -> Optional[str]:
+        # אטומי - רק worker אחד מקבל את המצב גם אם ההודעה מעובדת פעמיים
+        doc = await self._collection().find_one_and_delete({"_id": user_id})
+        if not doc or doc["expires_at"] <= datetime.utcnow():
+            return None
+        return doc["state"]
+
+    async def set(self, user_id: int, state: str, ttl: float) -> None:
+        await self._collection().update_one(
+            {"_id": user_id},
+            {"$set": {"state": state, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+
+    async def delete(self, user_id: int) -> None:
+        await self._collection().delete_one({"_id": user_id})
+
+
+class ConversationStateStore:
+    """
+    מצב שיחה לכל משתמש עם TTL
+
+    שגיאת backend נרשמת בלוג ומתנהגת כמו "אין מצב" - הבוט ממשיך לעבוד.
+    """
+
+    def __init__(self, backend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = float(ttl_seconds)
+
+        self.sets = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, user_id: int) -> Optional[str]:
+        """
+        המצב הנוכחי של המשתמש
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            המצב או None (לא קיים / פג תוקף)
+        """
+        try:
+            state = await self.backend.get(user_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Error reading conversation state: {e}")
+            return None
+        self._count(state)
+        return state
+
+    async def pop(self, user_id: int) -> Optional[str]:
+        """
+        משיכת המצב ומחיקתו (לצריכה חד-פעמית, למשל waiting_for_url)
+
+        Args:
+            user_id: מזהה המשתמש
+
+        Returns:
+            המצב או None
+        """
+        try:
+            state = await self.backend.pop(user_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Error reading conversation state: {e}")
+            return None
+        self._count(state)
+        return state
+
+    async def set(self, user_id: int, state: str, ttl: Optional[float] = None) -> bool:
+        """
+        שמירת מצב למשתמש
+
+        Args:
+            user_id: מזהה המשתמש
+            state: המצב
+            ttl: זמן חיים בשניות (ברירת מחדל STATE_TTL_SECONDS)
+
+        Returns:
+            True אם נשמר
+        """
+        try:
+            await self.backend.set(user_id, state, self.ttl_seconds if ttl is None else ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Error saving conversation state: {e}")
+            return False
+        self.sets += 1
+        return True
+
+    async def clear(self, user_id: int) -> None:
+        """
+        מחיקת המצב של המשתמש
+
+        Args:
+            user_id: מזהה המשתמש
+        """
+        try:
+            await self.backend.delete(user_id)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ Error clearing conversation state: {e}")
+
+    def _count(self, state: Optional[str]) -> None:
+        if state is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        סטטיסטיקות ה-store
+
+        Returns:
+            dict עם מונים
+        """
+        stats = {
+            "backend": self.backend.name,
+            "sets": self.sets,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+        if isinstance(self.backend, LocalStateBackend):
+            stats["size"] = len(self.backend)
+            stats["evictions"] = self.backend.evictions
+        return stats
+
+
+def _create_backend():
+    if Config.STATE_BACKEND == "mongo":
+        return MongoStateBackend()
+    return LocalStateBackend(Config.STATE_MAX_ENTRIES)
+
+
+# Singleton instance
+conversation_states = ConversationStateStore(
+    backend=_create_backend(),
+    ttl_seconds=Config.STATE_TTL_SECONDS,
+)
@@ -0,0 +1,10 @@
+"""
+URL Shortener Bot - Tests
+==========================
+הרצה מתיקיית הפרויקט: python -m pytest -q
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,82 @@
+"""
+תחליפים in-memory ל-collections של motor - רק מה שהבדיקות צריכות
+"""
+
+from types import SimpleNamespace
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = list(docs)
+
+    def batch_size(self, _size):
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self._docs:
+            yield doc
+
+
+def _matches(doc, query) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            if "$gte" in condition and (value is None or value < condition["$gte"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """collection בזיכרון שסופר את הקריאות לכל פעולה"""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(doc) for doc in docs]
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _project(self, doc, projection):
+        if not projection:
+            return dict(doc)
+        return {field: doc[field] for field, keep in projection.items() if keep and field in doc}
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query=None, projection=None):
+        self._count("find")
+        return _Cursor(self._project(doc, projection) for doc in self.docs if _matches(doc, query or {}))
+
+    async def find_one(self, query, projection=None):
+        self._count("find_one")
+        for doc in self.docs:
+            if _matches(doc, query):
+                return self._project(doc, projection)
+        return None
+
+    async def find_one_and_update(self, query, update, projection=None, **_kwargs):
+        self._count("find_one_and_update")
+        for doc in self.docs:
+            if _matches(doc, query):
+                for field, delta in update.get("$inc", {}).items():
+                    doc[field] = doc.get(field, 0) + delta
+                doc.update(update.get("$set", {}))
+                return self._project(doc, projection)
+        return None
+
+    async def insert_one(self, doc):
+        self._count("insert_one")
+        doc.setdefault("_id", len(self.docs) + 1)
+        self.docs.append(dict(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+
+def fake_db(docs=()):
+    """אובייקט עם ה-collections ש-AsyncURLRepository מצפה להם"""
+    return SimpleNamespace(urls=FakeCollection(docs), click_shards=FakeCollection(), counters=FakeCollection())
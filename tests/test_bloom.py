@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime
+
+from async_database import AsyncURLRepository
+from bloom import ShortCodeFilter
+from fakes import fake_db
+from replica import LinkReplica
+
+
+def _repo(docs, fresh_seconds):
+    repo = AsyncURLRepository(fake_db(docs))
+    repo.code_filter = ShortCodeFilter(1000, 0.01, trust_negatives=False, fresh_seconds=fresh_seconds)
+    return repo
+
+
+def _doc(short_code):
+    return {"short_code": short_code, "original_url": f"https://example.com/{short_code}",
+            "created_at": datetime.utcnow()}
+
+
+def test_fresh_filter_miss_skips_mongo():
+    repo = _repo([_doc("abc")], fresh_seconds=60)
+    asyncio.run(repo.build_code_filter())
+
+    assert asyncio.run(repo._definitely_absent("missing")) is True
+    assert repo.collection.calls.get("find_one", 0) == 0
+
+
+def test_stale_miss_syncs_and_finds_code_from_other_writer():
+    repo = _repo([_doc("abc")], fresh_seconds=0)
+    asyncio.run(repo.build_code_filter())
+
+    # נוצר ב-"worker אחר" - רק ב-DB, לא ב-filter
+    repo.collection.docs.append(_doc("other"))
+
+    assert asyncio.run(repo._definitely_absent("other")) is False
+    assert repo.code_filter.missing("other") is False
+
+
+def test_concurrent_stale_misses_share_one_sync():
+    repo = _repo([_doc("abc")], fresh_seconds=60)
+    asyncio.run(repo.build_code_filter())
+    repo.code_filter.synced_at -= 120
+
+    async def burst():
+        return await asyncio.gather(*(repo._definitely_absent(f"scan{i}") for i in range(50)))
+
+    finds = repo.collection.calls["find"]
+    assert all(asyncio.run(burst()))
+    assert repo.collection.calls["find"] == finds + 1
+    assert repo.collection.calls.get("find_one", 0) == 0
+
+
+def test_resolve_unknown_code_without_find_one(monkeypatch):
+    repo = _repo([_doc("abc")], fresh_seconds=60)
+    asyncio.run(repo.build_code_filter())
+    monkeypatch.setattr(repo, "replica", LinkReplica(batch_size=10))
+
+    assert asyncio.run(repo.resolve("nope")) is None
+    assert repo.collection.calls.get("find_one", 0) == 0
@@ -0,0 +1,21 @@
+from qr_cache import QRImageCache
+
+ETAG = QRImageCache.etag_for(b"image")
+
+
+def test_matching_etag_gives_304():
+    assert QRImageCache.etag_matches(ETAG, ETAG)
+    assert QRImageCache.etag_matches(f"W/{ETAG}", ETAG)
+    assert QRImageCache.etag_matches(f'"other", W/{ETAG} , "x"', ETAG)
+    assert QRImageCache.etag_matches(" * ", ETAG)
+
+
+def test_mismatch_renders_the_image():
+    assert not QRImageCache.etag_matches("", ETAG)
+    assert not QRImageCache.etag_matches('"other"', ETAG)
+    assert not QRImageCache.etag_matches(ETAG[:-2] + '"', ETAG)
+    # ה-tag מוכל בערך אבל לא כ-entity tag שלם
+    assert not QRImageCache.etag_matches(f"garbage{ETAG}garbage", ETAG)
+    assert not QRImageCache.etag_matches(f'"x{ETAG}"', ETAG)
+    assert not QRImageCache.etag_matches(ETAG.strip('"'), ETAG)
+    assert not QRImageCache.etag_matches(f"*, {ETAG[:-2]}\"", ETAG)
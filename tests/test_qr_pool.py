@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import pytest
+
+import qr_pool
+from qr_pool import QRPoolBusy, QRRenderPool
+
+
+def test_timed_out_render_counts_toward_max_pending_until_it_finishes(monkeypatch):
+    release = threading.Event()
+
+    def slow_render(*_args):
+        release.wait(5)
+        return b"image"
+
+    monkeypatch.setattr(qr_pool, "render_qr", slow_render)
+    pool = QRRenderPool(workers=0, max_pending=1, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.render("https://example.com/a", 10, 4)
+
+        # הרינדור עדיין רץ ב-thread - התור מלא
+        assert pool.stats()["pending"] == 1
+        with pytest.raises(QRPoolBusy):
+            await pool.render("https://example.com/b", 10, 4)
+
+        release.set()
+        for _ in range(100):
+            if pool.stats()["pending"] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+        assert pool.stats()["pending"] == 0
+        assert await pool.render("https://example.com/c", 10, 4) == b"image"
+
+    asyncio.run(scenario())
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["rejected"] == 1
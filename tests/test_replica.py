@@ -0,0 +1,32 @@
+import asyncio
+
+from async_database import AsyncURLRepository
+from fakes import fake_db
+from replica import LinkReplica
+
+
+def _repo():
+    repo = AsyncURLRepository(fake_db())
+    repo.replica = LinkReplica(batch_size=10)
+    return repo
+
+
+def test_inserts_leave_replica_empty_when_replica_mode_is_off():
+    repo = _repo()
+
+    for i in range(5):
+        asyncio.run(repo.create(1, f"https://example.com/{i}", f"code{i}"))
+
+    assert len(repo.collection.docs) == 5
+    assert repo.replica._links == {}
+    assert repo.replica._codes_by_id == {}
+
+
+def test_insert_is_visible_in_a_ready_replica():
+    repo = _repo()
+    repo.replica.ready = True
+
+    doc = asyncio.run(repo.create(1, "https://example.com/new", "new"))
+
+    assert repo.replica.get("new") == "https://example.com/new"
+    assert repo.replica._codes_by_id == {doc["_id"]: "new"}
@@ -0,0 +1,42 @@
+import asyncio
+from datetime import datetime
+
+from async_database import AsyncURLRepository
+from bloom import ShortCodeFilter
+from fakes import fake_db
+from replica import LinkReplica
+
+
+def _repo():
+    docs = [{"_id": 1, "short_code": "abc", "original_url": "https://example.com/abc",
+             "created_at": datetime.utcnow(), "clicks": 0}]
+    repo = AsyncURLRepository(fake_db(docs))
+    repo.code_filter = ShortCodeFilter(1000, 0.01, trust_negatives=False, fresh_seconds=60)
+    repo.replica = LinkReplica(batch_size=10)
+    return repo
+
+
+def test_unknown_code_skips_find_one_and_update():
+    repo = _repo()
+    asyncio.run(repo.build_code_filter())
+
+    assert asyncio.run(repo.resolve_and_count("nope")) is None
+    assert repo.collection.calls.get("find_one_and_update", 0) == 0
+
+
+def test_known_code_is_counted():
+    repo = _repo()
+    asyncio.run(repo.build_code_filter())
+
+    assert asyncio.run(repo.resolve_and_count("abc")) == "https://example.com/abc"
+    assert repo.collection.docs[0]["clicks"] == 1
+
+
+def test_ready_replica_answers_the_miss():
+    repo = _repo()
+    repo.replica.add(1, "abc", "https://example.com/abc")
+    repo.replica.ready = True
+
+    assert asyncio.run(repo.resolve_and_count("nope")) is None
+    assert repo.collection.calls.get("find_one_and_update", 0) == 0
+    assert asyncio.run(repo.resolve_and_count("abc")) == "https://example.com/abc"
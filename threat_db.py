@@ -0,0 +1,241 @@
+"""
+URL Shortener Bot - Local Threat Database
+==========================================
+סינון URLs זדוניים (malware / phishing) מול מאגר מקומי של hash-ים בסגנון
+Safe Browsing, בלי קריאת רשת לכל URL.
+
+- לכל URL נוצרים ביטויי host/path (עד 5 hosts x 6 paths), ולכל ביטוי SHA-256
+- prefix של 4 בתים נבדק ב-array ממוין (bisect), ורק התאמה נבדקת מול ה-hash המלא
+- המאגר: קובץ בסיס של hash-ים מלאים (hex, שורה לכל hash) + קובץ עדכונים
+  אינקרמנטלי (+hash להוספה, -hash להסרה). שניהם נטענים מחדש כשהם משתנים.
+"""
+
+import hashlib
+import ipaddress
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_MAX_HOSTS = 5
+_MAX_PATH_PREFIXES = 4
+
+
+def url_expressions(url: str) -> List[str]:
+    """
+    ביטויי host-suffix / path-prefix של URL (כמו ב-Safe Browsing)
+
+    Args:
+        url: URL (אחרי נרמול)
+
+    Returns:
+        רשימת ביטויים, למשל 'a.b.c/1/2.html?x', 'b.c/1/', 'c/'...
+    """
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or '').strip('.').lower()
+    except ValueError:
+        return []
+    if not host:
+        return []
+
+    try:
+        ipaddress.ip_address(host)
+        hosts = [host]
+    except ValueError:
+        # ה-host המלא + עד 4 סיומות מתוך 5 ה-labels האחרונים (בלי ה-TLD לבד)
+        labels = host.split('.')
+        hosts = [host] + [
+            '.'.join(labels[i:]) for i in range(max(len(labels) - _MAX_HOSTS, 1), len(labels) - 1)
+        ]
+
+    path = parts.path or '/'
+    paths = []
+    if parts.query:
+        paths.append(f"{path}?{parts.query}")
+    paths.append(path)
+
+    segments = path.split('/')[1:-1]
+    prefix = '/'
+    paths.append(prefix)
+    for segment in segments[:_MAX_PATH_PREFIXES - 1]:
+        prefix = f"{prefix}{segment}/"
+        paths.append(prefix)
+
+    seen = set()
+    expressions = []
+    for h in hosts:
+        for p in paths:
+            expression = h + p
+            if expression not in seen:
+                seen.add(expression)
+                expressions.append(expression)
+    return expressions
+
+
+def _parse_hash(token: str) -> Optional[bytes]:
+    token = token.strip().lower()
+    if len(token) != 64:
+        return None
+    try:
+        return bytes.fromhex(token)
+    except ValueError:
+        return None
+
+
+class ThreatDatabase:
+    """
+    מאגר hash-ים ממוין בזיכרון
+
+    _table = (prefixes, hashes) - מוחלף בהשמה אחת בטעינה מחדש:
+    - prefixes: array('I') של 4 הבתים הראשונים (big endian) - 4 בתים לרשומה
+    - hashes: כל ה-hash-ים המלאים ברצף אחד (32 בתים לרשומה), באותו סדר
+    """
+
+    def __init__(self, path: Optional[str], updates_path: Optional[str], check_seconds: float = 60):
+        self.path = path
+        self.updates_path = updates_path
+        self.check_seconds = float(check_seconds)
+
+        self._table: Tuple[array, bytes] = (array('I'), b'')
+        self._identity: Optional[Tuple] = None
+        self._next_check = 0.0
+
+        self.loads = 0
+        self.checks = 0
+        self.matches = 0
+
+    # ---------- Loading ----------
+
+    def _file_identity(self) -> Tuple:
+        identity = []
+        for path in (self.path, self.updates_path):
+            try:
+                st = os.stat(path) if path else None
+                identity.append((st.st_mtime_ns, st.st_size) if st else None)
+            except FileNotFoundError:
+                identity.append(None)
+        return tuple(identity)
+
+    @staticmethod
+    def _read_lines(path: Optional[str]) -> Iterable[str]:
+        if not path:
+            return []
+        try:
+            with open(path, 'r', encoding='ascii', errors='ignore') as f:
+                return [line.split('#', 1)[0].strip() for line in f]
+        except FileNotFoundError:
+            return []
+
+    def reload_if_changed(self) -> bool:
+        """
+        טעינת המאגר אם קובץ הבסיס או קובץ העדכונים השתנו
+
+        Returns:
+            True אם נטען מאגר חדש
+        """
+        now = time.monotonic()
+        if not (self.path or self.updates_path) or now < self._next_check:
+            return False
+        self._next_check = now + self.check_seconds
+
+        identity = self._file_identity()
+        if identity == self._identity:
+            return False
+
+        try:
+            hashes: Set[bytes] = set()
+            for line in self._read_lines(self.path):
+                full_hash = _parse_hash(line.lstrip('+'))
+                if full_hash:
+                    hashes.add(full_hash)
+
+            for line in self._read_lines(self.updates_path):
+                full_hash = _parse_hash(line[1:]) if line[:1] in '+-' and line else None
+                if not full_hash:
+                    continue
+                if line[0] == '+':
+                    hashes.add(full_hash)
+                else:
+                    hashes.discard(full_hash)
+        except OSError as e:
+            logger.error(f"❌ Error loading threat database: {e}")
+            return False
+
+        ordered = sorted(hashes)
+        prefixes = array('I', (int.from_bytes(h[:4], 'big') for h in ordered))
+
+        self._table = (prefixes, b''.join(ordered))
+        self._identity = identity
+        self.loads += 1
+        logger.info(f"✅ Threat database loaded: {len(ordered)} hashes")
+        return True
+
+    # ---------- Lookup ----------
+
+    def _contains(self, full_hash: bytes, prefixes: array, hashes: bytes) -> bool:
+        prefix = int.from_bytes(full_hash[:4], 'big')
+        i = bisect_left(prefixes, prefix)
+        while i < len(prefixes) and prefixes[i] == prefix:
+            if hashes[i * 32:(i + 1) * 32] == full_hash:
+                return True
+            i += 1
+        return False
+
+    def is_malicious(self, url: str) -> bool:
+        """
+        בדיקת URL מול המאגר (כל ביטויי ה-host/path שלו)
+
+        Args:
+            url: URL מנורמל
+
+        Returns:
+            True אם אחד הביטויים נמצא במאגר
+        """
+        if self._identity is None:
+            self.reload_if_changed()
+
+        prefixes, hashes = self._table
+        if not prefixes:
+            return False
+
+        self.checks += 1
+        for expression in url_expressions(url):
+            full_hash = hashlib.sha256(expression.encode('utf-8')).digest()
+            if self._contains(full_hash, prefixes, hashes):
+                self.matches += 1
+                logger.warning(f"⚠️ URL matched threat database: {expression}")
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._table[0])
+
+    def stats(self) -> dict:
+        prefixes, hashes = self._table
+        return {
+            "hashes": len(prefixes),
+            "size_bytes": len(hashes) + prefixes.itemsize * len(prefixes),
+            "loads": self.loads,
+            "checks": self.checks,
+            "matches": self.matches,
+        }
+
+
+def hash_expression(expression: str) -> str:
+    """hex של SHA-256 לביטוי (לבניית קבצי המאגר)"""
+    return hashlib.sha256(expression.encode('utf-8')).hexdigest()
+
+
+# Singleton instance
+threat_db = ThreatDatabase(
+    path=Config.THREAT_DB_PATH,
+    updates_path=Config.THREAT_DB_UPDATES_PATH,
+    check_seconds=Config.THREAT_DB_RELOAD_SECONDS,
+)
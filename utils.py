@@ -6,13 +6,20 @@ URL Shortener Bot - Utilities
 
 import string
 import random
+import hashlib
 import validators
 import qrcode
 import io
-from urllib.parse import urlparse
+import re
+import time
+from functools import lru_cache
+from urllib.parse import urlparse, urlsplit, urlunsplit, unquote_plus
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
 from config import Config
+from blocklist import domain_blocklist
+from threat_db import threat_db
+from metrics import QR_SECONDS
 
 
 class URLShortener:
@@ -74,6 +81,134 @@ class URLShortener:
         for char in code:
             num = num * 62 + cls.ALPHABET.index(char)
         return num
+    
+    @classmethod
+    def permute_number(cls, num: int, length: int, key: bytes, rounds: int = 4) -> int:
+        """
+        פרמוטציה חד-חד-ערכית עם מפתח על [0, 62^length) - רשת Feistel
+        על מספר ביטים זוגי + cycle-walking עד שהתוצאה בטווח
+        
+        Args:
+            num: מספר בטווח
+            length: אורך הקוד (קובע את הטווח)
+            key: מפתח סודי (עד 64 בתים)
+            rounds: מספר סבבי Feistel
+            
+        Returns:
+            מספר אחר באותו טווח (בלי התנגשויות)
+        """
+        domain = 62 ** length
+        half = ((domain - 1).bit_length() + 1) // 2
+        mask = (1 << half) - 1
+        
+        value = num
+        while True:
+            left, right = value >> half, value & mask
+            for round_no in range(rounds):
+                digest = hashlib.blake2b(
+                    right.to_bytes(8, 'little'),
+                    key=key,
+                    person=round_no.to_bytes(16, 'little'),
+                    digest_size=8
+                ).digest()
+                left, right = right, left ^ (int.from_bytes(digest, 'little') & mask)
+            value = (left << half) | right
+            if value < domain:
+                return value
+    
+    @classmethod
+    def code_for_id(cls, num: int, key: bytes, min_length: int = None) -> str:
+        """
+        קוד קצר ייחודי למזהה רץ: פרמוטציה ב-Base62 באורך קבוע
+        (האורך גדל רק כשהמזהים עוברים את 62^length)
+        
+        Args:
+            num: מזהה רץ
+            key: מפתח הפרמוטציה
+            min_length: אורך מינימלי (ברירת מחדל מ-Config)
+            
+        Returns:
+            קוד קצר שלא ניתן לנחש ממנו את המזהה
+        """
+        length = min_length or Config.SHORT_CODE_LENGTH
+        while num >= 62 ** length:
+            length += 1
+        
+        return cls.encode_number(cls.permute_number(num, length, key)).rjust(length, cls.ALPHABET[0])
+
+
+class URLCanonicalizer:
+    """
+    צורה קנונית של URL - כדי שכתובות שקולות יקבלו אותו מסמך, קוד ורשומת cache
+    
+    - scheme ו-host ב-lowercase, host ב-IDNA (punycode)
+    - הסרת פורט ברירת מחדל (80 ל-http, 443 ל-https)
+    - הסרת פרמטרי מעקב (utm_*, fbclid, gclid...) ומיון ה-query
+    - path, ה-encoding של ה-query וה-fragment נשמרים כמו שהם
+    """
+    
+    DEFAULT_PORTS = {'http': 80, 'https': 443}
+    
+    def __init__(self, tracking_params: List[str], sort_query: bool = True, cache_size: int = 4096):
+        exact = frozenset(p.lower() for p in tracking_params if p and not p.endswith('*'))
+        prefixes = [re.escape(p[:-1].lower()) for p in tracking_params if p and p.endswith('*')]
+        
+        self._tracking_exact = exact
+        self._tracking_prefix = re.compile('|'.join(prefixes)) if prefixes else None
+        self.sort_query = sort_query
+        self.canonicalize = lru_cache(maxsize=cache_size)(self._canonicalize)
+    
+    def _is_tracking(self, key: str) -> bool:
+        key = unquote_plus(key).lower()
+        if key in self._tracking_exact:
+            return True
+        return bool(self._tracking_prefix and self._tracking_prefix.match(key))
+    
+    def _canonicalize(self, url: str) -> str:
+        """
+        המרת URL לצורה קנונית (עטוף ב-lru_cache ב-canonicalize)
+        
+        Args:
+            url: URL עם scheme
+            
+        Returns:
+            URL קנוני (או המקורי אם לא ניתן לפרסר)
+        """
+        try:
+            parts = urlsplit(url)
+            scheme = parts.scheme.lower()
+            host = parts.hostname or ''
+            port = parts.port
+        except ValueError:
+            return url
+        
+        if not host:
+            return url
+        
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+        
+        if ':' in host:
+            host = f'[{host}]'  # IPv6
+        
+        netloc = host
+        if port is not None and port != self.DEFAULT_PORTS.get(scheme):
+            netloc = f'{netloc}:{port}'
+        
+        userinfo = parts.netloc.rpartition('@')[0] if '@' in parts.netloc else ''
+        if userinfo:
+            netloc = f'{userinfo}@{netloc}'
+        
+        query = parts.query
+        if query:
+            pairs = [pair for pair in query.split('&') if pair and not self._is_tracking(pair.split('=', 1)[0])]
+            if self.sort_query:
+                pairs.sort(key=lambda pair: pair.split('=', 1)[0])
+            query = '&'.join(pairs)
+        
+        return urlunsplit((scheme, netloc, parts.path or '/', query, parts.fragment))
 
 
 class URLValidator:
@@ -119,23 +254,25 @@ class URLValidator:
         if len(url) > Config.MAX_URL_LENGTH:
             return False, "url_too_long"
         
-        # בדיקת דומיינים חסומים
+        # בדיקת דומיינים חסומים (הדומיין עצמו או parent domain שלו)
         try:
             parsed = urlparse(url)
-            domain = parsed.netloc.lower()
             
-            for blocked in Config.BLOCKED_DOMAINS:
-                if blocked and blocked.lower() in domain:
-                    return False, "blocked_domain"
+            if domain_blocklist.is_blocked(parsed.hostname or ''):
+                return False, "blocked_domain"
         except Exception:
             return False, "parse_error"
         
+        # מאגר מקומי של URLs זדוניים (hash prefixes)
+        if threat_db.is_malicious(url):
+            return False, "malicious_url"
+        
         return True, None
     
     @staticmethod
     def normalize_url(url: str) -> str:
         """
-        נרמול URL (הסרת רווחים, lowercase של דומיין)
+        נרמול URL (הסרת רווחים, https כברירת מחדל, צורה קנונית)
         
         Args:
             url: הכתובת המקורית
@@ -145,53 +282,168 @@ class URLValidator:
         """
         url = url.strip()
         
-        # אם לא מתחיל ב-http, נוסיף https
-        if not url.startswith(('http://', 'https://')):
+        # אם לא מתחיל ב-http, נוסיף https (scheme באותיות גדולות נחשב)
+        if not url.lower().startswith(('http://', 'https://')):
             url = 'https://' + url
         
+        if Config.URL_CANONICALIZE:
+            url = url_canonicalizer.canonicalize(url)
+        
         return url
+    
+    @staticmethod
+    def fingerprint(url: str) -> int:
+        """
+        טביעת אצבע בגודל קבוע של URL מנורמל (לאינדקס dedup)
+        
+        Args:
+            url: הכתובת (אחרי normalize_url)
+            
+        Returns:
+            מספר 64 ביט (signed - נשמר כ-Int64 ב-MongoDB)
+        """
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little', signed=True)
 
 
 class QRCodeGenerator:
     """מחלקה ליצירת QR Codes"""
     
-    @staticmethod
-    def generate(url: str, logo_path: Optional[str] = None) -> io.BytesIO:
+    # פורמט -> MIME type
+    FORMATS = {
+        'png': 'image/png',
+        'svg': 'image/svg+xml',
+    }
+    
+    ERROR_CORRECTION = {
+        'L': qrcode.constants.ERROR_CORRECT_L,
+        'M': qrcode.constants.ERROR_CORRECT_M,
+        'Q': qrcode.constants.ERROR_CORRECT_Q,
+        'H': qrcode.constants.ERROR_CORRECT_H,
+    }
+    
+    @classmethod
+    def matrix(cls, url: str, border: int, error_correction: str) -> List[List[bool]]:
         """
-        יצירת QR Code עבור URL
+        מטריצת המודולים של ה-QR (כולל שוליים)
         
         Args:
-            url: הכתובת ליצירת QR
-            logo_path: נתיב ללוגו (אופציונלי)
+            url: התוכן לקידוד
+            border: שוליים במודולים
+            error_correction: L / M / Q / H
             
         Returns:
-            BytesIO עם תמונת ה-QR
+            שורות של True (שחור) / False (לבן)
         """
-        # יצירת QR code
         qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=Config.QR_BOX_SIZE,
-            border=Config.QR_BORDER,
+            version=None,
+            error_correction=cls.ERROR_CORRECTION[error_correction],
+            border=border,
         )
-        
         qr.add_data(url)
         qr.make(fit=True)
+        return qr.get_matrix()
+    
+    @staticmethod
+    def _png(matrix: List[List[bool]], box_size: int) -> bytes:
+        """PNG של 1 ביט: מודול = פיקסל, ואז הגדלה NEAREST (בלי ציור ריבוע-ריבוע)"""
+        from PIL import Image
+        
+        n = len(matrix)
+        pixels = bytes(0 if cell else 255 for row in matrix for cell in row)
+        img = Image.frombytes('L', (n, n), pixels).convert('1')
+        if box_size > 1:
+            img = img.resize((n * box_size, n * box_size), Image.NEAREST)
+        
+        byte_io = io.BytesIO()
+        img.save(byte_io, format='PNG', optimize=True)
+        return byte_io.getvalue()
+    
+    @staticmethod
+    def _svg(matrix: List[List[bool]], box_size: int) -> bytes:
+        """SVG עם path אחד: מלבן לכל רצף מודולים שחורים בשורה, בתזוזות יחסיות"""
+        n = len(matrix)
+        runs = []
+        px = py = 0  # אחרי z הנקודה חוזרת לתחילת המלבן הקודם
+        for y, row in enumerate(matrix):
+            x = 0
+            while x < n:
+                if not row[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < n and row[x]:
+                    x += 1
+                width = x - start
+                runs.append(f"m{start - px} {y - py}h{width}v1h-{width}z")
+                px, py = start, y
+        
+        size = n * box_size
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {n} {n}" '
+            f'width="{size}" height="{size}" shape-rendering="crispEdges">'
+            f'<path fill="#fff" d="M0 0h{n}v{n}H0z"/><path d="{"".join(runs)}"/></svg>'
+        ).encode('ascii')
+    
+    @classmethod
+    def render(
+        cls,
+        url: str,
+        fmt: str = 'png',
+        box_size: Optional[int] = None,
+        border: Optional[int] = None,
+        error_correction: Optional[str] = None
+    ) -> bytes:
+        """
+        רינדור QR לבתים בפורמט המבוקש
         
-        # יצירת התמונה
-        img = qr.make_image(fill_color="black", back_color="white")
+        Args:
+            url: הכתובת ליצירת QR
+            fmt: png (פלטה של 1 ביט) / svg
+            box_size: פיקסלים למודול (ברירת מחדל מ-Config)
+            border: שוליים במודולים (ברירת מחדל מ-Config)
+            error_correction: L / M / Q / H (ברירת מחדל מ-Config)
+            
+        Returns:
+            בתי התמונה
+        """
+        start = time.perf_counter()
+        matrix = cls.matrix(
+            url,
+            Config.QR_BORDER if border is None else border,
+            error_correction or Config.QR_ERROR_CORRECTION,
+        )
+        box_size = box_size or Config.QR_BOX_SIZE
+        image = cls._svg(matrix, box_size) if fmt == 'svg' else cls._png(matrix, box_size)
+        QR_SECONDS.observe(time.perf_counter() - start, fmt)
+        return image
+    
+    @classmethod
+    def generate(
+        cls,
+        url: str,
+        logo_path: Optional[str] = None,
+        box_size: Optional[int] = None,
+        border: Optional[int] = None
+    ) -> io.BytesIO:
+        """
+        יצירת QR Code (PNG) עבור URL
         
-        # TODO: הוספת לוגו אם נדרש (Phase 2)
+        Args:
+            url: הכתובת ליצירת QR
+            logo_path: נתיב ללוגו (אופציונלי)
+            box_size: גודל ריבוע (ברירת מחדל מ-Config)
+            border: שוליים (ברירת מחדל מ-Config)
+            
+        Returns:
+            BytesIO עם תמונת ה-QR
+        """
+        # TODO: הוספת לוגו אם נדרש (Phase 2) - ידרוש error_correction='H'
         # if logo_path:
         #     logo = Image.open(logo_path)
         #     ...
         
-        # המרה ל-BytesIO
-        byte_io = io.BytesIO()
-        img.save(byte_io, format='PNG')
-        byte_io.seek(0)
-        
-        return byte_io
+        return io.BytesIO(cls.render(url, 'png', box_size, border))
 
 
 class RateLimiter:
@@ -444,6 +696,10 @@ class TextFormatter:
 
 # Singleton instances
 rate_limiter = RateLimiter()
+url_canonicalizer = URLCanonicalizer(
+    tracking_params=Config.URL_TRACKING_PARAMS,
+    sort_query=Config.URL_SORT_QUERY,
+)
 
 
 # Helper functions (shortcuts)